@@ -1,53 +1,118 @@
 # backend/app.py
-from flask import Flask, request
+from flask import Flask, Response, g, request
 from flask_cors import CORS
+from sqlalchemy.exc import DatabaseError
 from dotenv import load_dotenv
 import os
+import time
 
 # Import models
-# from models_decision import db  # New decision models
+from models_decision import db  # New decision models
 from decisions import decisions_bp  # New decision endpoints
+from log_config import get_logger
+from json_codec import FastJSONProvider
+from metrics import CONTENT_TYPE, REQUEST_SECONDS, render_metrics
+from persistence import decision_store
+import compression
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
+CORS_ORIGINS = [
+    "http://localhost:3000",
+    "http://127.0.0.1:5000",
+    "http://172.16.111.101:3000",  # Replace with your machine's IP
+    "https://broadly.vercel.app",
+    "https://broadly-evchichula-5292s-projects.vercel.app",
+    "https://broadly-bb2xo2fmt-evchichula-5292s-projects.vercel.app",
+]
+
+
+def _create_tables():
+    """
+    Workers starting together race to create the same tables; the loser tries
+    again, by which time the checkfirst pass finds them
+    """
+    try:
+        db.create_all()
+    except DatabaseError:
+        time.sleep(0.5)
+        db.create_all()
+
 
 def create_app():
     app = Flask(__name__)
+    # orjson-backed jsonify / request.get_json when available
+    app.json = FastJSONProvider(app)
 
     # Configuration
-    # app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
-    #     "DATABASE_URL", "postgresql://localhost/abroadly_db"
-    # )
-    # app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    database_url = os.getenv("DATABASE_URL", "sqlite:///decisions.sqlite3")
+    # Heroku-style URLs use the scheme SQLAlchemy dropped
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_pre_ping": True}
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-key")
     app.config["SESSION_TYPE"] = "filesystem"  # For session management
 
     # Initialize extensions
-    # db.init_app(app)
+    db.init_app(app)
+    with app.app_context():
+        try:
+            _create_tables()
+            # Workers must not inherit pooled connections across a fork
+            db.engine.dispose()
+            decision_store.init_app(app)
+        except Exception as e:
+            # The API still works without storage, it just cannot serve revisits
+            logger.warning(
+                "Database unavailable, decisions will not be persisted: %s", e
+            )
+
+    # gzip / br responses and request bodies
+    compression.init_app(app)
 
     # CORS configuration
     CORS(
         app,
         resources={
             r"/api/*": {
-                "origins": [
-                    "http://localhost:3000",
-                    "http://127.0.0.1:5000",
-                    "http://172.16.111.101:3000",  # Replace with your machine's IP
-                    "https://broadly.vercel.app",
-                    "https://broadly-evchichula-5292s-projects.vercel.app",
-                    "https://broadly-bb2xo2fmt-evchichula-5292s-projects.vercel.app",
-                ],
+                "origins": CORS_ORIGINS,
                 "supports_credentials": True,  # Important for sessions
             }
         },
     )
 
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        start = g.pop("request_start", None)
+        if start is not None:
+            # Route templates, not raw paths, keep the label set bounded
+            rule = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=request.method,
+                route=rule,
+                status=str(response.status_code),
+            )
+        return response
+
     @app.route("/")
     def health_check():
         return {"status": "healthy", "message": "Decision Engine API is running"}
 
+    @app.route("/metrics")
+    def metrics():
+        """Prometheus scrape endpoint (per worker process)"""
+        return Response(render_metrics(), content_type=CONTENT_TYPE)
+
     app.register_blueprint(decisions_bp, url_prefix="/api")  # New decision endpoints
 
     @app.route("/api/echo", methods=["POST"])
@@ -61,4 +126,7 @@ def create_app():
 app = create_app()
 
 if __name__ == "__main__":
+    from client_pool import warm_up
+
+    warm_up()
     app.run(host="0.0.0.0", port=3001, debug=True)
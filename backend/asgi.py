@@ -0,0 +1,420 @@
+# backend/asgi.py
+"""
+ASGI entry point. The LLM-bound routes (analyze / evaluate and their stream
+variants) are served natively by AsyncDecisionEngine so a single process can
+keep hundreds of upstream calls in flight; every other route falls through to
+the regular Flask app.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 3001 --workers 2
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import CORS_ORIGINS, app as flask_app
+from async_decision_engine import AsyncDecisionEngine
+from client_pool import get_async_client, warm_up_async
+from compression import (
+    MAX_REQUEST_BYTES,
+    BodyTooLarge,
+    UnsupportedEncoding,
+    choose_encoding,
+    compress,
+    compressible,
+    decompress,
+)
+from json_codec import dumps_bytes, loads
+from log_config import get_logger
+from metrics import REQUEST_SECONDS, stage
+from persistence import decision_store
+from prompts import normalize_depth
+from rate_limit import RateLimited, rate_limiter
+from streaming import format_sse
+
+logger = get_logger(__name__)
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Server is at capacity")
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Caps concurrent upstream calls. Requests beyond the cap wait in a bounded
+    queue; once the queue is full, or a request waits longer than
+    queue_timeout, it is shed with Overloaded instead of piling up.
+    """
+
+    def __init__(
+        self, max_concurrency: int = 64, max_queue: int = 256, queue_timeout: float = 30.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    def from_env(cls) -> "ConcurrencyLimiter":
+        return cls(
+            max_concurrency=int(os.getenv("ASYNC_MAX_CONCURRENCY", "64")),
+            max_queue=int(os.getenv("ASYNC_MAX_QUEUE", "256")),
+            queue_timeout=float(os.getenv("ASYNC_QUEUE_TIMEOUT", "30")),
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            raise Overloaded(retry_after=max(1, int(self.queue_timeout / 2)))
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded(retry_after=max(1, int(self.queue_timeout)))
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def _use_cache(scope) -> bool:
+    if "no-cache" in _header(scope, b"cache-control").lower():
+        return False
+    return _header(scope, b"x-cache-bypass").lower() not in ("1", "true")
+
+
+def _query_flag(scope, name: str) -> bool:
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get(name, [""])[0].lower() in ("1", "true", "yes")
+
+
+def _wants_stream(scope) -> bool:
+    return _query_flag(scope, "stream")
+
+
+def _session_id(scope) -> Optional[str]:
+    return _header(scope, b"x-session-id") or None
+
+
+def _client_key(scope) -> str:
+    client = scope.get("client") or (None, None)
+    return rate_limiter.key(client[0], _header(scope, b"x-forwarded-for"))
+
+
+def _cors_headers(scope):
+    origin = _header(scope, b"origin")
+    if origin not in CORS_ORIGINS:
+        return []
+    return [
+        (b"access-control-allow-origin", origin.encode("latin-1")),
+        (b"access-control-allow-credentials", b"true"),
+        (b"vary", b"Origin"),
+    ]
+
+
+async def _read_json(scope, receive) -> Dict:
+    """The request's JSON object; raises BodyTooLarge, UnsupportedEncoding or
+    ValueError (bad JSON, or JSON that is not an object)"""
+    chunks = []
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        # Checked on the wire bytes too, before anything is decompressed
+        if size > MAX_REQUEST_BYTES:
+            raise BodyTooLarge(f"Request body exceeds {MAX_REQUEST_BYTES} bytes")
+        chunks.append(chunk)
+        more_body = message.get("more_body", False)
+    body = b"".join(chunks)
+    encoding = _header(scope, b"content-encoding").strip().lower()
+    if body and encoding not in ("", "identity"):
+        body = decompress(body, encoding)
+    data = loads(body or b"{}")
+    if not isinstance(data, dict):
+        raise ValueError("JSON body must be an object")
+    return data
+
+
+def _operation(scope) -> str:
+    return "evaluate" if scope["path"].startswith("/api/evaluate") else "analyze"
+
+
+async def _send_json(send, scope, status: int, payload, headers=None):
+    with stage("serialize", _operation(scope)):
+        body = dumps_bytes(payload)
+        headers = list(headers or [])
+        if 200 <= status < 300:
+            headers.append((b"vary", b"Accept-Encoding"))
+            encoding = choose_encoding(_header(scope, b"accept-encoding"))
+            if encoding and compressible("application/json", len(body)):
+                body = compress(body, encoding)
+                headers.append((b"content-encoding", encoding.encode()))
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ]
+            + _cors_headers(scope)
+            + headers,
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class DecisionASGIApp:
+    def __init__(
+        self,
+        flask_app,
+        engine: Optional[AsyncDecisionEngine] = None,
+        limiter: Optional[ConcurrencyLimiter] = None,
+    ):
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = engine or AsyncDecisionEngine()
+        self.limiter = limiter or ConcurrencyLimiter.from_env()
+        self.routes = {
+            "/api/analyze": self.analyze,
+            "/api/analyze/stream": self.analyze_stream,
+            "/api/evaluate": self.evaluate,
+            "/api/evaluate/stream": self.evaluate_stream,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        handler = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            handler = self.routes.get(scope["path"].rstrip("/"))
+        # Job submissions (?async=1) go to the Flask app, which owns the job queue
+        if handler is None or _query_flag(scope, "async"):
+            await self.wsgi(scope, receive, send)
+            return
+
+        send = self._timed_send(scope, send)
+        try:
+            with stage("request_parse", _operation(scope)):
+                data = await _read_json(scope, receive)
+        except UnsupportedEncoding as e:
+            await _send_json(send, scope, 415, {"error": str(e)})
+            return
+        except BodyTooLarge as e:
+            await _send_json(send, scope, 413, {"error": str(e)})
+            return
+        except ValueError:
+            await _send_json(send, scope, 400, {"error": "Invalid JSON body"})
+            return
+
+        try:
+            await handler(scope, data, send)
+        except RateLimited as e:
+            await _send_json(
+                send,
+                scope,
+                429,
+                {
+                    "error": "Too many requests, please retry shortly",
+                    "reason": e.reason,
+                    "retry_after": int(e.retry_after_header),
+                },
+                [(b"retry-after", e.retry_after_header.encode())],
+            )
+        except Overloaded as e:
+            await _send_json(
+                send,
+                scope,
+                503,
+                {"error": "Server is busy, please retry shortly"},
+                [(b"retry-after", str(e.retry_after).encode())],
+            )
+
+    def _timed_send(self, scope, send):
+        """Wrap send to record request latency once the response starts"""
+        start = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - start,
+                    method=scope["method"],
+                    route=scope["path"].rstrip("/"),
+                    status=str(message["status"]),
+                )
+            await send(message)
+
+        return timed_send
+
+    async def _admit(self, scope, stage: str, depth: str):
+        """Raises RateLimited when the client or the upstream is over its limit"""
+        await asyncio.to_thread(rate_limiter.check, _client_key(scope), stage, depth)
+
+    async def analyze(self, scope, data: Dict, send):
+        if _wants_stream(scope):
+            await self.analyze_stream(scope, data, send)
+            return
+        # Depth labels metrics and keys caches, so only known depths go further
+        data["depth"] = normalize_depth(data.get("depth"))
+        await self._admit(scope, "analyze", data["depth"])
+        async with self.limiter.slot():
+            result = await self.engine.analyze_scenario(
+                scenario=data.get("scenario", ""),
+                depth=data["depth"],
+                use_cache=_use_cache(scope),
+            )
+        result = await asyncio.to_thread(
+            decision_store.record_framework, result, _session_id(scope)
+        )
+        await _send_json(send, scope, 200, result)
+
+    async def _framework(self, scope, data: Dict, send) -> Optional[Dict]:
+        """The framework sent, or the one its framework_hash / framework_id names"""
+        framework = await asyncio.to_thread(
+            decision_store.resolve_framework, data, _session_id(scope)
+        )
+        if framework is None:
+            await _send_json(
+                send,
+                scope,
+                404,
+                {"error": "Unknown framework_hash or framework_id; send the framework"},
+            )
+        elif framework:
+            framework["depth"] = normalize_depth(framework.get("depth"))
+        return framework
+
+    async def evaluate(self, scope, data: Dict, send):
+        if _wants_stream(scope):
+            await self.evaluate_stream(scope, data, send)
+            return
+        framework = await self._framework(scope, data, send)
+        if framework is None:
+            return
+        await self._admit(scope, "evaluate", framework.get("depth"))
+        async with self.limiter.slot():
+            result = await self.engine.evaluate_options(
+                framework=framework,
+                responses=data.get("responses", {}),
+                use_cache=_use_cache(scope),
+                previous=data.get("previous_evaluation"),
+                fanout=data.get("fanout"),
+            )
+        result = await asyncio.to_thread(
+            decision_store.record_evaluation,
+            framework,
+            data.get("responses", {}),
+            result,
+            _session_id(scope),
+        )
+        await _send_json(send, scope, 200, result)
+
+    async def analyze_stream(self, scope, data: Dict, send):
+        data["depth"] = normalize_depth(data.get("depth"))
+        await self._admit(scope, "analyze", data["depth"])
+        async with self.limiter.slot():
+            await self._send_sse(
+                send,
+                scope,
+                self.engine.analyze_scenario_stream(
+                    scenario=data.get("scenario", ""),
+                    depth=data["depth"],
+                    use_cache=_use_cache(scope),
+                ),
+                lambda framework: decision_store.record_framework(
+                    framework, _session_id(scope)
+                ),
+            )
+
+    async def evaluate_stream(self, scope, data: Dict, send):
+        framework = await self._framework(scope, data, send)
+        if framework is None:
+            return
+        await self._admit(scope, "evaluate", framework.get("depth"))
+        async with self.limiter.slot():
+            await self._send_sse(
+                send,
+                scope,
+                self.engine.evaluate_options_stream(
+                    framework=framework,
+                    responses=data.get("responses", {}),
+                    use_cache=_use_cache(scope),
+                ),
+                lambda evaluation: decision_store.record_evaluation(
+                    framework,
+                    data.get("responses", {}),
+                    evaluation,
+                    _session_id(scope),
+                ),
+            )
+
+    async def _send_sse(self, send, scope, events, save=None):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ]
+                + _cors_headers(scope),
+            }
+        )
+        async for event, data in events:
+            if event == "done" and save is not None:
+                # Persist before the final event so it can carry the decision id
+                data = await asyncio.to_thread(save, data)
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": format_sse(event, data).encode("utf-8"),
+                    "more_body": True,
+                }
+            )
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await warm_up_async()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await get_async_client().close()
+                except Exception as e:
+                    logger.warning("Error closing AsyncOpenAI client: %s", e)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app() -> DecisionASGIApp:
+    return DecisionASGIApp(flask_app)
+
+
+app = create_asgi_app()
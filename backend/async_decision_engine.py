@@ -0,0 +1,580 @@
+# backend/async_decision_engine.py
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from openai import AsyncOpenAI
+
+from cache import MemoryCache, ResponseCache, cache_key
+from client_pool import get_async_client
+from decision_engine import (
+    ANALYSIS_INSTRUCTIONS,
+    EVALUATION_INSTRUCTIONS,
+    DecisionEngine,
+    _budget_kwargs,
+    _format_kwargs,
+    _format_name,
+)
+from fanout import FANOUT_WORKERS, should_fan_out
+from incremental import IncrementalPlan, plan_incremental
+from log_config import get_logger
+from metrics import (
+    StreamTimer,
+    UPSTREAM_ERRORS,
+    UPSTREAM_SECONDS,
+    UPSTREAM_TTFB_SECONDS,
+    record_usage,
+    stage,
+)
+from rate_limit import UpstreamLimiter
+from routing import FAILOVER_ERRORS, ModelRouter, Route, hedged_async
+from scoring import framework_axes
+from semantic_cache import SemanticCache
+from single_flight import AsyncSingleFlight, single_flight
+from streaming import IncrementalJSONParser
+from structured import (
+    REPAIR_INSTRUCTIONS,
+    REASK_MAX_FRAGMENTS,
+    OutputCheck,
+    text_format,
+)
+
+logger = get_logger(__name__)
+
+
+class AsyncDecisionEngine(DecisionEngine):
+    """
+    asyncio-native DecisionEngine built on AsyncOpenAI. Prompt building, model
+    choice, caching and post-processing are shared with the sync engine; only
+    the upstream I/O is awaited, so one process can keep many calls in flight.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI = None,
+        cache: ResponseCache = None,
+        semantic: SemanticCache = None,
+        flight: AsyncSingleFlight = None,
+        router: ModelRouter = None,
+        upstream: UpstreamLimiter = None,
+    ):
+        super().__init__(
+            client=client,
+            cache=cache,
+            semantic=semantic,
+            router=router,
+            upstream=upstream,
+        )
+        self.flight = (
+            flight if flight is not None else AsyncSingleFlight(single_flight.lock)
+        )
+        # Counterpart of fanout_executor: caps parallel fan-out calls for the
+        # whole event loop
+        self._fanout_slots = asyncio.Semaphore(FANOUT_WORKERS)
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        return self._client if self._client is not None else get_async_client()
+
+    # Cache reads and writes go to a thread unless the backend is the
+    # in-process LRU: one slow disk or Redis call must not stall every other
+    # request on the event loop
+
+    def _cache_blocks(self) -> bool:
+        return not isinstance(self.cache.backend, (MemoryCache, type(None)))
+
+    async def _cache_get(self, key: str):
+        if not self._cache_blocks():
+            return self.cache.get(key)
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def _cache_set(self, key: str, value: str):
+        if not self._cache_blocks():
+            self.cache.set(key, value)
+            return
+        await asyncio.to_thread(self.cache.set, key, value)
+
+    async def _publish_async(self, key: str, output_text: str):
+        # Parsing a whole document is CPU work too, so this always leaves the loop
+        await asyncio.to_thread(self._publish, key, output_text)
+
+    async def _similar_framework_async(
+        self, scenario: str, depth: str, use_cache: bool = True
+    ):
+        if not use_cache or self.semantic_cache is None:
+            return None
+        # Embedding, search and the periodic index save are all blocking
+        return await asyncio.to_thread(
+            self._similar_framework, scenario, depth, use_cache
+        )
+
+    async def _remember_framework_async(
+        self, scenario: str, depth: str, framework: Dict
+    ):
+        if self.semantic_cache is not None and framework:
+            await asyncio.to_thread(
+                self._remember_framework, scenario, depth, framework
+            )
+
+    async def _create_text(
+        self,
+        model: str,
+        instructions: str,
+        prompt: str,
+        use_cache: bool = True,
+        depth: str = None,
+        output_format: Dict = None,
+        stage: str = "evaluate",
+    ) -> str:
+        key = cache_key(model, instructions, prompt, _format_name(output_format))
+        if use_cache:
+            cached = await self._cache_get(key)
+            if cached is not None:
+                logger.info("Cache hit for model: %s", model)
+                return cached
+
+        return await self.flight.do(
+            key,
+            lambda: self._fetch_text(
+                key, model, instructions, prompt, use_cache, depth, output_format, stage
+            ),
+        )
+
+    async def _fetch_text(
+        self,
+        key: str,
+        model: str,
+        instructions: str,
+        prompt: str,
+        use_cache: bool,
+        depth: str = None,
+        output_format: Dict = None,
+        stage: str = "evaluate",
+    ) -> str:
+        token, waited = await self.flight.acquire_across_workers(key)
+        try:
+            if waited and use_cache:
+                cached = await self._cache_get(key)
+                if cached is not None:
+                    self.flight.stats.record("coalesced_across_workers")
+                    return cached
+
+            output_text, answered = await self._call_routed(
+                self.router.route(stage, depth),
+                model,
+                instructions,
+                prompt,
+                depth,
+                output_format,
+            )
+            publish_key = key
+            if answered != model:
+                # A backup model's answer belongs under that model's key
+                publish_key = cache_key(
+                    answered, instructions, prompt, _format_name(output_format)
+                )
+            await self._publish_async(publish_key, output_text)
+            return output_text
+        finally:
+            await self.flight.release_across_workers(key, token)
+
+    async def _call_upstream(
+        self,
+        model: str,
+        instructions: str,
+        prompt: str,
+        depth: str = None,
+        output_format: Dict = None,
+        max_output_tokens: int = None,
+    ) -> str:
+        async with self.upstream.slot_async(model):
+            start = time.perf_counter()
+            try:
+                async with self.client.responses.with_streaming_response.create(
+                    model=model,
+                    instructions=instructions,
+                    input=prompt,
+                    **_format_kwargs(output_format),
+                    **_budget_kwargs(max_output_tokens),
+                ) as raw:
+                    UPSTREAM_TTFB_SECONDS.observe(
+                        time.perf_counter() - start, model=model, mode="blocking"
+                    )
+                    response = await raw.parse()
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(model=model, error=type(e).__name__)
+                self.router.record(model, time.perf_counter() - start, ok=False)
+                raise
+            elapsed = time.perf_counter() - start
+            UPSTREAM_SECONDS.observe(elapsed, model=model, mode="blocking")
+            self.router.record(model, elapsed)
+            record_usage(model, depth, getattr(response, "usage", None))
+            return response.output_text
+
+    async def _call_routed(
+        self,
+        route: Route,
+        model: str,
+        instructions: str,
+        prompt: str,
+        depth: str = None,
+        output_format: Dict = None,
+    ) -> Tuple[str, str]:
+        async def call(target: str) -> Tuple[str, str]:
+            output_text = await self._call_upstream(
+                target,
+                instructions,
+                prompt,
+                depth,
+                output_format,
+                route.max_output_tokens,
+            )
+            return output_text, target
+
+        backup = route.next_model(model)
+        if backup is None:
+            return await call(model)
+        if route.hedge_after is not None:
+            # The slower call is cancelled once the other has answered
+            return await hedged_async(
+                lambda: call(model),
+                lambda: call(backup),
+                route.hedge_after,
+                lambda event: self.router.event(route, backup, event),
+            )
+        try:
+            return await call(model)
+        except FAILOVER_ERRORS as e:
+            logger.warning("%s failed (%s), retrying on %s", model, e, backup)
+            self.router.event(route, backup, "retry")
+            return await call(backup)
+
+    async def _check_output(
+        self,
+        check: OutputCheck,
+        operation: str,
+        use_cache: bool = True,
+        depth: str = None,
+    ) -> Dict:
+        async def reask(fragment, prompt: str, output_format: Dict):
+            logger.info("Re-asking invalid fragment %s", fragment.label)
+            try:
+                output_text = await self._create_text(
+                    self._choose_model(depth, "repair"),
+                    REPAIR_INSTRUCTIONS,
+                    prompt,
+                    use_cache,
+                    depth,
+                    output_format,
+                    "repair",
+                )
+                check.apply(fragment, output_text)
+            except Exception as e:
+                logger.warning("Re-ask for %s failed: %s", fragment.label, e)
+
+        # Fragments are independent, so their re-asks run concurrently
+        await asyncio.gather(
+            *(reask(*call) for call in check.reasks(REASK_MAX_FRAGMENTS))
+        )
+        with stage("validate", operation):
+            return check.result()
+
+    async def analyze_scenario(
+        self, scenario: str, depth: str = "balanced", use_cache: bool = True
+    ) -> Dict:
+        similar = await self._similar_framework_async(scenario, depth, use_cache)
+        if similar is not None:
+            return self._finish_analysis(similar, scenario, depth)
+
+        with stage("prompt_build", "analyze"):
+            prompt = self._build_analysis_prompt(scenario, depth)
+
+        try:
+            chosen_model = self._choose_model(depth, "analyze")
+
+            logger.info("Calling model: %s for depth: %s", chosen_model, depth)
+            output_text = await self._create_text(
+                chosen_model,
+                ANALYSIS_INSTRUCTIONS,
+                prompt,
+                use_cache,
+                depth,
+                text_format("framework"),
+                "analyze",
+            )
+            check = self._framework_check(
+                self._parse_output(output_text, "analyze"), scenario
+            )
+            framework = await self._check_output(check, "analyze", use_cache, depth)
+            await self._remember_framework_async(scenario, depth, framework)
+            return self._finish_analysis(framework, scenario, depth)
+
+        except Exception as e:
+            logger.error("Error in scenario analysis: %s", e)
+            return {}
+
+    async def evaluate_options(
+        self,
+        framework: Dict,
+        responses: Dict,
+        use_cache: bool = True,
+        previous: Dict = None,
+        fanout: bool = None,
+    ) -> Dict:
+        chosen_model = self._choose_model(framework.get("depth", "balanced"))
+
+        plan = plan_incremental(framework, responses, previous)
+        if plan is not None:
+            return await self._evaluate_incremental(
+                framework, responses, previous, plan, chosen_model, use_cache
+            )
+
+        options = [o.get("name") for o in framework.get("options", []) if o.get("name")]
+        if should_fan_out(len(options), fanout):
+            return await self._evaluate_fanout(
+                framework, responses, options, chosen_model, use_cache
+            )
+
+        with stage("prompt_build", "evaluate"):
+            prompt = self._build_evaluation_prompt(framework, responses)
+        criteria = framework_axes(framework)[1]
+
+        try:
+            logger.info("Calling model: %s for evaluation", chosen_model)
+            output_text = await self._create_text(
+                chosen_model,
+                EVALUATION_INSTRUCTIONS,
+                prompt,
+                use_cache,
+                framework.get("depth"),
+                text_format("evaluation", options, criteria),
+            )
+            check = self._scores_check(
+                "evaluation",
+                self._parse_output(output_text, "evaluate"),
+                options,
+                criteria,
+            )
+            evaluation = await self._check_output(
+                check, "evaluate", use_cache, framework.get("depth")
+            )
+            return self._finish_evaluation(
+                evaluation, framework, responses, chosen_model
+            )
+
+        except Exception as e:
+            logger.error("Error in evaluation: %s", e)
+            return {}
+
+    async def _evaluate_fanout(
+        self,
+        framework: Dict,
+        responses: Dict,
+        options: List[str],
+        chosen_model: str,
+        use_cache: bool = True,
+    ) -> Dict:
+        criteria = framework_axes(framework)[1]
+
+        async def score(chunk: List[str], prompt: str) -> Dict:
+            async with self._fanout_slots:
+                output_text = await self._create_text(
+                    chosen_model,
+                    EVALUATION_INSTRUCTIONS,
+                    prompt,
+                    use_cache,
+                    framework.get("depth"),
+                    text_format("option_scores", chunk, criteria),
+                )
+            check = self._scores_check(
+                "option_scores",
+                self._parse_output(output_text, "evaluate"),
+                chunk,
+                criteria,
+            )
+            return await self._check_output(
+                check, "evaluate", use_cache, framework.get("depth")
+            )
+
+        try:
+            calls = self._fanout_prompts(framework, responses, options)
+            logger.info(
+                "Calling model: %s for evaluation in %d parallel calls",
+                chosen_model,
+                len(calls),
+            )
+            parts = await asyncio.gather(*(score(*call) for call in calls))
+            return self._finish_fanout(parts, framework, responses, chosen_model)
+
+        except Exception as e:
+            logger.error("Error in fan-out evaluation: %s", e)
+            return {}
+
+    async def _evaluate_incremental(
+        self,
+        framework: Dict,
+        responses: Dict,
+        previous: Dict,
+        plan: IncrementalPlan,
+        chosen_model: str,
+        use_cache: bool = True,
+    ) -> Dict:
+        if not plan.changed:
+            return self._finish_incremental(
+                previous, {}, plan, framework, responses, previous.get("model_used")
+            )
+
+        try:
+            logger.info(
+                "Calling model: %s to re-score %d changed criteria",
+                chosen_model,
+                len(plan.changed),
+            )
+            with stage("prompt_build", "evaluate"):
+                prompt = self._build_rescore_prompt(framework, plan)
+            options = framework_axes(framework)[0]
+            output_text = await self._create_text(
+                chosen_model,
+                EVALUATION_INSTRUCTIONS,
+                prompt,
+                use_cache,
+                framework.get("depth"),
+                text_format("rescore", options, plan.changed),
+            )
+            check = self._scores_check(
+                "rescore",
+                self._parse_output(output_text, "evaluate"),
+                options,
+                plan.changed,
+            )
+            partial = await self._check_output(
+                check, "evaluate", use_cache, framework.get("depth")
+            )
+            return self._finish_incremental(
+                previous, partial, plan, framework, responses, chosen_model
+            )
+
+        except Exception as e:
+            logger.error("Error in incremental evaluation: %s", e)
+            return {}
+
+    async def analyze_scenario_stream(
+        self, scenario: str, depth: str = "balanced", use_cache: bool = True
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        chosen_model = self._choose_model(depth, "analyze")
+        with stage("prompt_build", "analyze"):
+            prompt = self._build_analysis_prompt(scenario, depth)
+        yield "start", {"model": chosen_model, "depth": depth}
+
+        try:
+            parser = IncrementalJSONParser()
+            similar = await self._similar_framework_async(scenario, depth, use_cache)
+            if similar is not None:
+                for event in parser.feed(json.dumps(similar)):
+                    yield event
+            else:
+                logger.info("Streaming model: %s for depth: %s", chosen_model, depth)
+                async for event in self._stream_json(
+                    parser,
+                    chosen_model,
+                    ANALYSIS_INSTRUCTIONS,
+                    prompt,
+                    use_cache,
+                    depth,
+                    text_format("framework"),
+                    "analyze",
+                ):
+                    yield event
+            check = self._framework_check(parser.result(), scenario)
+            framework = await self._check_output(check, "analyze", use_cache, depth)
+            if similar is None:
+                await self._remember_framework_async(scenario, depth, framework)
+
+            yield "done", self._finish_analysis(framework, scenario, depth)
+
+        except Exception as e:
+            logger.error("Error in streaming scenario analysis: %s", e)
+            yield "error", {"message": "Scenario analysis failed"}
+
+    async def evaluate_options_stream(
+        self, framework: Dict, responses: Dict, use_cache: bool = True
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        chosen_model = self._choose_model(framework.get("depth", "balanced"))
+        with stage("prompt_build", "evaluate"):
+            prompt = self._build_evaluation_prompt(framework, responses)
+        options, criteria, _ = framework_axes(framework)
+        yield "start", {"model": chosen_model}
+
+        try:
+            logger.info("Streaming model: %s for evaluation", chosen_model)
+            parser = IncrementalJSONParser()
+            async for event in self._stream_json(
+                parser,
+                chosen_model,
+                EVALUATION_INSTRUCTIONS,
+                prompt,
+                use_cache,
+                framework.get("depth"),
+                text_format("evaluation", options, criteria),
+            ):
+                yield event
+
+            check = self._scores_check("evaluation", parser.result(), options, criteria)
+            evaluation = await self._check_output(
+                check, "evaluate", use_cache, framework.get("depth")
+            )
+            yield "done", self._finish_evaluation(
+                evaluation, framework, responses, chosen_model
+            )
+
+        except Exception as e:
+            logger.error("Error in streaming evaluation: %s", e)
+            yield "error", {"message": "Evaluation failed"}
+
+    async def _stream_json(
+        self,
+        parser: IncrementalJSONParser,
+        model: str,
+        instructions: str,
+        prompt: str,
+        use_cache: bool = True,
+        depth: str = None,
+        output_format: Dict = None,
+        stage: str = "evaluate",
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        key = cache_key(model, instructions, prompt, _format_name(output_format))
+        cached = await self._cache_get(key) if use_cache else None
+        if cached is not None:
+            logger.info("Cache hit for model: %s", model)
+            for event in parser.feed(cached):
+                yield event
+            return
+
+        route = self.router.route(stage, depth)
+        async with self.upstream.slot_async(model):
+            timer = StreamTimer(model, depth)
+            try:
+                stream = await self.client.responses.create(
+                    model=model,
+                    instructions=instructions,
+                    input=prompt,
+                    stream=True,
+                    **_format_kwargs(output_format),
+                    **_budget_kwargs(route.max_output_tokens),
+                )
+                async for event in stream:
+                    timer.event(event)
+                    if event.type == "response.output_text.delta":
+                        for parsed in parser.feed(event.delta):
+                            yield parsed
+                    elif event.type in ("response.failed", "error"):
+                        raise RuntimeError(f"Upstream stream failed: {event.type}")
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(model=model, error=type(e).__name__)
+                self.router.record(model, time.perf_counter() - timer.start, ok=False)
+                raise
+            timer.finish()
+            self.router.record(model, time.perf_counter() - timer.start)
+
+        if parser.done:
+            await self._cache_set(key, parser.document)
@@ -0,0 +1,494 @@
+# backend/batch.py
+"""
+Bulk scenario analysis: a JSONL file of scenarios in, a JSONL file of
+frameworks out, resumable from that output file.
+
+    python batch.py scenarios.jsonl -o frameworks.jsonl --concurrency 16
+    python batch.py scenarios.jsonl -o frameworks.jsonl --provider
+
+Each input line is {"id": ..., "scenario": "...", "depth": "balanced"} (id and
+depth optional). Output lines are {"id", "depth", "framework"} or
+{"id", "depth", "error"}; running again with the same output file skips every
+id that already has a framework and retries the rest.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from openai.types.responses import Response
+
+from decision_engine import DecisionEngine
+from log_config import get_logger
+from metrics import record_usage
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; checkpoints are then unlocked
+    fcntl = None
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+DEPTHS = ("quick", "balanced", "thorough")
+# Analyses in flight per batch; each holds one upstream connection
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+# Seconds a batch item may wait for the client's rate limit before it fails
+BATCH_ADMIT_TIMEOUT = float(os.getenv("BATCH_ADMIT_TIMEOUT", "60"))
+# Seconds between status checks of a provider batch
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "30"))
+# The provider accepts at most this many requests per batch file
+PROVIDER_MAX_REQUESTS = 50000
+# Checkpoints of /api/analyze/batch runs, one JSONL file per client and batch_id
+BATCH_CHECKPOINT_DIR = os.getenv("BATCH_CHECKPOINT_DIR") or os.path.join(
+    tempfile.gettempdir(), "broadly-batches"
+)
+
+_BATCH_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def parse_items(lines: Iterable[str], default_depth: str = "balanced") -> List[Dict]:
+    """
+    Scenarios from JSONL lines; raises ValueError naming the first bad line.
+    Lines without an id are numbered from 1, blank lines are skipped.
+    """
+    items = []
+    seen = set()
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({e.msg})")
+        if isinstance(entry, str):
+            entry = {"scenario": entry}
+        if not isinstance(entry, dict) or not str(entry.get("scenario", "")).strip():
+            raise ValueError(f"Line {number}: expected an object with a scenario")
+        depth = entry.get("depth") or default_depth
+        if depth not in DEPTHS:
+            raise ValueError(f"Line {number}: unknown depth {depth!r}")
+        item_id = str(entry.get("id", number))
+        if item_id in seen:
+            raise ValueError(f"Line {number}: duplicate id {item_id!r}")
+        seen.add(item_id)
+        items.append({"id": item_id, "scenario": entry["scenario"], "depth": depth})
+    return items
+
+
+def valid_batch_id(batch_id: str) -> bool:
+    return bool(batch_id) and bool(_BATCH_ID.match(batch_id))
+
+
+def checkpoint_path(batch_id: str, owner: str = "") -> str:
+    """
+    Checkpoint file of batch_id, in a directory of its own per owner (the
+    client's rate limit key) so one client cannot resume another's batch
+    """
+    namespace = hashlib.sha256(owner.encode("utf-8")).hexdigest()[:32]
+    directory = os.path.join(BATCH_CHECKPOINT_DIR, namespace)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{batch_id}.jsonl")
+
+
+class Checkpoint:
+    """
+    Append-only JSONL file of results that doubles as the resume point: ids
+    with a framework recorded there are done, failed ones are retried. A
+    submitted provider batch is recorded too, so a resumed run collects it
+    instead of submitting the same requests again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, Dict] = {}
+        self.provider_batch: Optional[Dict] = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The line being written when the last run was interrupted
+                    continue
+                if "provider_batch" in record:
+                    marker = record["provider_batch"]
+                    submitted = marker.get("status") == "submitted"
+                    self.provider_batch = marker if submitted else None
+                elif record.get("framework"):
+                    self.done[str(record["id"])] = record
+
+    def acquire(self) -> bool:
+        """Open the file for appending; False if another run holds it"""
+        self._file = open(self.path, "a+", encoding="utf-8")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._file.close()
+                self._file = None
+                return False
+        # Start on a fresh line after a partly written one
+        if self._file.tell() > 0:
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != "\n":
+                self._file.write("\n")
+        return True
+
+    def write(self, record: Dict):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if record.get("framework"):
+                self.done[str(record["id"])] = record
+            elif "provider_batch" in record:
+                marker = record["provider_batch"]
+                submitted = marker.get("status") == "submitted"
+                self.provider_batch = marker if submitted else None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BatchStats:
+    """Progress of one batch run"""
+
+    def __init__(self, total: int, resumed: int = 0):
+        self.total = total
+        self.resumed = resumed
+        self.succeeded = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+
+    def record(self, result: Dict):
+        if result.get("framework"):
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def snapshot(self) -> Dict:
+        elapsed = time.perf_counter() - self.start
+        finished = self.succeeded + self.failed
+        return {
+            "total": self.total,
+            "resumed": self.resumed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "remaining": self.total - self.resumed - finished,
+            "seconds": round(elapsed, 3),
+            "per_second": round(finished / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+
+def _result(item: Dict, framework: Dict = None, error: str = None) -> Dict:
+    result = {"id": item["id"], "depth": item["depth"]}
+    if framework:
+        result["framework"] = framework
+    else:
+        result["error"] = error or "Scenario analysis returned no framework"
+    return result
+
+
+class BatchRunner:
+    """
+    Analyzes scenarios with at most `concurrency` in flight, yielding each
+    result as soon as it is ready (not in input order). Results are written to
+    the checkpoint by the worker threads, so analyses already running when the
+    consumer goes away still count on resume. `admit`, when given, is called
+    with each item before it is analyzed and may block or raise to throttle it.
+    """
+
+    def __init__(
+        self,
+        engine,
+        concurrency: int = BATCH_CONCURRENCY,
+        use_cache: bool = True,
+        admit: Callable[[Dict], None] = None,
+    ):
+        self.engine = engine
+        self.concurrency = max(1, concurrency)
+        self.use_cache = use_cache
+        self.admit = admit
+
+    def _analyze(self, item: Dict, checkpoint: Optional[Checkpoint]) -> Dict:
+        try:
+            if self.admit is not None:
+                self.admit(item)
+            framework = self.engine.analyze_scenario(
+                scenario=item["scenario"],
+                depth=item["depth"],
+                use_cache=self.use_cache,
+                raise_errors=True,
+            )
+            result = _result(item, framework)
+        except Exception as e:
+            logger.warning("Batch item %s failed: %s", item["id"], e)
+            result = _result(item, error=f"{type(e).__name__}: {e}")
+        if checkpoint is not None:
+            checkpoint.write(result)
+        return result
+
+    def run(self, items: List[Dict], checkpoint: Checkpoint = None) -> Iterator[Dict]:
+        done = checkpoint.done if checkpoint is not None else {}
+        pending = [item for item in items if item["id"] not in done]
+        if not pending:
+            return
+        executor = ThreadPoolExecutor(
+            max_workers=min(self.concurrency, len(pending)),
+            thread_name_prefix="batch",
+        )
+        futures = [executor.submit(self._analyze, item, checkpoint) for item in pending]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Consumer gone (e.g. client disconnected): drop what has not
+            # started and let running analyses reach the checkpoint
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ProviderBatchRunner:
+    """
+    Runs analyses through the provider's Batch API: the analyze requests are
+    uploaded as one JSONL file, the batch is polled until it ends, and each
+    output is then validated and finished locally like any other analysis.
+    Cheaper per token and outside the synchronous rate limits, but results
+    arrive within the provider's completion window (up to 24h), not at once.
+    """
+
+    def __init__(
+        self,
+        engine,
+        poll_interval: float = BATCH_POLL_INTERVAL,
+        use_cache: bool = True,
+        client=None,
+    ):
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.use_cache = use_cache
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else self.engine.client
+
+    def _submit(self, items: List[Dict]) -> str:
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": item["id"],
+                    "method": "POST",
+                    "url": "/v1/responses",
+                    "body": self.engine.analysis_request(
+                        item["scenario"], item["depth"]
+                    ),
+                },
+                ensure_ascii=False,
+            )
+            for item in items
+        ]
+        upload = self.client.files.create(
+            file=("analyze.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch",
+        )
+        batch = self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/responses",
+            completion_window="24h",
+            metadata={"source": "broadly"},
+        )
+        logger.info(
+            "Submitted provider batch %s with %d requests", batch.id, len(items)
+        )
+        return batch.id
+
+    def _wait(self, batch_id: str):
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in ("completed", "failed", "expired", "cancelled"):
+                return batch
+            counts = batch.request_counts
+            logger.info(
+                "Provider batch %s %s: %s/%s done",
+                batch_id,
+                batch.status,
+                counts.completed + counts.failed if counts else 0,
+                counts.total if counts else "?",
+            )
+            time.sleep(self.poll_interval)
+
+    def _outputs(self, batch) -> Dict[str, Dict]:
+        """custom_id -> {"body": Responses API response} or {"error": message}"""
+        outputs = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                response = row.get("response") or {}
+                body = response.get("body") or {}
+                if response.get("status_code") == 200:
+                    outputs[row["custom_id"]] = {"body": body}
+                else:
+                    error = row.get("error") or body.get("error") or {}
+                    outputs[row["custom_id"]] = {
+                        "error": error.get("message")
+                        or f"HTTP {response.get('status_code')}"
+                    }
+        return outputs
+
+    def _collect(
+        self, batch_id: str, items: List[Dict], checkpoint: Optional[Checkpoint]
+    ) -> Iterator[Dict]:
+        batch = self._wait(batch_id)
+        outputs = self._outputs(batch)
+        for item in items:
+            output = outputs.get(item["id"])
+            if output is None:
+                result = _result(item, error=f"Provider batch {batch.status}")
+            elif "error" in output:
+                result = _result(item, error=output["error"])
+            else:
+                try:
+                    response = Response.model_validate(output["body"])
+                    record_usage(response.model, item["depth"], response.usage)
+                    framework = self.engine.analysis_from_output(
+                        response.output_text,
+                        item["scenario"],
+                        item["depth"],
+                        self.use_cache,
+                    )
+                    result = _result(item, framework)
+                except Exception as e:
+                    result = _result(item, error=f"{type(e).__name__}: {e}")
+            if checkpoint is not None:
+                checkpoint.write(result)
+            yield result
+
+    def run(self, items: List[Dict], checkpoint: Checkpoint = None) -> Iterator[Dict]:
+        done = checkpoint.done if checkpoint is not None else {}
+        pending = {item["id"]: item for item in items if item["id"] not in done}
+
+        if self.use_cache:
+            # Near-duplicates of scenarios analysed before need no request
+            for item_id, item in list(pending.items()):
+                framework = self.engine.cached_analysis(item["scenario"], item["depth"])
+                if framework:
+                    result = _result(pending.pop(item_id), framework)
+                    if checkpoint is not None:
+                        checkpoint.write(result)
+                    yield result
+
+        resumed = checkpoint.provider_batch if checkpoint is not None else None
+        while pending:
+            if resumed is not None:
+                batch_id = resumed["id"]
+                ids = [item_id for item_id in resumed["items"] if item_id in pending]
+                resumed = None
+                logger.info("Resuming provider batch %s", batch_id)
+            else:
+                ids = list(pending)[:PROVIDER_MAX_REQUESTS]
+                batch_id = self._submit([pending[item_id] for item_id in ids])
+                if checkpoint is not None:
+                    checkpoint.write(
+                        {
+                            "provider_batch": {
+                                "id": batch_id,
+                                "status": "submitted",
+                                "items": ids,
+                            }
+                        }
+                    )
+            yield from self._collect(
+                batch_id, [pending.pop(item_id) for item_id in ids], checkpoint
+            )
+            if checkpoint is not None:
+                checkpoint.write(
+                    {"provider_batch": {"id": batch_id, "status": "collected"}}
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a JSONL file of scenarios")
+    parser.add_argument("input", help="JSONL of scenarios, - for stdin")
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="JSONL results, also the checkpoint to resume from (- for stdout)",
+    )
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--depth", choices=DEPTHS, default="balanced")
+    parser.add_argument(
+        "--provider", action="store_true", help="submit through the Batch API"
+    )
+    parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL)
+    parser.add_argument(
+        "--no-cache", action="store_true", help="skip the response/semantic caches"
+    )
+    args = parser.parse_args()
+
+    if args.input == "-":
+        items = parse_items(sys.stdin, args.depth)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            items = parse_items(f, args.depth)
+
+    engine = DecisionEngine()
+    if args.provider:
+        runner = ProviderBatchRunner(engine, args.poll_interval, not args.no_cache)
+    else:
+        runner = BatchRunner(engine, args.concurrency, not args.no_cache)
+
+    checkpoint = None
+    if args.output != "-":
+        checkpoint = Checkpoint(args.output)
+        if not checkpoint.acquire():
+            sys.exit(f"{args.output} is in use by another batch run")
+
+    resumed = sum(1 for item in items if checkpoint and item["id"] in checkpoint.done)
+    stats = BatchStats(len(items), resumed)
+    if resumed:
+        print(f"Resuming: {resumed}/{len(items)} already done", file=sys.stderr)
+    try:
+        for result in runner.run(items, checkpoint):
+            stats.record(result)
+            if checkpoint is None:
+                print(json.dumps(result, ensure_ascii=False), flush=True)
+            else:
+                print(
+                    f"{result['id']}: {'ok' if result.get('framework') else result['error']}",
+                    file=sys.stderr,
+                )
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        print(json.dumps(stats.snapshot()), file=sys.stderr)
+    sys.exit(1 if stats.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
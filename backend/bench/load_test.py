@@ -0,0 +1,411 @@
+# backend/bench/load_test.py
+"""
+Offline load test: serves the API with gunicorn (app:app, the production path)
+or uvicorn (asgi:app) against the mock LLM server, then drives /api/analyze and
+/api/evaluate at increasing concurrency. Reports p50/p95/p99 latency, requests
+per second and resident memory per worker; --max-p95-ms / --max-error-rate
+turn it into a pass/fail check.
+
+    python bench/load_test.py --levels 1,4,16,32 --latency 0.2 --token-rate 200
+    python bench/load_test.py --server uvicorn --stream --json results.json
+    python bench/load_test.py --model-latency gpt-4.1-2025-04-14=3 \
+        --routes '{"evaluate": {"balanced": {"hedge_after": 1}}}'
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = os.path.join(BACKEND_DIR, "test")
+
+
+def load_json(name: str) -> Dict:
+    with open(os.path.join(TEST_DIR, name), "r") as f:
+        return json.load(f)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[:3]} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_mock(args, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable,
+        os.path.join(BACKEND_DIR, "bench", "mock_llm.py"),
+        "--port",
+        str(port),
+        "--latency",
+        str(args.latency),
+        "--failure-rate",
+        str(args.failure_rate),
+        "--failure-status",
+        str(args.failure_status),
+        "--seed",
+        "0",
+    ]
+    if args.token_rate:
+        command += ["--token-rate", str(args.token_rate)]
+    for value in args.model_latency:
+        command += ["--model-latency", value]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{port}/v1/models", process)
+    return process
+
+
+def start_server(args, port: int, mock_port: int, workdir: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        OPENAI_API_KEY="bench",
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'decisions.sqlite3')}",
+        JOB_QUEUE_PATH=os.path.join(workdir, "jobs.sqlite3"),
+        SEMANTIC_CACHE="0",
+        SINGLE_FLIGHT_BACKEND="none",
+        # Every request comes from one IP; client buckets would shed most of them
+        RATE_LIMIT_BACKEND=args.rate_limit,
+        RATE_LIMIT_PATH=os.path.join(workdir, "rate_limit.sqlite3"),
+        LOG_LEVEL=args.log_level,
+    )
+    if args.routes:
+        env["MODEL_ROUTES"] = args.routes
+    if args.server == "uvicorn":
+        command = [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "asgi:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ]
+    else:
+        command = [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            "gunicorn.conf.py",
+            "--log-level",
+            "warning",
+            "app:app",
+        ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    wait_for(f"http://127.0.0.1:{port}/", process, timeout=60.0)
+    return process
+
+
+def _is_helper(pid: int) -> bool:
+    # multiprocessing's resource tracker is a child of uvicorn, not a worker
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return b"resource_tracker" in f.read()
+    except OSError:
+        return True
+
+
+def worker_pids(pid: int) -> List[int]:
+    """Child processes of the server (its workers), or the server itself"""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; ppid follows its ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid and not _is_helper(int(entry)):
+            children.append(int(entry))
+    return children or [pid]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def worker_memory(pid: int) -> List[float]:
+    if not os.path.isdir("/proc"):
+        return []
+    return [mb for mb in map(rss_mb, worker_pids(pid)) if mb is not None]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    rank = max(1, round(q / 100 * len(samples)))
+    return samples[min(rank, len(samples)) - 1]
+
+
+class Endpoint:
+    def __init__(self, name: str, path: str, body: Callable[[int], Dict], key: str):
+        self.name = name
+        self.path = path
+        self.body = body
+        # A 200 without this key is the engine's empty fallback, i.e. a failure
+        self.key = key
+
+
+def call(client: httpx.Client, url: str, endpoint: Endpoint, i: int, stream: bool):
+    start = time.perf_counter()
+    try:
+        response = client.post(
+            url + endpoint.path + ("?stream=1" if stream else ""),
+            json=endpoint.body(i),
+        )
+        if stream:
+            ok = response.status_code == 200 and "event: done" in response.text
+        else:
+            ok = response.status_code == 200 and endpoint.key in response.json()
+    except (httpx.HTTPError, ValueError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def run_level(
+    url: str, endpoint: Endpoint, concurrency: int, total: int, args, server_pid: int
+) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency)
+    headers = {} if args.identical else {"Cache-Control": "no-cache"}
+    with httpx.Client(limits=limits, timeout=args.timeout, headers=headers) as client:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            results = list(
+                pool.map(
+                    lambda i: call(client, url, endpoint, i, args.stream), range(total)
+                )
+            )
+            elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds * 1000 for seconds, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    memory = worker_memory(server_pid)
+    return {
+        "endpoint": endpoint.name,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4),
+        "rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "rss_mb_per_worker": [round(mb, 1) for mb in memory],
+    }
+
+
+def endpoints(url: str, args) -> List[Endpoint]:
+    scenario = load_json("scenario.json")
+    responses = load_json("responses.json")
+    # Evaluate a framework the server produced, as the frontend does
+    framework = httpx.post(
+        url + "/api/analyze", json=scenario, timeout=args.timeout
+    ).json()
+
+    def unique(i: int) -> str:
+        # Distinct prompts defeat the response cache and single-flight, so every
+        # request reaches the (mock) upstream
+        return "" if args.identical else f" #{i}"
+
+    def analyze_body(i: int) -> Dict:
+        return dict(scenario, scenario=scenario["scenario"] + unique(i))
+
+    def evaluate_body(i: int) -> Dict:
+        body = {"framework": dict(framework), "responses": responses}
+        body["framework"]["title"] = framework.get("title", "") + unique(i)
+        return body
+
+    available = {
+        "analyze": Endpoint("analyze", "/api/analyze", analyze_body, "options"),
+        "evaluate": Endpoint("evaluate", "/api/evaluate", evaluate_body, "ranking"),
+    }
+    return [available[name] for name in args.endpoints.split(",")]
+
+
+def report(result: Dict):
+    memory = ", ".join(f"{mb:.0f}" for mb in result["rss_mb_per_worker"]) or "n/a"
+    print(
+        f"{result['endpoint']:<9} {result['concurrency']:>4} {result['requests']:>6} "
+        f"{result['errors']:>6} {result['rps']:>8.1f} {result['p50_ms']:>9.1f} "
+        f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}  {memory}",
+        flush=True,
+    )
+
+
+def report_routing(url: str):
+    """Per-model latency as seen by the router of whichever worker answers"""
+    stats = httpx.get(url + "/api/routing/stats", timeout=10.0).json()
+    for model, summary in sorted(stats["models"].items()):
+        print(
+            f"routing   {model}: {summary['calls']} calls, p50 {summary['p50']}s, "
+            f"p95 {summary['p95']}s, error rate {summary['error_rate']}"
+        )
+
+
+def report_prompt_cache(url: str):
+    """Input tokens served from the upstream prompt cache, per model"""
+    stats = httpx.get(url + "/api/prompt/stats", timeout=10.0).json()
+    for model, summary in sorted(stats["prefix_cache"].items()):
+        print(
+            f"prefix    {model}: {summary['cached_tokens']}/{summary['input_tokens']} "
+            f"input tokens cached ({summary['cached_ratio']:.1%}), "
+            f"{summary['calls_with_hits']}/{summary['calls']} calls hit"
+        )
+
+
+def report_rate_limit(url: str):
+    """Shed requests and upstream concurrency of whichever worker answers"""
+    stats = httpx.get(url + "/api/ratelimit/stats", timeout=10.0).json()
+    clients, upstream = stats["clients"], stats["upstream"]
+    print(
+        f"ratelimit admitted {clients['admitted']}, shed {clients['shed']}, "
+        f"upstream limit {upstream['limit']}/{upstream['max_concurrency']}, "
+        f"{upstream['upstream_429s']} upstream 429s"
+    )
+
+
+def check(results: List[Dict], args) -> List[str]:
+    failures = []
+    for result in results:
+        label = f"{result['endpoint']} at concurrency {result['concurrency']}"
+        if args.max_p95_ms is not None and result["p95_ms"] > args.max_p95_ms:
+            failures.append(
+                f"{label}: p95 {result['p95_ms']} ms > {args.max_p95_ms} ms"
+            )
+        if result["error_rate"] > args.max_error_rate:
+            failures.append(
+                f"{label}: error rate {result['error_rate']} > {args.max_error_rate}"
+            )
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline API load test")
+    parser.add_argument("--server", choices=("gunicorn", "uvicorn"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads")
+    parser.add_argument("--levels", default="1,2,4,8,16,32")
+    parser.add_argument(
+        "--requests", type=int, default=50, help="per level (at least 4x concurrency)"
+    )
+    parser.add_argument("--endpoints", default="analyze,evaluate")
+    parser.add_argument("--stream", action="store_true", help="use ?stream=1")
+    parser.add_argument(
+        "--identical",
+        action="store_true",
+        help="repeat one payload, exercising the response cache and single-flight",
+    )
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=500)
+    parser.add_argument(
+        "--model-latency",
+        action="append",
+        default=[],
+        metavar="MODEL=SECONDS",
+        help="mock latency for one model (repeatable)",
+    )
+    parser.add_argument("--routes", help="MODEL_ROUTES for the server (JSON)")
+    parser.add_argument(
+        "--rate-limit",
+        choices=("none", "memory", "sqlite"),
+        default="none",
+        help="RATE_LIMIT_BACKEND for the server (per-client token buckets)",
+    )
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    parser.add_argument("--max-error-rate", type=float, default=1.0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    mock_port, port = free_port(), free_port()
+    url = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        mock = start_mock(args, mock_port)
+        server = None
+        try:
+            server = start_server(args, port, mock_port, workdir)
+            targets = endpoints(url, args)
+            print(
+                f"{args.server}, {args.workers} workers, mock latency {args.latency}s, "
+                f"token rate {args.token_rate or 'unlimited'}, "
+                f"failure rate {args.failure_rate}"
+            )
+            print(
+                f"{'endpoint':<9} {'conc':>4} {'reqs':>6} {'errors':>6} {'rps':>8} "
+                f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  rss MB/worker"
+            )
+            results = []
+            for concurrency in (int(level) for level in args.levels.split(",")):
+                total = max(args.requests, concurrency * 4)
+                for endpoint in targets:
+                    result = run_level(
+                        url, endpoint, concurrency, total, args, server.pid
+                    )
+                    report(result)
+                    results.append(result)
+            report_routing(url)
+            report_prompt_cache(url)
+            report_rate_limit(url)
+        finally:
+            for process in (server, mock):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=30)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = check(results, args)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
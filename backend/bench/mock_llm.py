@@ -0,0 +1,558 @@
+# backend/bench/mock_llm.py
+"""
+Local stand-in for the OpenAI Responses API. Analysis prompts are answered with
+test/framework.json and evaluation prompts with test/evaluation.json, blocking
+or streamed (SSE), with configurable latency (overall or per model), token rate
+and injected failures. Usage reports cached input tokens the way the API's
+prompt prefix cache would. Files and batches (/v1/files, /v1/batches) stand in
+for the Batch API, finishing a batch batch_latency seconds after it is created.
+
+    python bench/mock_llm.py --port 8900 --latency 0.5 --token-rate 80
+    python bench/mock_llm.py --model-latency gpt-4.1-2025-04-14=5
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 gunicorn -c gunicorn.conf.py app:app
+"""
+import argparse
+import email
+import email.policy
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+TEST_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test"
+)
+
+# Characters of output per streamed text delta (~4 tokens)
+DELTA_CHARS = 16
+
+# The API caches prompt prefixes of at least 1024 tokens, in 128-token steps
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+
+
+def load_fixture(name: str) -> str:
+    with open(os.path.join(TEST_DIR, name), "r") as f:
+        return f.read()
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+def response_body(
+    output_text: str,
+    model: str = "mock-model",
+    input_tokens: int = 0,
+    cached_tokens: int = 0,
+) -> dict:
+    """
+    Minimal Responses API payload the OpenAI SDK can parse
+    """
+    output_tokens = estimate_tokens(output_text)
+    return {
+        "id": "resp_mock",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [
+            {
+                "type": "message",
+                "id": "msg_mock",
+                "status": "completed",
+                "role": "assistant",
+                "content": [
+                    {"type": "output_text", "text": output_text, "annotations": []}
+                ],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": cached_tokens},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, Tuple]:
+    """form field name -> (filename, bytes) of a multipart/form-data body"""
+    message = email.message_from_bytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body,
+        policy=email.policy.HTTP,
+    )
+    return {
+        part.get_param("name", header="content-disposition"): (
+            part.get_filename(),
+            part.get_payload(decode=True),
+        )
+        for part in message.iter_parts()
+    }
+
+
+def is_evaluation_prompt(prompt: str) -> bool:
+    # Full, fan-out and re-score evaluation prompts all carry one of these
+    return "DECISION FRAMEWORK:" in prompt or "CRITERIA TO RE-SCORE" in prompt
+
+
+class PrefixCache:
+    """
+    Model of the API's prompt prefix cache: a prompt's cached tokens are the
+    longest run of whole blocks it shares with an earlier prompt to the same
+    model, counted from CACHE_MIN_TOKENS on. Token counts are estimates and
+    nothing is evicted (the mock is short-lived).
+    """
+
+    def __init__(self):
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, model: str, prompt: str) -> int:
+        """Cached tokens for this prompt; its prefixes are cached from now on"""
+        if estimate_tokens(prompt) < CACHE_MIN_TOKENS:
+            return 0
+        block = CACHE_BLOCK_TOKENS * 4
+        digest = hashlib.sha256(model.encode())
+        prefixes = []
+        for start in range(0, len(prompt) - block + 1, block):
+            digest.update(prompt[start : start + block].encode())
+            prefixes.append(digest.hexdigest())
+
+        with self._lock:
+            hits = 0
+            for prefix in prefixes:
+                if prefix not in self._seen:
+                    break
+                hits += 1
+            self._seen.update(prefixes)
+        cached = hits * CACHE_BLOCK_TOKENS
+        return cached if cached >= CACHE_MIN_TOKENS else 0
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-response when a hedged or timed-out call is
+        # cancelled; that is expected, not an error
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """
+    Local stand-in for the OpenAI Responses API, served over keep-alive HTTP/1.1.
+
+    latency is the time to the first token, overridden per model by
+    model_latency (e.g. to make one model breach its routing SLO); with a
+    token_rate (output tokens per second) generating the rest takes
+    len(output) / 4 / token_rate more. failure_rate is the fraction of calls
+    answered with failure_status instead (for batches: of batch requests);
+    429s carry a retry-after-ms of retry_after seconds.
+    """
+
+    def __init__(
+        self,
+        output_text: Optional[str] = None,
+        latency: float = 0.0,
+        token_rate: Optional[float] = None,
+        failure_rate: float = 0.0,
+        failure_status: int = 500,
+        port: int = 0,
+        seed: Optional[int] = None,
+        model_latency: Dict[str, float] = None,
+        batch_latency: float = 0.0,
+        retry_after: float = 1.0,
+    ):
+        self.output_text = output_text
+        self.analysis_text = load_fixture("framework.json")
+        self.evaluation_text = load_fixture("evaluation.json")
+        self.latency = latency
+        self.model_latency = dict(model_latency or {})
+        self.token_rate = token_rate
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.connections = 0
+        self.requests = 0
+        self.failures = 0
+        self.cached_tokens = 0
+        self.prefix_cache = PrefixCache()
+        self.batch_latency = batch_latency
+        self.files: Dict[str, Dict] = {}
+        self.batches: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; avoid delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: dict, status: int = 200, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_event(self, payload: dict):
+                data = json.dumps(payload)
+                self.wfile.write(f"event: {payload['type']}\ndata: {data}\n\n".encode())
+                self.wfile.flush()
+
+            def _stream(
+                self,
+                output_text: str,
+                model: str,
+                input_tokens: int,
+                cached_tokens: int,
+            ):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                # No length up front: the body ends when the connection closes
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                latency = server.latency_for(model)
+
+                completed = response_body(
+                    output_text, model, input_tokens, cached_tokens
+                )
+                in_progress = dict(completed, status="in_progress", output=[])
+                self._send_event(
+                    {
+                        "type": "response.created",
+                        "sequence_number": 0,
+                        "response": in_progress,
+                    }
+                )
+                time.sleep(latency)
+
+                sequence = 1
+                for i in range(0, len(output_text), DELTA_CHARS):
+                    delta = output_text[i : i + DELTA_CHARS]
+                    self._send_event(
+                        {
+                            "type": "response.output_text.delta",
+                            "sequence_number": sequence,
+                            "item_id": "msg_mock",
+                            "output_index": 0,
+                            "content_index": 0,
+                            "delta": delta,
+                        }
+                    )
+                    sequence += 1
+                    if server.token_rate:
+                        time.sleep(estimate_tokens(delta) / server.token_rate)
+                self._send_event(
+                    {
+                        "type": "response.completed",
+                        "sequence_number": sequence,
+                        "response": completed,
+                    }
+                )
+
+            def _send_not_found(self):
+                self._send_json(
+                    {
+                        "error": {
+                            "message": "Not found",
+                            "type": "invalid_request_error",
+                        }
+                    },
+                    status=404,
+                )
+
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if parts[:2] == ["v1", "batches"] and len(parts) == 3:
+                    batch = server.batches.get(parts[2])
+                    if batch is None:
+                        return self._send_not_found()
+                    return self._send_json(batch)
+                if parts[:2] == ["v1", "files"] and parts[3:] == ["content"]:
+                    upload = server.files.get(parts[2])
+                    if upload is None:
+                        return self._send_not_found()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(upload["data"])))
+                    self.end_headers()
+                    self.wfile.write(upload["data"])
+                    return
+                self._send_json({"object": "list", "data": []})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if self.path.rstrip("/").endswith("/files"):
+                    fields = parse_multipart(self.headers["Content-Type"], body)
+                    filename, data = fields["file"]
+                    purpose = fields.get("purpose", (None, b"batch"))[1].decode()
+                    return self._send_json(server.upload(filename, data, purpose))
+                request = json.loads(body or b"{}")
+                if self.path.rstrip("/").endswith("/batches"):
+                    return self._send_json(server.create_batch(request))
+
+                model = request.get("model", "mock")
+                answer = server.answer(request)
+                if answer is None:
+                    time.sleep(server.latency_for(model))
+                    self._send_json(
+                        {
+                            "error": {
+                                "message": "Injected failure",
+                                "type": "server_error",
+                                "code": None,
+                            }
+                        },
+                        status=server.failure_status,
+                        headers=(
+                            {"retry-after-ms": str(int(server.retry_after * 1000))}
+                            if server.failure_status == 429
+                            else None
+                        ),
+                    )
+                    return
+
+                output_text, input_tokens, cached_tokens = answer
+                if request.get("stream"):
+                    self._stream(output_text, model, input_tokens, cached_tokens)
+                    return
+
+                time.sleep(server.generation_time(output_text, model))
+                self._send_json(
+                    response_body(output_text, model, input_tokens, cached_tokens)
+                )
+
+        self.httpd = _Server(("127.0.0.1", port), Handler)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def answer(self, request: dict) -> Optional[Tuple[str, int, int]]:
+        """
+        (output text, input tokens, cached tokens) for a Responses API request
+        body, or None for an injected failure
+        """
+        model = request.get("model", "mock")
+        prompt = str(request.get("instructions", "")) + str(request.get("input", ""))
+        with self._lock:
+            self.requests += 1
+            failed = self.random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if failed:
+            return None
+
+        cached_tokens = self.prefix_cache.lookup(model, prompt)
+        with self._lock:
+            self.cached_tokens += cached_tokens
+        return self.output_for(prompt), estimate_tokens(prompt), cached_tokens
+
+    def upload(self, filename: str, data: bytes, purpose: str) -> dict:
+        upload = {
+            "id": f"file-{uuid.uuid4().hex[:24]}",
+            "object": "file",
+            "bytes": len(data),
+            "created_at": int(time.time()),
+            "filename": filename or "upload.jsonl",
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self._lock:
+            self.files[upload["id"]] = dict(upload, data=data)
+        return upload
+
+    def create_batch(self, request: dict) -> dict:
+        now = int(time.time())
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}",
+            "object": "batch",
+            "endpoint": request.get("endpoint", "/v1/responses"),
+            "errors": None,
+            "input_file_id": request["input_file_id"],
+            "completion_window": request.get("completion_window", "24h"),
+            "status": "in_progress",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": now,
+            "in_progress_at": now,
+            "completed_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": request.get("metadata"),
+        }
+        with self._lock:
+            self.batches[batch["id"]] = batch
+        threading.Thread(target=self._run_batch, args=(batch,), daemon=True).start()
+        return batch
+
+    def _run_batch(self, batch: dict):
+        lines = self.files[batch["input_file_id"]]["data"].decode().splitlines()
+        requests = [json.loads(line) for line in lines if line.strip()]
+        batch["request_counts"]["total"] = len(requests)
+        time.sleep(self.batch_latency)
+
+        outputs, errors = [], []
+        for entry in requests:
+            row = {
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": entry["custom_id"],
+                "error": None,
+            }
+            answer = self.answer(entry["body"])
+            if answer is None:
+                row["response"] = {
+                    "status_code": self.failure_status,
+                    "body": {
+                        "error": {"message": "Injected failure", "type": "server_error"}
+                    },
+                }
+                errors.append(row)
+            else:
+                model = entry["body"].get("model", "mock")
+                row["response"] = {
+                    "status_code": 200,
+                    "body": response_body(answer[0], model, answer[1], answer[2]),
+                }
+                outputs.append(row)
+
+        for rows, field in ((outputs, "output_file_id"), (errors, "error_file_id")):
+            if rows:
+                data = "".join(json.dumps(row) + "\n" for row in rows).encode()
+                batch[field] = self.upload(f"{field}.jsonl", data, "batch_output")["id"]
+        batch["request_counts"].update(completed=len(outputs), failed=len(errors))
+        batch["completed_at"] = int(time.time())
+        batch["status"] = "completed"
+
+    def output_for(self, prompt: str) -> str:
+        if self.output_text is not None:
+            return self.output_text
+        if is_evaluation_prompt(prompt):
+            return self.evaluation_text
+        return self.analysis_text
+
+    def latency_for(self, model: str = None) -> float:
+        return self.model_latency.get(model, self.latency)
+
+    def generation_time(self, output_text: str, model: str = None) -> float:
+        latency = self.latency_for(model)
+        if not self.token_rate:
+            return latency
+        return latency + estimate_tokens(output_text) / self.token_rate
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_model_latency(values) -> Dict[str, float]:
+    """["model=seconds", ...] -> {model: seconds}"""
+    latencies = {}
+    for value in values:
+        model, _, seconds = value.rpartition("=")
+        latencies[model] = float(seconds)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI Responses API server")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds to first token"
+    )
+    parser.add_argument(
+        "--token-rate", type=float, default=None, help="output tokens per second"
+    )
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.0, help="fraction of failed calls"
+    )
+    parser.add_argument("--failure-status", type=int, default=500)
+    parser.add_argument(
+        "--retry-after",
+        type=float,
+        default=1.0,
+        help="Retry-After (seconds) sent with --failure-status 429",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--model-latency",
+        action="append",
+        default=[],
+        metavar="MODEL=SECONDS",
+        help="latency for one model (repeatable)",
+    )
+    parser.add_argument(
+        "--batch-latency",
+        type=float,
+        default=0.0,
+        help="seconds until a submitted batch completes",
+    )
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        latency=args.latency,
+        token_rate=args.token_rate,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+        retry_after=args.retry_after,
+        port=args.port,
+        seed=args.seed,
+        model_latency=parse_model_latency(args.model_latency),
+        batch_latency=args.batch_latency,
+    )
+    print(f"Mock Responses API on {server.base_url}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(
+            f"{server.requests} requests, {server.failures} injected failures, "
+            f"{server.cached_tokens} cached input tokens"
+        )
+
+
+if __name__ == "__main__":
+    main()
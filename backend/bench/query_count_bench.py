@@ -0,0 +1,113 @@
+# backend/bench/query_count_bench.py
+"""
+Queries and time needed to serialize decisions with Decision.to_dict(): plain
+lazy loading (one query per collection, per criterion for sub-criteria) versus
+load_decision_graphs (selectin loading plus one recursive CTE for the criteria
+hierarchy). Fails if the eager path's query count grows with the data.
+
+    python bench/query_count_bench.py [decisions]
+"""
+import os
+import sys
+import time
+
+from flask import Flask
+from sqlalchemy import event, select
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models_decision import (  # noqa: E402
+    Decision,
+    DecisionOption,
+    EvaluationCriteria,
+    Question,
+    db,
+)
+from persistence import load_decision_graphs  # noqa: E402
+
+OPTIONS = 5
+CRITERIA = 8
+SUB_CRITERIA = 2
+QUESTIONS = 7
+EAGER_QUERIES = 4  # decisions, options, questions, criteria CTE
+
+
+def seed(count: int):
+    for i in range(count):
+        decision = Decision(scenario_text=f"scenario {i}", title=f"Decision {i}")
+        decision.options = [
+            DecisionOption(name=f"Option {j}", position=j) for j in range(OPTIONS)
+        ]
+        decision.questions = [
+            Question(question_text=f"Question {j}", position=j)
+            for j in range(QUESTIONS)
+        ]
+        criteria = []
+        for j in range(CRITERIA):
+            parent = EvaluationCriteria(name=f"Criterion {j}", weight=1 / CRITERIA)
+            parent.sub_criteria = [
+                EvaluationCriteria(name=f"Criterion {j}.{k}", decision=decision)
+                for k in range(SUB_CRITERIA)
+            ]
+            criteria.append(parent)
+        decision.criteria.extend(criteria)
+        db.session.add(decision)
+    db.session.commit()
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def measure(counter: QueryCounter, load):
+    db.session.expunge_all()
+    counter.count = 0
+    start = time.perf_counter()
+    payload = [decision.to_dict() for decision in load()]
+    elapsed = (time.perf_counter() - start) * 1000
+    return payload, counter.count, elapsed
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        counter = QueryCounter(db.engine)
+
+        seeded = 0
+        for size in sorted({1, max(1, total // 10), total}):
+            seed(size - seeded)
+            seeded = size
+            statement = select(Decision).order_by(Decision.id)
+
+            lazy, lazy_queries, lazy_ms = measure(
+                counter, lambda: db.session.scalars(statement).all()
+            )
+            eager, eager_queries, eager_ms = measure(
+                counter, lambda: load_decision_graphs(statement)
+            )
+
+            assert eager == lazy, "eager serialization differs from lazy loading"
+            assert eager_queries == EAGER_QUERIES, (
+                f"expected {EAGER_QUERIES} queries for {size} decisions, "
+                f"got {eager_queries}"
+            )
+            print(
+                f"{size:>5} decisions  lazy {lazy_queries:>6} queries "
+                f"{lazy_ms:8.1f} ms  eager {eager_queries:>2} queries "
+                f"{eager_ms:8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# backend/cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from log_config import get_logger
+
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Collapse whitespace so that re-indented but otherwise identical prompts
+    share a cache entry
+    """
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def cache_key(
+    model: str, instructions: str, prompt: str, response_format: str = ""
+) -> str:
+    """
+    Content address for an LLM call: hash of model, instructions, normalized
+    prompt and, when one is requested, the name of the structured output format
+    """
+    digest = hashlib.sha256()
+    parts = [model, instructions, normalize_prompt(prompt)]
+    if response_format:
+        parts.append(response_format)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with per-entry TTL
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache:
+    """
+    On-disk cache shared by every worker process on the same host
+    """
+
+    def __init__(self, path: str = "response_cache.sqlite3", ttl: Optional[float] = None):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            with self._connect() as conn:
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            return None
+        return value
+
+    def set(self, key: str, value: str):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM response_cache")
+
+
+class RedisCache:
+    """
+    Cache on top of any client exposing the redis-py get/set(ex=)/delete subset,
+    so a local stand-in can be used in place of a real Redis server
+    """
+
+    def __init__(self, client, ttl: Optional[float] = 3600, prefix: str = "llm:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisCache":
+        import redis  # Optional dependency, only needed for this backend
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return value
+
+    def set(self, key: str, value: str):
+        self.client.set(self.prefix + key, value, ex=int(self.ttl) if self.ttl else None)
+
+    def clear(self):
+        keys = getattr(self.client, "scan_iter", None)
+        if keys is not None:
+            for key in keys(match=self.prefix + "*"):
+                self.client.delete(key)
+
+
+class ResponseCache:
+    """
+    Front for a cache backend that keeps hit/miss counters
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning("Response cache read failed: %s", e)
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.warning("Response cache write failed: %s", e)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": type(self.backend).__name__ if self.backend else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+def cache_from_env(
+    prefix: str = "RESPONSE_CACHE", redis_prefix: str = "llm:"
+) -> ResponseCache:
+    """
+    Build a cache from <prefix>_* environment variables (RESPONSE_CACHE_* by
+    default). <prefix>_BACKEND is one of memory (default), sqlite, redis or none.
+    """
+    backend_name = os.getenv(f"{prefix}_BACKEND", "memory").lower()
+    ttl = float(os.getenv(f"{prefix}_TTL", "3600")) or None
+
+    if backend_name == "memory":
+        backend = MemoryCache(
+            max_size=int(os.getenv(f"{prefix}_SIZE", "1024")), ttl=ttl
+        )
+    elif backend_name == "sqlite":
+        backend = SQLiteCache(
+            path=os.getenv(f"{prefix}_PATH", f"{prefix.lower()}.sqlite3"), ttl=ttl
+        )
+    elif backend_name == "redis":
+        backend = RedisCache.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            ttl=ttl,
+            prefix=redis_prefix,
+        )
+    else:
+        backend = None
+
+    return ResponseCache(backend)
+
+
+response_cache = cache_from_env()
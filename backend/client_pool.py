@@ -0,0 +1,188 @@
+# backend/client_pool.py
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from dotenv import load_dotenv
+from log_config import get_logger
+
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+@dataclass
+class ClientSettings:
+    """
+    Connection pool settings for the shared OpenAI client
+    """
+
+    api_key: Optional[str] = None
+    base_url: Optional[str] = None
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    connect_timeout: float = 5.0
+    timeout: float = 120.0
+    max_retries: int = 2
+
+    @classmethod
+    def from_env(cls) -> "ClientSettings":
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+            http2=_env_bool("OPENAI_HTTP2", False),
+            connect_timeout=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "120")),
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeouts(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+    def http2_enabled(self) -> bool:
+        if not self.http2:
+            return False
+        try:
+            import h2  # noqa: F401  (httpx[http2] extra)
+        except ImportError:
+            logger.warning(
+                "OPENAI_HTTP2 is set but the h2 package is missing, using HTTP/1.1"
+            )
+            return False
+        return True
+
+
+def build_client(settings: Optional[ClientSettings] = None) -> OpenAI:
+    """
+    Create an OpenAI client backed by a keep-alive httpx connection pool
+    """
+    settings = settings or ClientSettings.from_env()
+    http_client = httpx.Client(
+        limits=settings.limits(),
+        timeout=settings.timeouts(),
+        http2=settings.http2_enabled(),
+    )
+    return OpenAI(
+        api_key=settings.api_key,
+        base_url=settings.base_url,
+        max_retries=settings.max_retries,
+        http_client=http_client,
+    )
+
+
+def build_async_client(settings: Optional[ClientSettings] = None) -> AsyncOpenAI:
+    """
+    asyncio counterpart of build_client for the ASGI entry point
+    """
+    settings = settings or ClientSettings.from_env()
+    http_client = httpx.AsyncClient(
+        limits=settings.limits(),
+        timeout=settings.timeouts(),
+        http2=settings.http2_enabled(),
+    )
+    return AsyncOpenAI(
+        api_key=settings.api_key,
+        base_url=settings.base_url,
+        max_retries=settings.max_retries,
+        http_client=http_client,
+    )
+
+
+_clients: Dict[int, OpenAI] = {}
+_async_clients: Dict[int, AsyncOpenAI] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client() -> OpenAI:
+    """
+    Process-wide shared client. httpx pools are thread-safe, so threaded
+    gunicorn workers share one pool; pools are never shared across fork(), so a
+    client inherited from the gunicorn master is replaced in each worker.
+    """
+    pid = os.getpid()
+    client = _clients.get(pid)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(pid)
+        if client is None:
+            # Drop anything inherited from a parent process without closing it,
+            # the parent still owns those sockets
+            _clients.clear()
+            client = _clients[pid] = build_client()
+        return client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Process-wide AsyncOpenAI client. The ASGI server runs one event loop per
+    worker process, so one pool per pid is shared by every coroutine.
+    """
+    pid = os.getpid()
+    client = _async_clients.get(pid)
+    if client is None:
+        with _clients_lock:
+            client = _async_clients.get(pid)
+            if client is None:
+                _async_clients.clear()
+                client = _async_clients[pid] = build_async_client()
+    return client
+
+
+def reset_client():
+    """
+    Close and forget the current process's client (e.g. after settings change)
+    """
+    with _clients_lock:
+        client = _clients.pop(os.getpid(), None)
+    if client is not None:
+        client.close()
+
+
+def warm_up() -> bool:
+    """
+    Open a pooled connection to the API ahead of the first user request, so the
+    TCP/TLS handshake is not paid on the critical path
+    """
+    if not _env_bool("OPENAI_WARMUP", True):
+        return False
+    try:
+        get_client().models.list()
+        logger.info("OpenAI client warmed up")
+        return True
+    except Exception as e:
+        logger.warning("OpenAI client warm-up failed: %s", e)
+        return False
+
+
+async def warm_up_async() -> bool:
+    if not _env_bool("OPENAI_WARMUP", True):
+        return False
+    try:
+        await get_async_client().models.list()
+        logger.info("AsyncOpenAI client warmed up")
+        return True
+    except Exception as e:
+        logger.warning("AsyncOpenAI client warm-up failed: %s", e)
+        return False
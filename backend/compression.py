@@ -0,0 +1,189 @@
+# backend/compression.py
+import gzip
+import io
+import os
+import zlib
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from flask import request
+from werkzeug.wrappers import Response
+
+from json_codec import dumps_bytes
+
+try:
+    import brotli
+except ImportError:  # Optional dependency; gzip is offered instead
+    brotli = None
+
+load_dotenv()
+
+# Responses smaller than this go out uncompressed (0 = never compress)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "5"))
+# Cap on a request body after decompression, against decompression bombs
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(16 * 1024 * 1024)))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class UnsupportedEncoding(ValueError):
+    pass
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+def _inflate(body: bytes, wbits: int, limit: int) -> bytes:
+    inflater = zlib.decompressobj(wbits)
+    data = inflater.decompress(body, limit + 1)
+    if len(data) > limit:
+        raise BodyTooLarge(f"Request body exceeds {limit} bytes once decompressed")
+    if not inflater.eof:
+        raise ValueError("Truncated compressed request body")
+    return data
+
+
+def decompress(body: bytes, encoding: str, limit: int = None) -> bytes:
+    """
+    Decode a request body sent with Content-Encoding gzip, deflate or br;
+    raises UnsupportedEncoding, BodyTooLarge or ValueError for corrupt data
+    """
+    limit = MAX_REQUEST_BYTES if limit is None else limit
+    encoding = encoding.strip().lower()
+    try:
+        if encoding in ("gzip", "x-gzip"):
+            return _inflate(body, 16 + zlib.MAX_WBITS, limit)
+        if encoding == "deflate":
+            # Properly zlib-wrapped, but some clients send raw deflate
+            try:
+                return _inflate(body, zlib.MAX_WBITS, limit)
+            except zlib.error:
+                return _inflate(body, -zlib.MAX_WBITS, limit)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt {encoding} request body: {e}")
+    if encoding == "br" and brotli is not None:
+        try:
+            data = brotli.decompress(body)
+        except brotli.error as e:
+            raise ValueError(f"Corrupt br request body: {e}")
+        if len(data) > limit:
+            raise BodyTooLarge(f"Request body exceeds {limit} bytes once decompressed")
+        return data
+    raise UnsupportedEncoding(f"Unsupported Content-Encoding: {encoding}")
+
+
+def _accepted(accept_encoding: str) -> Dict[str, float]:
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """br when available and accepted, else gzip, else None"""
+    accepted = _accepted(accept_encoding or "")
+    wildcard = accepted.get("*", 0.0)
+    offers = ("br", "gzip") if brotli is not None else ("gzip",)
+    best = max(offers, key=lambda coding: accepted.get(coding, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps identical bodies byte-identical (cacheable, ETag-friendly)
+    out = io.BytesIO()
+    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=GZIP_LEVEL, mtime=0) as f:
+        f.write(body)
+    return out.getvalue()
+
+
+def compressible(content_type: str, size: int) -> bool:
+    return (
+        COMPRESS_MIN_BYTES > 0
+        and size >= COMPRESS_MIN_BYTES
+        and (content_type or "").startswith(COMPRESSIBLE_TYPES)
+    )
+
+
+def compress_response(response):
+    """
+    Flask after_request hook compressing buffered responses for clients that
+    accept it. Streamed responses (SSE, NDJSON) are left alone: compressing
+    them would hold events back in the compressor's buffer.
+    """
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or not 200 <= response.status_code < 300
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+    body = response.get_data()
+    if encoding is None or not compressible(response.mimetype, len(body)):
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+class DecompressRequests:
+    """
+    WSGI middleware decoding gzip / deflate / br request bodies before the app
+    reads them, so every route accepts compressed uploads
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _error(self, environ, start_response, status: int, message: str):
+        response = Response(
+            dumps_bytes({"error": message}), status=status, mimetype="application/json"
+        )
+        return response(environ, start_response)
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding in ("", "identity"):
+            return self.app(environ, start_response)
+
+        length = environ.get("CONTENT_LENGTH")
+        stream = environ["wsgi.input"]
+        try:
+            # Capped before decompressing too, so an oversized upload is not
+            # read into memory whole
+            limit = MAX_REQUEST_BYTES + 1
+            body = stream.read(min(int(length), limit) if length else limit)
+            if len(body) > MAX_REQUEST_BYTES:
+                raise BodyTooLarge(f"Request body exceeds {MAX_REQUEST_BYTES} bytes")
+            data = decompress(body, encoding)
+        except UnsupportedEncoding as e:
+            return self._error(environ, start_response, 415, str(e))
+        except BodyTooLarge as e:
+            return self._error(environ, start_response, 413, str(e))
+        except ValueError as e:
+            return self._error(environ, start_response, 400, str(e))
+
+        environ["wsgi.input"] = io.BytesIO(data)
+        environ["CONTENT_LENGTH"] = str(len(data))
+        del environ["HTTP_CONTENT_ENCODING"]
+        return self.app(environ, start_response)
+
+
+def init_app(app):
+    app.wsgi_app = DecompressRequests(app.wsgi_app)
+    app.after_request(compress_response)
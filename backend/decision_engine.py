@@ -1,15 +1,77 @@
 # backend/decision_engine.py
 import json
-from typing import Dict, List, Any
+import time
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 from openai import OpenAI
 from dotenv import load_dotenv
-import os
 
+from cache import ResponseCache, cache_key, response_cache
+from client_pool import get_client
+from fanout import (
+    chunk_options,
+    fanout_executor,
+    local_summary,
+    merge_option_scores,
+    should_fan_out,
+)
+from incremental import (
+    IncrementalPlan,
+    merge_scores,
+    plan_incremental,
+    score_fingerprints,
+)
+from log_config import get_logger
+from metrics import (
+    StreamTimer,
+    UPSTREAM_ERRORS,
+    UPSTREAM_SECONDS,
+    UPSTREAM_TTFB_SECONDS,
+    record_usage,
+    stage,
+)
+from prompt_compaction import (
+    compact_answers,
+    compact_evaluation_payload,
+    compact_json,
+)
+from prompts import ANALYSIS, EVALUATION, OPTION_SCORES, RESCORE, depth_config
+from rate_limit import UpstreamLimiter, upstream_limiter
+from routing import FAILOVER_ERRORS, ModelRouter, Route, hedged, model_router
+from scoring import apply_scores, framework_axes
+from semantic_cache import SemanticCache, semantic_cache
+from sensitivity import analyze_sensitivity
+from single_flight import SingleFlight, single_flight
+from streaming import IncrementalJSONParser
+from structured import (
+    REPAIR_INSTRUCTIONS,
+    REASK_MAX_FRAGMENTS,
+    OutputCheck,
+    loads_lenient,
+    text_format,
+)
 
 load_dotenv()
 
+logger = get_logger(__name__)
+
 # from models_decision import db
 
+ANALYSIS_INSTRUCTIONS = ANALYSIS.instructions
+EVALUATION_INSTRUCTIONS = EVALUATION.instructions
+
+
+def _format_name(output_format: Optional[Dict]) -> str:
+    return output_format["name"] if output_format else ""
+
+
+def _format_kwargs(output_format: Optional[Dict]) -> Dict:
+    # Omitted entirely (not sent as null) when no format is requested
+    return {"text": {"format": output_format}} if output_format else {}
+
+
+def _budget_kwargs(max_output_tokens: Optional[int]) -> Dict:
+    return {"max_output_tokens": max_output_tokens} if max_output_tokens else {}
+
 
 class DecisionEngine:
     """
@@ -17,244 +79,735 @@ class DecisionEngine:
     Uses two-stage LLM workflow for cost optimization.
     """
 
-    def __init__(self):
-        self.client = OpenAI(
-            # This is the default and can be omitted
-            api_key=os.getenv("OPENAI_API_KEY"),
+    def __init__(
+        self,
+        client: OpenAI = None,
+        cache: ResponseCache = None,
+        semantic: SemanticCache = None,
+        flight: SingleFlight = None,
+        router: ModelRouter = None,
+        upstream: UpstreamLimiter = None,
+    ):
+        # Without an explicit client the engine borrows the process-wide pooled
+        # client, so one engine can be shared by every request and worker thread
+        self._client = client
+        self.cache = cache if cache is not None else response_cache
+        # Optional near-duplicate scenario cache (off unless SEMANTIC_CACHE=1)
+        self.semantic_cache = semantic if semantic is not None else semantic_cache
+        # Concurrent identical upstream calls share one request
+        self.flight = flight if flight is not None else single_flight
+        # Per-stage model choice, failover and hedging (routing.py)
+        self.router = router if router is not None else model_router
+        # Global cap on concurrent upstream calls, adapting to upstream 429s
+        self.upstream = upstream if upstream is not None else upstream_limiter
+
+    @property
+    def client(self) -> OpenAI:
+        return self._client if self._client is not None else get_client()
+
+    def _create_text(
+        self,
+        model: str,
+        instructions: str,
+        prompt: str,
+        use_cache: bool = True,
+        depth: str = None,
+        output_format: Dict = None,
+        stage: str = "evaluate",
+    ) -> str:
+        """
+        Output text for a prompt, served from the cache when possible. Concurrent
+        identical calls are coalesced into one upstream request. output_format
+        is a Responses API text.format (see structured.text_format); stage
+        selects the route (budgets, hedging) in routing.py.
+        """
+        key = cache_key(model, instructions, prompt, _format_name(output_format))
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info("Cache hit for model: %s", model)
+                return cached
+
+        return self.flight.do(
+            key,
+            lambda: self._fetch_text(
+                key, model, instructions, prompt, use_cache, depth, output_format, stage
+            ),
         )
 
-    def analyze_scenario(self, scenario: str, depth: str = "balanced") -> Dict:
+    def _fetch_text(
+        self,
+        key: str,
+        model: str,
+        instructions: str,
+        prompt: str,
+        use_cache: bool,
+        depth: str = None,
+        output_format: Dict = None,
+        stage: str = "evaluate",
+    ) -> str:
+        with self.flight.across_workers(key) as waited:
+            # Another worker made this call while we waited for the lock
+            if waited and use_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.flight.stats.record("coalesced_across_workers")
+                    return cached
+
+            output_text, answered = self._call_routed(
+                self.router.route(stage, depth),
+                model,
+                instructions,
+                prompt,
+                depth,
+                output_format,
+            )
+            publish_key = key
+            if answered != model:
+                # A backup model's answer belongs under that model's key
+                publish_key = cache_key(
+                    answered, instructions, prompt, _format_name(output_format)
+                )
+            # Published before the lock is released so waiting workers find it
+            self._publish(publish_key, output_text)
+            return output_text
+
+    def _call_upstream(
+        self,
+        model: str,
+        instructions: str,
+        prompt: str,
+        depth: str = None,
+        output_format: Dict = None,
+        max_output_tokens: int = None,
+    ) -> str:
         """
-        Stage 1: Analyze scenario and generate decision framework using GPT-4
+        One blocking Responses API call, timed, with its token usage recorded
+        and its latency fed to the router
         """
-        depth_configs = {
-            "quick": {
-                "time": "30 seconds",
-                "questions": "1–3",
-                "criteria": "2–5",
-                "description": "Just the essentials; focus on surface-level distinctions",
-            },
-            "balanced": {
-                "time": "3 minutes",
-                "questions": "4–7",
-                "criteria": "6–9",
-                "description": "Well-rounded view across major considerations",
-            },
-            "thorough": {
-                "time": "10 minutes",
-                "questions": "8–14",
-                "criteria": "10–14",
-                "description": "Comprehensive breakdown with thoughtful depth",
-            },
-        }
-
-        config = depth_configs.get(depth, depth_configs["balanced"])
-
-        prompt = f"""
-        You are a decision analyst helping someone think through a complex decision. Your goal is to understand THEIR context, values, and constraints—not to evaluate the options for them.
-
-        User Scenario: "{scenario}"
-        Analysis Depth: {depth} ({config['description']})
-        Target Questions: {config['questions']}
-
-        Analyze this scenario and create a decision framework following these principles:
-
-        1. IDENTIFY OPTIONS: Extract explicitly stated options and infer logical alternatives the user may not have considered.
-
-        2. DEFINE CRITERIA: Create evaluation dimensions based on what typically matters in this type of decision.
-
-        3. DESIGN QUESTIONS: Create questions that reveal the USER'S context and preferences, NOT questions that evaluate the options directly.
-
-        CRITICAL QUESTION GUIDELINES:
-        - Ask about the user's values, constraints, and priorities
-        - Never ask users to rank or rate the specific options
-        - Never ask questions the AI can answer (e.g., "which city is more expensive?")
-        - Focus on uncovering what matters TO THEM
-
-        GOOD QUESTIONS:
-        ✓ "How important is financial stability to you right now?" (reveals risk tolerance)
-        ✓ "What does work-life balance mean to you?" (reveals lifestyle priorities)
-        ✓ "How comfortable are you with major life changes?" (reveals change tolerance)
-
-        BAD QUESTIONS:
-        ✗ "Rank these cities by affordability" (AI already knows this)
-        ✗ "Which option seems more appealing?" (too direct/leading)
-        ✗ "Rate Option A on a scale of 1-10" (evaluates option, not user context)
-
-        QUESTION TYPES:
-        - scale: Use for measuring importance/comfort levels (always include min, max, minLabel, maxLabel)
-        - mcq: Multiple choice. Use for yes/no preferences or more nuanced options
-        - rank: Use ONLY for ranking abstract priorities (never the actual options)
-        - text: Use for context the AI cannot infer
-
-        You may use mcq for yes/no questions, but avoid binary questions that don't reveal user context.
-
-        Respond with valid JSON only:
-        {{
-            "decision_type": "{{decision_type}}",
-            "title": "{{concise_title}}",
-            "options": [
-            {{"name": "", "description": "", "inferred": boolean}}
-            ],
-            "criteria": [
-            {{
-                "name": "",
-                "description": "",
-                "weight": float,  // Each weight must be between 0 and 1 and all weights must sum to exactly 1.0
-                "category": "financial|practical|emotional|strategic"
-            }}
-            ],
-            "questions": [
-            {{
-                "text": "",
-                "type": "scale|rank|mcq|text",
-                "criteria_link": "",
-                "options": [], // For rank type and mcq: abstract priorities, not the decision options
-                "min": , // For scale only
-                "max": , // For scale only  
-                "minLabel": "", // For scale only
-                "maxLabel": "", // For scale only
-            }}
-            ],
-            "context_factors": []
-        }}
-
-        Ensure exactly {config['questions']} questions with at least 2 non-scale types.
-        Output must be valid JSON only. Do not include markdown or explanations.
+        # Queueing for a slot is not upstream latency, so the timer starts after
+        with self.upstream.slot(model):
+            start = time.perf_counter()
+            try:
+                with self.client.responses.with_streaming_response.create(
+                    model=model,
+                    instructions=instructions,
+                    input=prompt,
+                    **_format_kwargs(output_format),
+                    **_budget_kwargs(max_output_tokens),
+                ) as raw:
+                    # Headers have arrived; the body is read by parse()
+                    UPSTREAM_TTFB_SECONDS.observe(
+                        time.perf_counter() - start, model=model, mode="blocking"
+                    )
+                    response = raw.parse()
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(model=model, error=type(e).__name__)
+                self.router.record(model, time.perf_counter() - start, ok=False)
+                raise
+            elapsed = time.perf_counter() - start
+            UPSTREAM_SECONDS.observe(elapsed, model=model, mode="blocking")
+            self.router.record(model, elapsed)
+            record_usage(model, depth, getattr(response, "usage", None))
+            return response.output_text
+
+    def _call_routed(
+        self,
+        route: Route,
+        model: str,
+        instructions: str,
+        prompt: str,
+        depth: str = None,
+        output_format: Dict = None,
+    ) -> Tuple[str, str]:
+        """
+        Upstream call within a route's budget; (output text, model that gave
+        it). If the route has a next model, a slow call is hedged with it after
+        route.hedge_after seconds and a call failing upstream (FAILOVER_ERRORS)
+        is retried on it.
         """
 
+        def call(target: str) -> Tuple[str, str]:
+            output_text = self._call_upstream(
+                target,
+                instructions,
+                prompt,
+                depth,
+                output_format,
+                route.max_output_tokens,
+            )
+            return output_text, target
+
+        backup = route.next_model(model)
+        if backup is None:
+            return call(model)
+        if route.hedge_after is not None:
+            return hedged(
+                lambda: call(model),
+                lambda: call(backup),
+                route.hedge_after,
+                lambda event: self.router.event(route, backup, event),
+            )
         try:
-            # Use a model appropriate for the task
-            if depth == "quick":
-                chosen_model = "gpt-4o-mini-2024-07-18"
-            else:
-                # chosen_model = "o4-mini-2025-04-16"
-                # gpt 4.1 test
-                chosen_model = "gpt-4.1-2025-04-14"
-
-            # chosen_model = "gpt-4.1-mini-2025-04-14"
+            return call(model)
+        except FAILOVER_ERRORS as e:
+            logger.warning("%s failed (%s), retrying on %s", model, e, backup)
+            self.router.event(route, backup, "retry")
+            return call(backup)
+
+    def _publish(self, key: str, output_text: str):
+        # Only output that parses (possibly after local repair) is worth caching
+        try:
+            loads_lenient(output_text)
+        except (TypeError, ValueError):
+            return
+        self.cache.set(key, output_text)
+
+    def _parse_output(self, output_text: str, operation: str) -> Dict:
+        with stage("json_parse", operation):
+            # Fences, trailing commas and the like are repaired locally rather
+            # than paid for with another call
+            return loads_lenient(output_text)
+
+    def _check_output(
+        self,
+        check: OutputCheck,
+        operation: str,
+        use_cache: bool = True,
+        depth: str = None,
+    ) -> Dict:
+        """
+        Re-asks only the fragments of an output that failed validation, then
+        returns the validated document
+        """
+        for fragment, prompt, output_format in check.reasks(REASK_MAX_FRAGMENTS):
+            logger.info("Re-asking invalid fragment %s", fragment.label)
+            try:
+                output_text = self._create_text(
+                    self._choose_model(depth, "repair"),
+                    REPAIR_INSTRUCTIONS,
+                    prompt,
+                    use_cache,
+                    depth,
+                    output_format,
+                    "repair",
+                )
+                check.apply(fragment, output_text)
+            except Exception as e:
+                logger.warning("Re-ask for %s failed: %s", fragment.label, e)
+        with stage("validate", operation):
+            return check.result()
+
+    def _framework_check(self, data: Dict, scenario: str) -> OutputCheck:
+        with stage("validate", "analyze"):
+            return OutputCheck("framework", data, context=f"Scenario: {scenario}")
+
+    def _scores_check(
+        self, kind: str, data: Dict, options: List[str], criteria: List[str]
+    ) -> OutputCheck:
+        with stage("validate", "evaluate"):
+            context = (
+                f"Options: {compact_json(options)} Criteria: {compact_json(criteria)}"
+            )
+            return OutputCheck(kind, data, options, criteria, context)
+
+    def _similar_framework(
+        self, scenario: str, depth: str, use_cache: bool = True
+    ) -> Optional[Dict]:
+        if not use_cache or self.semantic_cache is None:
+            return None
+        # Frameworks built from an older analysis prompt are not reused
+        return self.semantic_cache.get(scenario, depth, ANALYSIS.fingerprint)
+
+    def _remember_framework(self, scenario: str, depth: str, framework: Dict):
+        if self.semantic_cache is not None and framework:
+            self.semantic_cache.set(scenario, depth, framework, ANALYSIS.fingerprint)
+
+    def _finish_analysis(self, framework: Dict, scenario: str, depth: str) -> Dict:
+        with stage("post_process", "analyze"):
+            framework["depth"] = depth
+            framework["scenario_text"] = scenario
+            return framework
 
-            print(f"Calling model: {chosen_model} for depth: {depth}")
-            response = self.client.responses.create(
-                model=chosen_model,
-                instructions="You are an expert decision analyst who builds structured, personalized frameworks to navigate complex choices.",
-                input=prompt,
+    def _finish_evaluation(
+        self, evaluation: Dict, framework: Dict, responses: Dict, model: str
+    ) -> Dict:
+        with stage("post_process", "evaluate"):
+            # Weighted scores, totals, ranking, primary_choice and the sensitivity
+            # analysis are computed locally from the raw scores
+            evaluation = apply_scores(evaluation, framework)
+            evaluation["sensitivity_analysis"] = analyze_sensitivity(
+                evaluation, framework
             )
-            framework = json.loads(response.output_text)
+            # Lets a later request with a few changed answers re-score only what
+            # changed
+            evaluation["score_fingerprints"] = score_fingerprints(framework, responses)
+            evaluation["model_used"] = model
+            return evaluation
 
-            # with open("test/framework.json", "r") as f:
-            #     sample_json = json.load(f)
+    def _finish_incremental(
+        self,
+        previous: Dict,
+        partial: Dict,
+        plan: IncrementalPlan,
+        framework: Dict,
+        responses: Dict,
+        model: str,
+    ) -> Dict:
+        evaluation = merge_scores(previous, partial, plan.changed)
+        evaluation = self._finish_evaluation(evaluation, framework, responses, model)
+        if evaluation.get("ranking") != previous.get("ranking"):
+            # The previous narrative argues for the old order; rebuild it from
+            # the new scores as the fan-out path does
+            evaluation.update(local_summary(evaluation, framework))
+        evaluation["incremental"] = {"rescored_criteria": plan.changed}
+        return evaluation
+
+    def _choose_model(self, depth: str, stage: str = "evaluate") -> str:
+        # Per-stage model table with latency-based failover, see routing.py
+        model = self.router.choose(stage, depth)
+        if self.upstream.cooldown_remaining([model]) > 0:
+            # Rate limited upstream: a route model taking calls beats waiting
+            for other in self.router.route(stage, depth).models:
+                if not self.upstream.cooldown_remaining([other]):
+                    return other
+        return model
+
+    def _build_analysis_prompt(self, scenario: str, depth: str) -> str:
+        config = depth_config(depth)
+        return ANALYSIS.render(
+            depth=depth,
+            description=config["description"],
+            questions=config["questions"],
+            scenario=scenario,
+        )
 
-            # framework = sample_json
-            framework["depth"] = depth
-            framework["scenario_text"] = scenario
+    def analyze_scenario(
+        self,
+        scenario: str,
+        depth: str = "balanced",
+        use_cache: bool = True,
+        raise_errors: bool = False,
+    ) -> Dict:
+        """
+        Stage 1: Analyze scenario and generate decision framework using GPT-4.
+        With raise_errors, failures propagate instead of returning {} (the job
+        queue uses this to tell transient errors from permanent ones).
+        """
+        similar = self._similar_framework(scenario, depth, use_cache)
+        if similar is not None:
+            return self._finish_analysis(similar, scenario, depth)
 
-            return framework
+        with stage("prompt_build", "analyze"):
+            prompt = self._build_analysis_prompt(scenario, depth)
+
+        try:
+            chosen_model = self._choose_model(depth, "analyze")
+
+            logger.info("Calling model: %s for depth: %s", chosen_model, depth)
+            output_text = self._create_text(
+                chosen_model,
+                ANALYSIS_INSTRUCTIONS,
+                prompt,
+                use_cache,
+                depth,
+                text_format("framework"),
+                "analyze",
+            )
+            return self.analysis_from_output(output_text, scenario, depth, use_cache)
 
         except Exception as e:
-            print(f"Error in scenario analysis: {e}")
+            logger.error("Error in scenario analysis: %s", e)
+            if raise_errors:
+                raise
             # return dummy data for fallback
             return {}
 
-    def evaluate_options(self, framework: Dict, responses: Dict) -> Dict:
+    def cached_analysis(self, scenario: str, depth: str = "balanced") -> Optional[Dict]:
+        """Framework for a near-duplicate scenario from the semantic cache, if any"""
+        similar = self._similar_framework(scenario, depth)
+        if similar is None:
+            return None
+        return self._finish_analysis(similar, scenario, depth)
+
+    def analysis_request(self, scenario: str, depth: str = "balanced") -> Dict:
+        """
+        Responses API request body analyze_scenario would send for a scenario,
+        for submission through the Batch API (see batch.py)
+        """
+        return {
+            "model": self._choose_model(depth, "analyze"),
+            "instructions": ANALYSIS_INSTRUCTIONS,
+            "input": self._build_analysis_prompt(scenario, depth),
+            **_format_kwargs(text_format("framework")),
+            **_budget_kwargs(self.router.route("analyze", depth).max_output_tokens),
+        }
+
+    def analysis_from_output(
+        self,
+        output_text: str,
+        scenario: str,
+        depth: str = "balanced",
+        use_cache: bool = True,
+    ) -> Dict:
         """
-        Stage 2: Evaluate options based on responses using intelligent model routing
+        Framework from raw analysis output, parsed, validated (re-asking invalid
+        fragments) and finished as in analyze_scenario
         """
+        check = self._framework_check(
+            self._parse_output(output_text, "analyze"), scenario
+        )
+        framework = self._check_output(check, "analyze", use_cache, depth)
+        self._remember_framework(scenario, depth, framework)
+        return self._finish_analysis(framework, scenario, depth)
+
+    def _evaluation_payload(self, framework: Dict, responses: Dict) -> Dict:
+        payload = compact_evaluation_payload(framework, responses)
+        stats = payload["stats"]
+        logger.debug(
+            "Evaluation prompt (%s): %s -> %s tokens after compaction",
+            stats["depth"],
+            stats["tokens_before"],
+            stats["tokens_after"],
+        )
+        return payload
 
-        depth = framework.get("depth", "balanced")
-        if depth == "quick":
-            chosen_model = "gpt-4o-mini-2024-07-18"
-        else:
-            # chosen_model = "o4-mini-2025-04-16"
-            # gpt 4.1 test
-            chosen_model = "gpt-4.1-2025-04-14"
-
-        # chosen_model = "gpt-4.1-mini-2025-04-14"
-
-        prompt = f"""
-        DECISION FRAMEWORK:
-        {json.dumps(framework, indent=2)}
-
-        USER RESPONSES:
-        {json.dumps(responses, indent=2)}
-
-        EVALUATION INSTRUCTIONS:
-        Evaluate ALL options (both explicit and AI-inferred) using the user's stated values, constraints, and priorities.
-
-        SCORING METHOD (STRICT):
-        1. For each option:
-        a. For each criterion:
-            - Assign a score from 0 to 10 based on how well the option aligns with the user's values
-            - Multiply this score by the criterion's weight to get the weighted score
-        b. Sum all weighted scores to compute a final `total_score` on a 0–10 scale:
-            total_score = sum(weighted_criterion_scores)
-        2. Report both `criteria_scores` (weighted) and `total_score` with **2 decimal places**.
-
-        SCORING GUIDANCE:
-        - Use user's responses to justify each score
-        - Do not use generic assumptions — base everything on user's expressed preferences
-        - All total_scores must be the **exact sum** of weighted criterion scores
-
-        ANALYSIS REQUIREMENTS:
-        - Justify scores with clear links to user input (e.g., “scores high on flexibility, which you rated as very important”)
-        - Highlight tradeoffs and tensions between values
-        - Identify strengths and weaknesses *specific to the user*, not general platitudes
-        - Set confidence level as "high", "medium", or "low" depending on clarity and specificity of user input
-        - Flag any options you inferred that were not user-provided
-
-        OUTPUT: Valid **pure JSON** (no markdown or extra explanations), matching this structure:
-
-        {{
-        "option_scores": {{
-            "Option Name": {{
-            "total_score": float (0.00 to 10.00),
-            "criteria_scores": {{
-                "Criterion Name": float (0.00 to 10.00 * weight)
-            }},
-            "strengths": ["Specific strength aligned with user's stated values"],
-            "weaknesses": ["Specific weakness based on user's constraints"],
-            "confidence": "high" | "medium" | "low"
-            }},
-            ...
-        }},
-        "recommendation": {{
-            "primary_choice": "Option Name",
-            "reasoning": "Why this best fits the user's values and context (2-3 sentences)",
-            "alternatives": ["Option B if user's priority X increases", "Option C if concern Y becomes more relevant"],
-            "red_flags": ["Risk due to concern about X", "Potential mismatch with user's constraint Y"]
-        }},
-        "sensitivity_analysis": {{
-            "critical_factors": ["If priority X changes, the top choice may shift to Option Y"],
-            "robust_choice": "Option least sensitive to shifting priorities"
-        }},
-        "decision_insights": {{
-            "key_tradeoff": "Primary tension the user must resolve (e.g., growth vs stability)",
-            "surprise_finding": "Non-obvious insight from user's values"
-        }}
-        }}
+    def _build_evaluation_prompt(self, framework: Dict, responses: Dict) -> str:
+        payload = self._evaluation_payload(framework, responses)
+        return EVALUATION.render(
+            framework=payload["framework"], responses=payload["responses"]
+        )
+
+    def _build_option_scores_prompt(self, payload: Dict, options: List[str]) -> str:
+        """
+        Fan-out prompt: raw scores for a subset of the options only, without the
+        recommendation / decision_insights sections
         """
+        return OPTION_SCORES.render(
+            framework=payload["framework"],
+            responses=payload["responses"],
+            options=compact_json(options),
+        )
 
-        try:
-            print(f"Calling model: {chosen_model} for evaluation")
-            response = self.client.responses.create(
-                model=chosen_model,
-                instructions="You are an expert decision analyst tasked with evaluating options using a structured framework. Your analysis should be thorough, nuanced, and actionable.",
-                input=prompt,
-                # temperature=0.7,
-                # max_tokens=2000,
+    def _build_rescore_prompt(self, framework: Dict, plan: IncrementalPlan) -> str:
+        criteria = [
+            {"name": c.get("name"), "description": c.get("description")}
+            for c in framework.get("criteria", [])
+            if c.get("name") in plan.changed
+        ]
+        options = [o.get("name") for o in framework.get("options", [])]
+        return RESCORE.render(
+            title=framework.get("title", ""),
+            scenario=framework.get("scenario_text", ""),
+            options=compact_json(options),
+            criteria=compact_json(criteria),
+            responses=compact_json(compact_answers(plan.answers)),
+        )
+
+    def evaluate_options(
+        self,
+        framework: Dict,
+        responses: Dict,
+        use_cache: bool = True,
+        previous: Dict = None,
+        fanout: bool = None,
+    ) -> Dict:
+        """
+        Stage 2: Evaluate options based on responses using intelligent model routing.
+        With a previous evaluation, only criteria fed by changed answers are re-scored.
+        With fanout, options are scored in parallel calls (see fanout.py).
+        """
+        chosen_model = self._choose_model(framework.get("depth", "balanced"))
+
+        plan = plan_incremental(framework, responses, previous)
+        if plan is not None:
+            return self._evaluate_incremental(
+                framework, responses, previous, plan, chosen_model, use_cache
             )
 
-            evaluation = json.loads(response.output_text)
+        options = [o.get("name") for o in framework.get("options", []) if o.get("name")]
+        if should_fan_out(len(options), fanout):
+            return self._evaluate_fanout(
+                framework, responses, options, chosen_model, use_cache
+            )
 
-            # with open("test/evaluation.json", "r") as f:
-            #     sample_json = json.load(f)
+        with stage("prompt_build", "evaluate"):
+            prompt = self._build_evaluation_prompt(framework, responses)
+        criteria = framework_axes(framework)[1]
 
-            # evaluation = sample_json
-            evaluation["model_used"] = chosen_model
+        try:
+            logger.info("Calling model: %s for evaluation", chosen_model)
+            output_text = self._create_text(
+                chosen_model,
+                EVALUATION_INSTRUCTIONS,
+                prompt,
+                use_cache,
+                framework.get("depth"),
+                text_format("evaluation", options, criteria),
+            )
 
-            return evaluation
+            check = self._scores_check(
+                "evaluation",
+                self._parse_output(output_text, "evaluate"),
+                options,
+                criteria,
+            )
+            evaluation = self._check_output(
+                check, "evaluate", use_cache, framework.get("depth")
+            )
+            return self._finish_evaluation(
+                evaluation, framework, responses, chosen_model
+            )
 
         except Exception as e:
-            print(f"Error in scenario analysis: {e}")
+            logger.error("Error in evaluation: %s", e)
             # return dummy data for fallback
             return {}
+
+    def _fanout_prompts(
+        self, framework: Dict, responses: Dict, options: List[str]
+    ) -> List[Tuple[List[str], str]]:
+        """(options, prompt) for each fan-out call"""
+        with stage("prompt_build", "evaluate"):
+            payload = self._evaluation_payload(framework, responses)
+            return [
+                (chunk, self._build_option_scores_prompt(payload, chunk))
+                for chunk in chunk_options(options)
+            ]
+
+    def _finish_fanout(
+        self, parts: List[Dict], framework: Dict, responses: Dict, model: str
+    ) -> Dict:
+        evaluation = merge_option_scores(parts)
+        evaluation = self._finish_evaluation(evaluation, framework, responses, model)
+        # Narrative sections come from the merged scores rather than another
+        # sequential LLM call
+        evaluation.update(local_summary(evaluation, framework))
+        evaluation["fanout"] = {"calls": len(parts)}
+        return evaluation
+
+    def _evaluate_fanout(
+        self,
+        framework: Dict,
+        responses: Dict,
+        options: List[str],
+        chosen_model: str,
+        use_cache: bool = True,
+    ) -> Dict:
+        criteria = framework_axes(framework)[1]
+
+        def score(call: Tuple[List[str], str]) -> Dict:
+            chunk, prompt = call
+            output_text = self._create_text(
+                chosen_model,
+                EVALUATION_INSTRUCTIONS,
+                prompt,
+                use_cache,
+                framework.get("depth"),
+                text_format("option_scores", chunk, criteria),
+            )
+            check = self._scores_check(
+                "option_scores",
+                self._parse_output(output_text, "evaluate"),
+                chunk,
+                criteria,
+            )
+            return self._check_output(
+                check, "evaluate", use_cache, framework.get("depth")
+            )
+
+        try:
+            calls = self._fanout_prompts(framework, responses, options)
+            logger.info(
+                "Calling model: %s for evaluation in %d parallel calls",
+                chosen_model,
+                len(calls),
+            )
+            parts = list(fanout_executor.map(score, calls))
+            return self._finish_fanout(parts, framework, responses, chosen_model)
+
+        except Exception as e:
+            logger.error("Error in fan-out evaluation: %s", e)
+            return {}
+
+    def _evaluate_incremental(
+        self,
+        framework: Dict,
+        responses: Dict,
+        previous: Dict,
+        plan: IncrementalPlan,
+        chosen_model: str,
+        use_cache: bool = True,
+    ) -> Dict:
+        if not plan.changed:
+            logger.info(
+                "No criteria affected by the changed responses, re-scoring locally"
+            )
+            return self._finish_incremental(
+                previous, {}, plan, framework, responses, previous.get("model_used")
+            )
+
+        try:
+            logger.info(
+                "Calling model: %s to re-score %d changed criteria",
+                chosen_model,
+                len(plan.changed),
+            )
+            with stage("prompt_build", "evaluate"):
+                prompt = self._build_rescore_prompt(framework, plan)
+            options = framework_axes(framework)[0]
+            output_text = self._create_text(
+                chosen_model,
+                EVALUATION_INSTRUCTIONS,
+                prompt,
+                use_cache,
+                framework.get("depth"),
+                text_format("rescore", options, plan.changed),
+            )
+            check = self._scores_check(
+                "rescore",
+                self._parse_output(output_text, "evaluate"),
+                options,
+                plan.changed,
+            )
+            partial = self._check_output(
+                check, "evaluate", use_cache, framework.get("depth")
+            )
+            return self._finish_incremental(
+                previous, partial, plan, framework, responses, chosen_model
+            )
+
+        except Exception as e:
+            logger.error("Error in incremental evaluation: %s", e)
+            return {}
+
+    def analyze_scenario_stream(
+        self, scenario: str, depth: str = "balanced", use_cache: bool = True
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Streaming variant of analyze_scenario. Yields (event, data) pairs as soon
+        as each option, criterion and question is complete, then a final "done"
+        event carrying the full framework.
+        """
+        chosen_model = self._choose_model(depth, "analyze")
+        with stage("prompt_build", "analyze"):
+            prompt = self._build_analysis_prompt(scenario, depth)
+        yield "start", {"model": chosen_model, "depth": depth}
+
+        try:
+            parser = IncrementalJSONParser()
+            similar = self._similar_framework(scenario, depth, use_cache)
+            if similar is not None:
+                yield from parser.feed(json.dumps(similar))
+            else:
+                logger.info("Streaming model: %s for depth: %s", chosen_model, depth)
+                yield from self._stream_json(
+                    parser,
+                    chosen_model,
+                    ANALYSIS_INSTRUCTIONS,
+                    prompt,
+                    use_cache,
+                    depth,
+                    text_format("framework"),
+                    "analyze",
+                )
+            # Items already sent may be re-asked or dropped here; "done"
+            # carries the validated framework
+            check = self._framework_check(parser.result(), scenario)
+            framework = self._check_output(check, "analyze", use_cache, depth)
+            if similar is None:
+                self._remember_framework(scenario, depth, framework)
+
+            yield "done", self._finish_analysis(framework, scenario, depth)
+
+        except Exception as e:
+            logger.error("Error in streaming scenario analysis: %s", e)
+            yield "error", {"message": "Scenario analysis failed"}
+
+    def evaluate_options_stream(
+        self, framework: Dict, responses: Dict, use_cache: bool = True
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Streaming variant of evaluate_options. Each option score is emitted as
+        soon as the model has finished writing it.
+        """
+        chosen_model = self._choose_model(framework.get("depth", "balanced"))
+        with stage("prompt_build", "evaluate"):
+            prompt = self._build_evaluation_prompt(framework, responses)
+        options, criteria, _ = framework_axes(framework)
+        yield "start", {"model": chosen_model}
+
+        try:
+            logger.info("Streaming model: %s for evaluation", chosen_model)
+            parser = IncrementalJSONParser()
+            yield from self._stream_json(
+                parser,
+                chosen_model,
+                EVALUATION_INSTRUCTIONS,
+                prompt,
+                use_cache,
+                framework.get("depth"),
+                text_format("evaluation", options, criteria),
+            )
+
+            check = self._scores_check("evaluation", parser.result(), options, criteria)
+            evaluation = self._check_output(
+                check, "evaluate", use_cache, framework.get("depth")
+            )
+            yield "done", self._finish_evaluation(
+                evaluation, framework, responses, chosen_model
+            )
+
+        except Exception as e:
+            logger.error("Error in streaming evaluation: %s", e)
+            yield "error", {"message": "Evaluation failed"}
+
+    def _stream_json(
+        self,
+        parser: IncrementalJSONParser,
+        model: str,
+        instructions: str,
+        prompt: str,
+        use_cache: bool = True,
+        depth: str = None,
+        output_format: Dict = None,
+        stage: str = "evaluate",
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Feeds a streamed call into the parser. Streams are routed (and their
+        latency recorded) but not hedged: text already sent cannot be swapped.
+        """
+        key = cache_key(model, instructions, prompt, _format_name(output_format))
+        cached = self.cache.get(key) if use_cache else None
+        if cached is not None:
+            logger.info("Cache hit for model: %s", model)
+            yield from parser.feed(cached)
+            return
+
+        route = self.router.route(stage, depth)
+        with self.upstream.slot(model):
+            timer = StreamTimer(model, depth)
+            try:
+                stream = self.client.responses.create(
+                    model=model,
+                    instructions=instructions,
+                    input=prompt,
+                    stream=True,
+                    **_format_kwargs(output_format),
+                    **_budget_kwargs(route.max_output_tokens),
+                )
+                for event in stream:
+                    timer.event(event)
+                    if event.type == "response.output_text.delta":
+                        yield from parser.feed(event.delta)
+                    elif event.type in ("response.failed", "error"):
+                        raise RuntimeError(f"Upstream stream failed: {event.type}")
+            except Exception as e:
+                UPSTREAM_ERRORS.inc(model=model, error=type(e).__name__)
+                self.router.record(model, time.perf_counter() - timer.start, ok=False)
+                raise
+            timer.finish()
+            self.router.record(model, time.perf_counter() - timer.start)
+
+        if parser.done:
+            self.cache.set(key, parser.document)
@@ -1,39 +1,504 @@
 # backend/decisions.py
-from flask import Blueprint, request, jsonify
+import time
 
-# from models_decision import db, Decision, DecisionOption, EvaluationCriteria
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+from batch import (
+    BATCH_ADMIT_TIMEOUT,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_ITEMS,
+    BatchRunner,
+    BatchStats,
+    Checkpoint,
+    checkpoint_path,
+    parse_items,
+    valid_batch_id,
+)
+from cache import response_cache
 from decision_engine import DecisionEngine
+from jobs import JobFailed, QueueFull, job_queue
+from json_codec import dumps
+from log_config import get_logger
+from metrics import prompt_cache_stats, stage
+from persistence import decision_store
+from prompt_compaction import compaction_stats
+from prompts import normalize_depth, prompt_registry
+from rate_limit import RateLimited, rate_limiter
+from single_flight import single_flight
+from sensitivity import reweight
+from streaming import format_sse
 
 
 decisions_bp = Blueprint("decisions", __name__)
-# decision_engine = DecisionEngine()
+decision_engine = DecisionEngine()
+logger = get_logger(__name__)
+
+# Seconds between job status checks for streamed GET /api/jobs/<id>
+JOB_POLL_INTERVAL = 0.5
+
+
+def _wants_stream() -> bool:
+    return request.args.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def _wants_async() -> bool:
+    return request.args.get("async", "").lower() in ("1", "true", "yes")
+
+
+def _use_cache() -> bool:
+    """
+    Clients can skip the response cache with "Cache-Control: no-cache"
+    or "X-Cache-Bypass: 1"
+    """
+    if "no-cache" in request.headers.get("Cache-Control", "").lower():
+        return False
+    return request.headers.get("X-Cache-Bypass", "").lower() not in ("1", "true")
+
+
+def _request_json(operation: str) -> dict:
+    with stage("request_parse", operation):
+        return request.get_json()
+
+
+def _json_response(result: dict, operation: str):
+    with stage("serialize", operation):
+        return jsonify(result), 200
+
+
+def _session_id() -> str:
+    return request.headers.get("X-Session-Id") or None
+
+
+def _client_key() -> str:
+    return rate_limiter.key(
+        request.remote_addr, request.headers.get("X-Forwarded-For", "")
+    )
+
+
+def _normalize_framework_depth(framework: dict):
+    """Clamp a client-sent framework's depth before it reaches metrics and caches"""
+    if framework:
+        framework["depth"] = normalize_depth(framework.get("depth"))
+
+
+def _admit(stage: str, depth: str):
+    """
+    None when the client may start another LLM-bound request, else a 429
+    telling it when to retry (rate_limit.py)
+    """
+    try:
+        rate_limiter.check(_client_key(), stage, depth)
+    except RateLimited as e:
+        return _rate_limited(e)
+    return None
+
+
+def _rate_limited(e: RateLimited):
+    response = jsonify(
+        {
+            "error": "Too many requests, please retry shortly",
+            "reason": e.reason,
+            "retry_after": int(e.retry_after_header),
+        }
+    )
+    response.headers["Retry-After"] = e.retry_after_header
+    return response, 429
+
+
+def _save_framework(framework: dict) -> dict:
+    return decision_store.record_framework(framework, _session_id())
+
+
+def _save_evaluation(framework: dict, responses: dict, evaluation: dict) -> dict:
+    return decision_store.record_evaluation(
+        framework, responses, evaluation, _session_id()
+    )
+
+
+def _framework_not_found():
+    return (
+        jsonify(
+            {"error": "Unknown framework_hash or framework_id; send the framework"}
+        ),
+        404,
+    )
+
+
+def _persist_done(events, save):
+    """Pass stream events through, persisting the final "done" payload"""
+    for event, data in events:
+        if event == "done":
+            data = save(data)
+        yield event, data
+
+
+def _sse_response(events) -> Response:
+    """
+    Forward (event, data) pairs from the engine as a text/event-stream response
+    """
+
+    def generate():
+        for event, data in events:
+            yield format_sse(event, data)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _run_analysis_job(payload: dict) -> dict:
+    framework = decision_engine.analyze_scenario(
+        scenario=payload["scenario"],
+        depth=payload["depth"],
+        use_cache=payload["use_cache"],
+        raise_errors=True,
+    )
+    if not framework:
+        raise JobFailed("Scenario analysis returned no framework")
+    return decision_store.record_framework(framework, payload.get("session_id"))
+
+
+job_queue.register("analyze", _run_analysis_job)
+
+
+def _submit_job(kind: str, payload: dict):
+    try:
+        job_id = job_queue.submit(kind, payload)
+    except QueueFull as e:
+        response = jsonify({"error": "Too many queued jobs, please retry shortly"})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 503
+
+    response = jsonify(
+        {"job_id": job_id, "status": "queued", "status_url": f"/api/jobs/{job_id}"}
+    )
+    response.headers["Location"] = f"/api/jobs/{job_id}"
+    return response, 202
 
 
 @decisions_bp.route("/analyze", methods=["POST"])
 def analyze_decision():
-    decision_engine = DecisionEngine()
-    data = request.get_json()
+    if _wants_stream():
+        return analyze_decision_stream()
+
+    data = _request_json("analyze")
     scenario = data.get("scenario", "")
-    depth = data.get("depth", "balanced")
+    depth = normalize_depth(data.get("depth"))
+    shed = _admit("analyze", depth)
+    if shed is not None:
+        return shed
 
-    result = decision_engine.analyze_scenario(scenario=scenario, depth=depth)
-    print(f"Analysis result: {result}")
-    return jsonify(result), 200
+    # Long (e.g. thorough) analyses can run as a job instead of holding the request
+    if _wants_async():
+        return _submit_job(
+            "analyze",
+            {
+                "scenario": scenario,
+                "depth": depth,
+                "use_cache": _use_cache(),
+                "session_id": _session_id(),
+            },
+        )
+
+    result = decision_engine.analyze_scenario(
+        scenario=scenario, depth=depth, use_cache=_use_cache()
+    )
+    result = _save_framework(result)
+    logger.debug("Analysis result: %s", result)
+    return _json_response(result, "analyze")
+
+
+@decisions_bp.route("/analyze/stream", methods=["POST"])
+def analyze_decision_stream():
+    data = _request_json("analyze")
+    scenario = data.get("scenario", "")
+    depth = normalize_depth(data.get("depth"))
+    shed = _admit("analyze", depth)
+    if shed is not None:
+        return shed
+
+    return _sse_response(
+        _persist_done(
+            decision_engine.analyze_scenario_stream(
+                scenario=scenario, depth=depth, use_cache=_use_cache()
+            ),
+            _save_framework,
+        )
+    )
+
+
+@decisions_bp.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """
+    Analyze one scenario per JSONL line of the body ({"id", "scenario", "depth"}),
+    streaming back one JSONL result per scenario as it finishes, then a summary.
+    With ?batch_id= results are checkpointed, and repeating the request replays
+    the finished ones and runs only the rest. ?concurrency= caps analyses in
+    flight (see batch.py for the CLI and Batch API mode). Each scenario is
+    charged to the client's rate limit like a single analysis.
+    """
+    try:
+        items = parse_items(
+            request.get_data(as_text=True).splitlines(),
+            request.args.get("depth", "balanced"),
+        )
+        concurrency = int(request.args.get("concurrency", BATCH_CONCURRENCY))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not items:
+        return jsonify({"error": "No scenarios given"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return (
+            jsonify({"error": f"At most {BATCH_MAX_ITEMS} scenarios per batch"}),
+            413,
+        )
+
+    client = _client_key()
+    batch_id = request.args.get("batch_id")
+    checkpoint = None
+    if batch_id is not None:
+        if not valid_batch_id(batch_id):
+            return jsonify({"error": "Invalid batch_id"}), 400
+        # Per client, so a batch_id cannot be used to replay someone else's
+        checkpoint = Checkpoint(checkpoint_path(batch_id, client))
+        if not checkpoint.acquire():
+            return jsonify({"error": "This batch is already running"}), 409
+
+    done = checkpoint.done if checkpoint is not None else {}
+    resumed = [done[item["id"]] for item in items if item["id"] in done]
+    pending = [item for item in items if item["id"] not in done]
+    # Every analysis is charged to the client like a single one: the first
+    # here, so a client over its limit gets a 429 rather than a stream of
+    # failures, the rest as the runner reaches them
+    if pending:
+        shed = _admit("analyze", pending[0]["depth"])
+        if shed is not None:
+            if checkpoint is not None:
+                checkpoint.close()
+            return shed
+
+    def admit(item):
+        if item is not pending[0]:
+            rate_limiter.wait(client, "analyze", item["depth"], BATCH_ADMIT_TIMEOUT)
+
+    runner = BatchRunner(
+        decision_engine,
+        max(1, min(concurrency, BATCH_MAX_CONCURRENCY)),
+        _use_cache(),
+        admit,
+    )
+
+    def generate():
+        stats = BatchStats(len(items), len(resumed))
+        for result in resumed:
+            yield dumps(dict(result, resumed=True)) + "\n"
+        for result in runner.run(items, checkpoint):
+            stats.record(result)
+            yield dumps(result) + "\n"
+        summary = dict(stats.snapshot(), batch_id=batch_id)
+        yield dumps({"summary": summary}) + "\n"
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    if checkpoint is not None:
+        response.call_on_close(checkpoint.close)
+    return response
 
 
 @decisions_bp.route("/evaluate", methods=["POST"])
 def evaluate_decision():
-    decision_engine = DecisionEngine()
-    data = request.get_json()
-    framework = data.get("framework", {})
+    if _wants_stream():
+        return evaluate_decision_stream()
+
+    data = _request_json("evaluate")
+    # The framework itself, or the framework_hash / framework_id analyze returned
+    framework = decision_store.resolve_framework(data, _session_id())
+    if framework is None:
+        return _framework_not_found()
+    _normalize_framework_depth(framework)
+    shed = _admit("evaluate", framework.get("depth"))
+    if shed is not None:
+        return shed
     responses = data.get("responses", {})
 
+    # A previous evaluation lets the engine re-score only what changed
+    previous = data.get("previous_evaluation")
+    # "fanout": true scores options in parallel calls; omitted, the server decides
+    fanout = data.get("fanout")
+
     # Call the DecisionEngine evaluation
-    result = decision_engine.evaluate_options(framework=framework, responses=responses)
-    print(f"Evaluation result: {result}")
+    result = decision_engine.evaluate_options(
+        framework=framework,
+        responses=responses,
+        use_cache=_use_cache(),
+        previous=previous,
+        fanout=fanout,
+    )
+    result = _save_evaluation(framework, responses, result)
+    logger.debug("Evaluation result: %s", result)
+    return _json_response(result, "evaluate")
+
+
+@decisions_bp.route("/evaluate/stream", methods=["POST"])
+def evaluate_decision_stream():
+    data = _request_json("evaluate")
+    framework = decision_store.resolve_framework(data, _session_id())
+    if framework is None:
+        return _framework_not_found()
+    _normalize_framework_depth(framework)
+    shed = _admit("evaluate", framework.get("depth"))
+    if shed is not None:
+        return shed
+    responses = data.get("responses", {})
+
+    return _sse_response(
+        _persist_done(
+            decision_engine.evaluate_options_stream(
+                framework=framework, responses=responses, use_cache=_use_cache()
+            ),
+            lambda evaluation: _save_evaluation(framework, responses, evaluation),
+        )
+    )
+
+
+@decisions_bp.route("/decisions", methods=["GET"])
+def list_decisions():
+    """The calling session's stored decisions, newest first"""
+    if not decision_store.enabled:
+        return jsonify({"error": "Decision storage is not configured"}), 503
+
+    session_id = _session_id()
+    if not session_id:
+        return jsonify({"error": "X-Session-Id header is required"}), 400
+
+    result = decision_store.list_decisions(
+        session_id,
+        page=request.args.get("page", 1, type=int),
+        per_page=request.args.get("per_page", 20, type=int),
+    )
+    return jsonify(result), 200
+
+
+@decisions_bp.route("/decisions/<int:decision_id>", methods=["GET"])
+def get_decision(decision_id):
+    """
+    Stored framework, responses and latest evaluation (no LLM call) of one of
+    the calling session's decisions
+    """
+    if not decision_store.enabled:
+        return jsonify({"error": "Decision storage is not configured"}), 503
+
+    # Ids are sequential: only the session that created a decision may read it
+    result = decision_store.load_decision(decision_id, _session_id())
+    if result is None:
+        return jsonify({"error": "Decision not found"}), 404
+    return jsonify(result), 200
+
+
+@decisions_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Job status, timing and (once done) result; ?stream=1 pushes updates"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not _wants_stream():
+        return jsonify(job), 200
+
+    def events():
+        current = job
+        seen = None
+        while True:
+            state = (current["status"], current["attempts"])
+            if state != seen:
+                seen = state
+                if current["status"] == "done":
+                    yield "done", current
+                    return
+                if current["status"] == "failed":
+                    yield "error", current
+                    return
+                yield "status", current
+            time.sleep(JOB_POLL_INTERVAL)
+            current = job_queue.get(job_id)
+            if current is None:
+                # Purged while we were watching it
+                yield "error", {"job_id": job_id, "error": "Job not found"}
+                return
+
+    return _sse_response(events())
+
+
+@decisions_bp.route("/sensitivity", methods=["POST"])
+def sensitivity_decision():
+    """Re-rank a scored evaluation under adjusted criterion weights (no LLM call)"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    evaluation = data.get("evaluation", {})
+    framework = data.get("framework", {})
+    weights = data.get("weights", {})
+
+    if (
+        not isinstance(evaluation, dict)
+        or not isinstance(framework, dict)
+        or not evaluation.get("option_scores")
+        or not framework.get("criteria")
+    ):
+        return jsonify({"error": "evaluation and framework are required"}), 400
+
+    try:
+        result = reweight(evaluation, framework, weights)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(result), 200
 
 
+@decisions_bp.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """
+    Hit/miss counters for the response, semantic and framework caches, and
+    coalesced calls
+    """
+    stats = response_cache.stats()
+    semantic = decision_engine.semantic_cache
+    stats["semantic"] = semantic.stats() if semantic is not None else None
+    stats["single_flight"] = single_flight.snapshot()
+    stats["frameworks"] = decision_store.frameworks.stats()
+    return jsonify(stats), 200
+
+
+@decisions_bp.route("/prompt/stats", methods=["GET"])
+def prompt_stats():
+    """
+    Evaluation prompt tokens before/after compaction per depth, upstream prompt
+    cache hits per model, and the version of every prompt template
+    """
+    stats = {
+        "compaction": compaction_stats.snapshot(),
+        "prefix_cache": prompt_cache_stats.snapshot(),
+        "templates": prompt_registry(),
+    }
+    return jsonify(stats), 200
+
+
+@decisions_bp.route("/ratelimit/stats", methods=["GET"])
+def rate_limit_stats():
+    """Admitted and shed requests, request costs and the upstream concurrency"""
+    return jsonify(rate_limiter.snapshot()), 200
+
+
+@decisions_bp.route("/routing/stats", methods=["GET"])
+def routing_stats():
+    """Rolling per-model latency and error rates, and the route table"""
+    return jsonify(decision_engine.router.snapshot()), 200
+
+
 @decisions_bp.route("/test", methods=["GET"])
 def test_endpoint():
     """Simple test endpoint to verify the API is working"""
@@ -44,8 +509,20 @@ def test_endpoint():
                 "message": "Decision engine is running",
                 "endpoints": [
                     "POST /api/analyze",
+                    "POST /api/analyze/batch",
+                    "POST /api/analyze/stream",
                     "POST /api/evaluate",
+                    "POST /api/evaluate/stream",
+                    "GET /api/decisions",
+                    "GET /api/decisions/<id>",
+                    "GET /api/jobs/<id>",
+                    "POST /api/sensitivity",
+                    "GET /api/cache/stats",
+                    "GET /api/prompt/stats",
+                    "GET /api/ratelimit/stats",
+                    "GET /api/routing/stats",
                     "GET /api/test",
+                    "GET /metrics",
                 ],
             }
         ),
@@ -0,0 +1,126 @@
+# backend/fanout.py
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FANOUT_WORKERS = int(os.getenv("EVAL_FANOUT_WORKERS", "8"))
+FANOUT_CHUNK_SIZE = int(os.getenv("EVAL_FANOUT_CHUNK_SIZE", "1"))
+# Frameworks with at least this many options are fanned out automatically (0 = only on request)
+FANOUT_MIN_OPTIONS = int(os.getenv("EVAL_FANOUT_MIN_OPTIONS", "0"))
+
+# Shared by every request, so the total number of parallel upstream calls per
+# worker process stays bounded no matter how many requests fan out at once
+fanout_executor = ThreadPoolExecutor(
+    max_workers=FANOUT_WORKERS, thread_name_prefix="eval-fanout"
+)
+
+
+def should_fan_out(option_count: int, requested: bool = None) -> bool:
+    if requested is not None:
+        return bool(requested) and option_count > 1
+    return FANOUT_MIN_OPTIONS > 0 and option_count >= FANOUT_MIN_OPTIONS
+
+
+def chunk_options(options: List[str], size: int = FANOUT_CHUNK_SIZE) -> List[List[str]]:
+    size = max(1, size)
+    return [options[i : i + size] for i in range(0, len(options), size)]
+
+
+def merge_option_scores(parts: List[Dict]) -> Dict:
+    """
+    Combine the option_scores of per-chunk evaluations into one evaluation
+    """
+    option_scores = {}
+    for part in parts:
+        option_scores.update(part.get("option_scores") or {})
+    return {"option_scores": option_scores}
+
+
+def _top_criteria(entry: Dict, count: int = 2, reverse: bool = True) -> List[str]:
+    scores = entry.get("criteria_scores") or {}
+    return [
+        name
+        for name, _ in sorted(scores.items(), key=lambda kv: kv[1], reverse=reverse)
+    ][:count]
+
+
+def local_summary(evaluation: Dict, framework: Dict = None) -> Dict:
+    """
+    recommendation / decision_insights assembled from a scored evaluation (see
+    scoring.apply_scores) instead of a final LLM call. The framework tells which
+    options were inferred rather than listed by the user.
+    """
+    ranking = evaluation.get("ranking") or []
+    option_scores = evaluation.get("option_scores") or {}
+    if not ranking:
+        return {}
+
+    top = ranking[0]
+    top_entry = option_scores.get(top, {})
+    top_raw = top_entry.get("raw_scores") or {}
+
+    drivers = _top_criteria(top_entry)
+    reasoning = f"{top} has the highest weighted score ({top_entry.get('total_score', 0):.2f}/10)"
+    if drivers:
+        reasoning += f", driven mostly by {' and '.join(drivers)}"
+    reasoning += "."
+    if top_entry.get("rationale"):
+        reasoning += f" {top_entry['rationale']}"
+
+    alternatives = []
+    for name in ranking[1:3]:
+        raw = option_scores.get(name, {}).get("raw_scores") or {}
+        edges = sorted(((raw[c] - top_raw.get(c, 0), c) for c in raw), reverse=True)
+        if edges and edges[0][0] > 0:
+            alternatives.append(f"{name} if {edges[0][1]} matters more to you")
+        else:
+            alternatives.append(name)
+
+    red_flags = list(top_entry.get("weaknesses") or [])[:2]
+    for criterion in _top_criteria(
+        {"criteria_scores": top_raw}, count=len(top_raw), reverse=False
+    ):
+        if top_raw[criterion] < 5 and len(red_flags) < 3:
+            red_flags.append(f"{top} scores low on {criterion}")
+
+    insights = {"key_tradeoff": "", "surprise_finding": ""}
+    if len(ranking) > 1:
+        runner_up = ranking[1]
+        runner_raw = option_scores.get(runner_up, {}).get("raw_scores") or {}
+        gaps = sorted((top_raw.get(c, 0) - runner_raw[c], c) for c in runner_raw)
+        if gaps and gaps[0][0] < 0 < gaps[-1][0]:
+            insights["key_tradeoff"] = (
+                f"{top}'s strength in {gaps[-1][1]} vs {runner_up}'s strength "
+                f"in {gaps[0][1]}"
+            )
+        margin = top_entry.get("total_score", 0) - option_scores.get(runner_up, {}).get(
+            "total_score", 0
+        )
+        if margin < 0.25:
+            insights["surprise_finding"] = (
+                f"{top} and {runner_up} are nearly tied ({margin:.2f} points apart)"
+            )
+    inferred_options = {
+        option.get("name")
+        for option in (framework or {}).get("options") or []
+        if option.get("inferred")
+    }
+    inferred = [name for name in ranking[:2] if name in inferred_options]
+    if inferred and not insights["surprise_finding"]:
+        insights["surprise_finding"] = (
+            f"{inferred[0]}, an option you had not listed, ranks near the top"
+        )
+
+    return {
+        "recommendation": {
+            "primary_choice": top,
+            "reasoning": reasoning,
+            "alternatives": alternatives,
+            "red_flags": red_flags,
+        },
+        "decision_insights": insights,
+    }
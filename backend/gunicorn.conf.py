@@ -0,0 +1,19 @@
+# backend/gunicorn.conf.py
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3001')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# LLM calls are I/O bound, so each worker serves several requests on threads
+# that share the worker's pooled OpenAI client
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_class = "gthread"
+# Thorough analyses can take well over the default 30s
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+
+def post_worker_init(worker):
+    # Each worker owns its own connection pool; open it before taking traffic
+    from client_pool import warm_up
+
+    warm_up()
@@ -0,0 +1,171 @@
+# backend/incremental.py
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from scoring import extract_raw_scores, framework_axes, match_names
+
+
+def _digest(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def question_answers(framework: Dict, responses: Dict) -> List[Dict]:
+    """
+    Normalize user responses into
+    [{"question", "type", "max", "criteria_link", "response"}].
+
+    Accepts both shapes the API receives: the frontend's {"q_<index>": value}
+    map (indexes refer to framework["questions"]) and the
+    {"answers": [{question, criteria_link, response}]} list.
+    """
+    questions = framework.get("questions", [])
+    answers = []
+
+    if isinstance(responses.get("answers"), list):
+        for i, answer in enumerate(responses["answers"]):
+            question = questions[i] if i < len(questions) else {}
+            answers.append(
+                {
+                    "question": answer.get("question") or question.get("text", ""),
+                    "type": answer.get("type") or question.get("type"),
+                    "max": question.get("max"),
+                    "criteria_link": answer.get("criteria_link")
+                    or question.get("criteria_link", ""),
+                    "response": answer.get("response"),
+                }
+            )
+        return answers
+
+    for key, value in responses.items():
+        question = {}
+        index = str(key).rsplit("_", 1)[-1]
+        if index.isdigit() and int(index) < len(questions):
+            question = questions[int(index)]
+        answers.append(
+            {
+                "question": question.get("text", str(key)),
+                "type": question.get("type"),
+                "max": question.get("max"),
+                "criteria_link": question.get("criteria_link", ""),
+                "response": value,
+            }
+        )
+    return answers
+
+
+def answers_by_criterion(framework: Dict, responses: Dict) -> Dict[str, List[Dict]]:
+    """
+    Group answers under the criteria they inform via criteria_link. Answers whose
+    link matches no criterion (general context) inform every criterion.
+    """
+    _, criteria, _ = framework_axes(framework)
+    grouped = {name: [] for name in criteria}
+
+    for answer in question_answers(framework, responses):
+        links = [
+            part.strip()
+            for part in str(answer.get("criteria_link") or "").split(",")
+            if part.strip()
+        ]
+        linked = set(match_names(criteria, links).values())
+        for name in linked or criteria:
+            grouped[name].append(answer)
+    return grouped
+
+
+def score_fingerprints(framework: Dict, responses: Dict) -> Dict:
+    """
+    Fingerprints of everything a raw (option, criterion) score depends on: the
+    option set plus, per criterion, its definition and the answers feeding it.
+    Weights are not included since weighting happens locally.
+    """
+    options, _, _ = framework_axes(framework)
+    definitions = {
+        c.get("name"): {"name": c.get("name"), "description": c.get("description")}
+        for c in framework.get("criteria", [])
+        if c.get("name")
+    }
+    return {
+        "options": _digest(
+            [framework.get("scenario_text"), sorted(o.lower() for o in options)]
+        ),
+        "criteria": {
+            name: _digest([definitions.get(name), answers])
+            for name, answers in answers_by_criterion(framework, responses).items()
+        },
+    }
+
+
+@dataclass
+class IncrementalPlan:
+    """
+    Criteria whose scores must be re-queried, and the answers relevant to them
+    """
+
+    changed: List[str]
+    answers: List[Dict] = field(default_factory=list)
+    fingerprints: Dict = field(default_factory=dict)
+
+
+def plan_incremental(
+    framework: Dict, responses: Dict, previous: Optional[Dict]
+) -> Optional[IncrementalPlan]:
+    """
+    Compare against a previous evaluation's fingerprints. Returns None when a
+    full evaluation is needed (no usable previous result, different options, or
+    every criterion changed).
+    """
+    if not previous or not previous.get("score_fingerprints"):
+        return None
+
+    fingerprints = score_fingerprints(framework, responses)
+    before = previous["score_fingerprints"]
+    if before.get("options") != fingerprints["options"]:
+        return None
+
+    options, criteria, _ = framework_axes(framework)
+    raw = extract_raw_scores(previous.get("option_scores") or {})
+    if len(match_names(options, raw)) < len(options):
+        return None
+
+    changed = [
+        name
+        for name in criteria
+        if before.get("criteria", {}).get(name) != fingerprints["criteria"][name]
+    ]
+    if len(changed) == len(criteria):
+        return None
+
+    grouped = answers_by_criterion(framework, responses)
+    answers = []
+    for name in changed:
+        for answer in grouped[name]:
+            if answer not in answers:
+                answers.append(answer)
+
+    return IncrementalPlan(changed=changed, answers=answers, fingerprints=fingerprints)
+
+
+def merge_scores(previous: Dict, partial: Dict, criteria: List[str]) -> Dict:
+    """
+    Overlay freshly scored criteria onto a previous evaluation's raw scores
+    """
+    merged = json.loads(json.dumps(previous))
+    option_scores = merged.get("option_scores") or {}
+    new_scores = partial.get("option_scores") or {}
+
+    for key, name in match_names(list(option_scores), new_scores).items():
+        entry = option_scores[name]
+        raw = dict(entry.get("raw_scores") or entry.get("scores") or {})
+        fresh = (new_scores[key] or {}).get("scores") or {}
+        for crit_key, crit_name in match_names(criteria, fresh).items():
+            raw[crit_name] = fresh[crit_key]
+        entry["raw_scores"] = raw
+        if new_scores[key].get("rationale"):
+            entry["rationale"] = new_scores[key]["rationale"]
+
+    merged["option_scores"] = option_scores
+    return merged
@@ -0,0 +1,343 @@
+# backend/jobs.py
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from log_config import get_logger
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Upstream hiccups worth another attempt; anything else fails the job at once
+TRANSIENT_ERRORS = (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+    json.JSONDecodeError,
+)
+
+
+class QueueFull(Exception):
+    def __init__(self, depth: int, retry_after: int = 5):
+        super().__init__(f"Job queue is full ({depth} jobs)")
+        self.retry_after = retry_after
+
+
+class JobFailed(Exception):
+    """Raised by handlers for a failure that should be retried"""
+
+
+class SQLiteJobStore:
+    """
+    Job table in a SQLite file, shared by every worker process on the host.
+    Jobs are claimed inside BEGIN IMMEDIATE, so two workers never run the same
+    job; a claimed job carries a lease and is handed out again if its worker
+    dies before finishing.
+    """
+
+    def __init__(self, path: str = "jobs.sqlite3"):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "result TEXT, error TEXT, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL, run_ms REAL, "
+                "next_run_at REAL NOT NULL, lease_until REAL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_run_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind: str, payload: Dict, max_depth: int) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            depth = self._depth(conn)
+            if depth >= max_depth:
+                raise QueueFull(depth)
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at, next_run_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def _depth(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()[0]
+
+    def depth(self) -> int:
+        return self._depth(self._connect())
+
+    def claim(self, lease: float, max_attempts: int = None) -> Optional[sqlite3.Row]:
+        """
+        Next runnable job, now leased to the caller. A job whose lease ran out
+        after its last allowed attempt is marked failed instead of handed out.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE (status = 'queued' AND next_run_at <= ?) "
+                    "OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY next_run_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if (
+                    row is None
+                    or max_attempts is None
+                    or row["status"] != "running"
+                    or row["attempts"] < max_attempts
+                ):
+                    break
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, "
+                    "lease_until = NULL WHERE id = ?",
+                    (
+                        f"Worker lease expired on attempt {row['attempts']}",
+                        now,
+                        row["id"],
+                    ),
+                )
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                    "started_at = COALESCE(started_at, ?), lease_until = ? "
+                    "WHERE id = ?",
+                    (now, now + lease, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def complete(self, job_id: str, result: Dict, run_ms: float):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, "
+                "finished_at = ?, run_ms = ?, lease_until = NULL WHERE id = ?",
+                (json.dumps(result), time.time(), run_ms, job_id),
+            )
+
+    def retry(self, job_id: str, error: str, run_at: float):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, next_run_at = ?, "
+                "lease_until = NULL WHERE id = ?",
+                (error, run_at, job_id),
+            )
+
+    def fail(self, job_id: str, error: str, run_ms: float):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, "
+                "run_ms = ?, lease_until = NULL WHERE id = ?",
+                (error, time.time(), run_ms, job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[sqlite3.Row]:
+        return (
+            self._connect()
+            .execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            .fetchone()
+        )
+
+    def purge(self, older_than: float):
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') "
+                "AND finished_at < ?",
+                (time.time() - older_than,),
+            )
+
+
+def job_to_dict(row: sqlite3.Row) -> Dict:
+    """Public view of a job, with per-job timing in milliseconds"""
+    now = time.time()
+    started, finished = row["started_at"], row["finished_at"]
+    return {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "attempts": row["attempts"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+        "timing": {
+            "queued_ms": round(((started or now) - row["created_at"]) * 1000, 1),
+            "run_ms": round(row["run_ms"], 1) if row["run_ms"] is not None else None,
+            "total_ms": round(((finished or now) - row["created_at"]) * 1000, 1),
+        },
+    }
+
+
+class JobQueue:
+    """
+    Background worker threads draining a SQLiteJobStore. Handlers are registered
+    per job kind and take the job payload; transient upstream errors (or
+    JobFailed) are retried with exponential backoff up to max_attempts.
+    """
+
+    def __init__(
+        self,
+        store: SQLiteJobStore,
+        workers: int = 2,
+        max_depth: int = 100,
+        max_attempts: int = 3,
+        backoff: float = 2.0,
+        lease: float = 300.0,
+        retention: float = 86400.0,
+    ):
+        self.store = store
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.retention = retention
+        self._handlers: Dict[str, Callable[[Dict], Dict]] = {}
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def register(self, kind: str, handler: Callable[[Dict], Dict]):
+        self._handlers[kind] = handler
+
+    def start(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for i in range(self.workers):
+                threading.Thread(
+                    target=self._run, name=f"job-worker-{i}", daemon=True
+                ).start()
+
+    def submit(self, kind: str, payload: Dict) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self.start()
+        job_id = self.store.enqueue(kind, payload, self.max_depth)
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        self.start()
+        row = self.store.get(job_id)
+        return job_to_dict(row) if row is not None else None
+
+    def _run(self):
+        last_purge = 0.0
+        while True:
+            try:
+                row = self.store.claim(self.lease, self.max_attempts)
+            except sqlite3.Error as e:
+                logger.warning("Job queue unavailable: %s", e)
+                row = None
+
+            if row is None:
+                if time.monotonic() - last_purge > 3600:
+                    last_purge = time.monotonic()
+                    try:
+                        self.store.purge(self.retention)
+                    except sqlite3.Error as e:
+                        logger.warning("Could not purge old jobs: %s", e)
+                self._wake.wait(timeout=0.5)
+                self._wake.clear()
+                continue
+
+            self._execute(row)
+
+    def _execute(self, row: sqlite3.Row):
+        job_id, kind, attempt = row["id"], row["kind"], row["attempts"] + 1
+        start = time.perf_counter()
+        try:
+            result = self._handlers[kind](json.loads(row["payload"]))
+            run_ms = (time.perf_counter() - start) * 1000
+            self.store.complete(job_id, result, run_ms)
+            logger.info(
+                "Job %s (%s) done in %.0f ms, attempt %d", job_id, kind, run_ms, attempt
+            )
+
+        except Exception as e:
+            run_ms = (time.perf_counter() - start) * 1000
+            error = f"{type(e).__name__}: {e}"
+            transient = isinstance(e, TRANSIENT_ERRORS + (JobFailed,))
+            if transient and attempt < self.max_attempts:
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+                logger.warning(
+                    "Job %s (%s) attempt %d failed, retry in %.1fs: %s",
+                    job_id,
+                    kind,
+                    attempt,
+                    delay,
+                    error,
+                )
+                self._record(self.store.retry, job_id, error, time.time() + delay)
+            else:
+                logger.error(
+                    "Job %s (%s) failed after %d attempts: %s",
+                    job_id,
+                    kind,
+                    attempt,
+                    error,
+                )
+                self._record(self.store.fail, job_id, error, run_ms)
+
+    def _record(self, update: Callable, job_id: str, *args):
+        # Losing one status write must not kill the worker thread; the job's
+        # lease runs out and it is claimed again
+        try:
+            update(job_id, *args)
+        except sqlite3.Error as e:
+            logger.error("Could not record outcome of job %s: %s", job_id, e)
+
+
+def job_queue_from_env() -> JobQueue:
+    return JobQueue(
+        SQLiteJobStore(os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3")),
+        workers=int(os.getenv("JOB_WORKERS", "2")),
+        max_depth=int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100")),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        backoff=float(os.getenv("JOB_RETRY_BACKOFF", "2.0")),
+        lease=float(os.getenv("JOB_LEASE", "300")),
+    )
+
+
+job_queue = job_queue_from_env()
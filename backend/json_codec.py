@@ -0,0 +1,112 @@
+# backend/json_codec.py
+import json
+import os
+from typing import Any
+
+from dotenv import load_dotenv
+from flask.json.provider import DefaultJSONProvider
+
+from log_config import get_logger
+
+try:
+    import orjson
+except ImportError:  # Optional dependency; the stdlib encoder is used instead
+    orjson = None
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# auto (orjson when installed), orjson or json (stdlib only)
+JSON_LIBRARY = os.getenv("JSON_LIBRARY", "auto").lower()
+
+if JSON_LIBRARY == "json":
+    _orjson = None
+else:
+    _orjson = orjson
+    if orjson is None and JSON_LIBRARY == "orjson":
+        logger.warning("JSON_LIBRARY=orjson but orjson is not installed; using json")
+
+if _orjson is not None:
+    # Datetimes go through the fallback so they serialize as Flask's always have
+    _OPTIONS = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_SERIALIZE_NUMPY
+        | orjson.OPT_PASSTHROUGH_DATETIME
+    )
+
+
+def library() -> str:
+    return "orjson" if _orjson is not None else "json"
+
+
+def dumps_bytes(
+    obj: Any, sort_keys: bool = False, indent: bool = False, default=None
+) -> bytes:
+    """
+    UTF-8 JSON. Anything orjson rejects (e.g. integers beyond 64 bits) goes
+    through the stdlib encoder, with `default` for unknown types either way.
+    """
+    if _orjson is not None:
+        options = _OPTIONS
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        try:
+            return _orjson.dumps(obj, default=default, option=options)
+        except TypeError:
+            pass
+    return json.dumps(
+        obj,
+        sort_keys=sort_keys,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+        ensure_ascii=False,
+        default=default,
+    ).encode("utf-8")
+
+
+def dumps(obj: Any, **kwargs) -> str:
+    return dumps_bytes(obj, **kwargs).decode("utf-8")
+
+
+def loads(data) -> Any:
+    """
+    Parse str or bytes; raises a ValueError on invalid JSON. With orjson,
+    integers beyond 64 bits come back as floats.
+    """
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider on dumps_bytes/loads, keeping the default provider's
+    key sorting, pretty printing in debug and fallbacks for dates, UUIDs and
+    dataclasses
+    """
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        # Options only the stdlib encoder understands
+        if set(kwargs) - {"sort_keys", "default"}:
+            return super().dumps(obj, **kwargs)
+        return dumps(
+            obj,
+            sort_keys=kwargs.get("sort_keys", self.sort_keys),
+            default=kwargs.get("default", self.default),
+        )
+
+    def loads(self, s, **kwargs) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        body = dumps_bytes(
+            obj, sort_keys=self.sort_keys, indent=pretty, default=self.default
+        )
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
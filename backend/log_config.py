@@ -0,0 +1,58 @@
+# backend/log_config.py
+import logging
+import os
+import random
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+
+_configured = False
+_lock = threading.Lock()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a `rate` fraction of records below WARNING, so per-request
+    chatter stays affordable under load; warnings and errors always pass
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+def configure_logging():
+    """
+    Root handler from LOG_LEVEL (default INFO) and LOG_SAMPLE_RATE (default 1,
+    the fraction of DEBUG/INFO records kept). Runs once per process.
+    """
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        _configured = True
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_RATE", "1.0"))))
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    # The OpenAI SDK and httpx log every request at INFO
+    for noisy in ("httpx", "httpcore", "openai"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(name)
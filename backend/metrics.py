@@ -0,0 +1,310 @@
+# backend/metrics.py
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; LLM calls routinely take tens of seconds, so the top end is wide
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    20.0,
+    30.0,
+    60.0,
+    120.0,
+)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        return lines + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count per label set, exposed as <name>_total"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}_total{_labels(self.labelnames, key)} {_number(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram per label set"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._series.items()
+            )
+        lines = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (None,), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound is None else _number(bound)
+                labels = _labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(
+                f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            )
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "broadly_request_duration_seconds",
+    "HTTP request latency until the response starts.",
+    ["method", "route", "status"],
+)
+STAGE_SECONDS = Histogram(
+    "broadly_stage_duration_seconds",
+    "Time spent in each stage of an analyze/evaluate request.",
+    ["stage", "operation"],
+)
+UPSTREAM_TTFB_SECONDS = Histogram(
+    "broadly_upstream_ttfb_seconds",
+    "Time to the first byte (blocking) or first text delta (stream) from the LLM.",
+    ["model", "mode"],
+)
+UPSTREAM_SECONDS = Histogram(
+    "broadly_upstream_duration_seconds",
+    "Total time of an LLM call, including reading the whole response.",
+    ["model", "mode"],
+)
+UPSTREAM_ERRORS = Counter(
+    "broadly_upstream_errors",
+    "LLM calls that raised, by exception type.",
+    ["model", "error"],
+)
+LLM_TOKENS = Histogram(
+    "broadly_llm_tokens",
+    "Tokens used per LLM call, as reported by the API.",
+    ["model", "depth", "kind"],
+    buckets=TOKEN_BUCKETS,
+)
+
+OUTPUT_REPAIRS = Counter(
+    "broadly_output_repairs",
+    "Model outputs fixed locally, fragments re-asked, and fragments dropped.",
+    ["action"],
+)
+
+ROUTE_EVENTS = Counter(
+    "broadly_route_events",
+    "Model routing decisions: failovers, retries and hedged calls.",
+    ["stage", "model", "event"],
+)
+
+RATE_LIMITED = Counter(
+    "broadly_rate_limited",
+    "Requests shed by admission control (client, upstream) and upstream calls "
+    "that found no free slot in time (upstream_busy).",
+    ["reason"],
+)
+
+
+def stage(name: str, operation: str):
+    """Time a block as one stage of an analyze/evaluate request"""
+    return STAGE_SECONDS.time(stage=name, operation=operation)
+
+
+class PromptCacheStats:
+    """
+    Running input token totals per model and how many of them the API served
+    from its prompt prefix cache
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_model: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, input_tokens: int, cached_tokens: int):
+        with self._lock:
+            stats = self._by_model.setdefault(
+                model,
+                {
+                    "calls": 0,
+                    "calls_with_hits": 0,
+                    "input_tokens": 0,
+                    "cached_tokens": 0,
+                },
+            )
+            stats["calls"] += 1
+            stats["calls_with_hits"] += 1 if cached_tokens else 0
+            stats["input_tokens"] += input_tokens
+            stats["cached_tokens"] += cached_tokens
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                model: dict(
+                    stats,
+                    cached_ratio=(
+                        round(stats["cached_tokens"] / stats["input_tokens"], 4)
+                        if stats["input_tokens"]
+                        else 0.0
+                    ),
+                )
+                for model, stats in self._by_model.items()
+            }
+
+
+prompt_cache_stats = PromptCacheStats()
+
+
+def record_usage(model: str, depth: str, usage):
+    """
+    Input/output token counts from a Responses API usage object, and the input
+    tokens that were prompt cache hits (kind="cached_input")
+    """
+    if usage is None:
+        return
+    depth = depth or "unknown"
+    for kind in ("input", "output"):
+        tokens = getattr(usage, f"{kind}_tokens", None)
+        if tokens is not None:
+            LLM_TOKENS.observe(tokens, model=model, depth=depth, kind=kind)
+
+    input_tokens = getattr(usage, "input_tokens", None)
+    if input_tokens is None:
+        return
+    details = getattr(usage, "input_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    LLM_TOKENS.observe(cached, model=model, depth=depth, kind="cached_input")
+    prompt_cache_stats.record(model, input_tokens, cached)
+
+
+class StreamTimer:
+    """
+    Time to first text delta, total time and token usage of one streamed call;
+    feed it every stream event, then call finish()
+    """
+
+    def __init__(self, model: str, depth: str = None):
+        self.model = model
+        self.depth = depth
+        self.start = time.perf_counter()
+        self.first_delta = None
+
+    def event(self, event):
+        if event.type == "response.output_text.delta":
+            if self.first_delta is None:
+                self.first_delta = time.perf_counter()
+                UPSTREAM_TTFB_SECONDS.observe(
+                    self.first_delta - self.start, model=self.model, mode="stream"
+                )
+        elif event.type == "response.completed":
+            response = getattr(event, "response", None)
+            record_usage(self.model, self.depth, getattr(response, "usage", None))
+
+    def finish(self):
+        UPSTREAM_SECONDS.observe(
+            time.perf_counter() - self.start, model=self.model, mode="stream"
+        )
@@ -5,6 +5,9 @@ from sqlalchemy.dialects.postgresql import JSONB
 
 db = SQLAlchemy()
 
+# JSONB on PostgreSQL, plain JSON (text) elsewhere so the schema also runs on SQLite
+JSONType = db.JSON().with_variant(JSONB(), "postgresql")
+
 
 class Decision(db.Model):
     __tablename__ = "decisions"
@@ -16,26 +19,34 @@ class Decision(db.Model):
     analysis_depth = db.Column(db.String(20))  # quick, balanced, thorough
     title = db.Column(db.String(255))
     status = db.Column(db.String(50), default="active")
+    # "metadata" is reserved on declarative models, hence the attribute name
+    meta = db.Column("metadata", JSONType)  # context_factors
+    summary = db.Column(JSONType)  # Latest recommendation / decision_insights
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
 
-    # Relationships
+    # Relationships. options / criteria / questions are plain collections rather
+    # than dynamic queries so they can be eager-loaded (see load_decision_graphs
+    # in persistence.py)
     options = db.relationship(
         "DecisionOption",
         backref="decision",
-        lazy="dynamic",
+        order_by="DecisionOption.position",
         cascade="all, delete-orphan",
     )
     criteria = db.relationship(
         "EvaluationCriteria",
         backref="decision",
-        lazy="dynamic",
+        order_by="EvaluationCriteria.id",
         cascade="all, delete-orphan",
     )
     questions = db.relationship(
-        "Question", backref="decision", lazy="dynamic", cascade="all, delete-orphan"
+        "Question",
+        backref="decision",
+        order_by="Question.position",
+        cascade="all, delete-orphan",
     )
     evaluations = db.relationship(
         "Evaluation", backref="decision", lazy="dynamic", cascade="all, delete-orphan"
@@ -95,7 +106,9 @@ class EvaluationCriteria(db.Model):
 
     # Self-referential relationship for sub-criteria
     sub_criteria = db.relationship(
-        "EvaluationCriteria", backref=db.backref("parent", remote_side=[id])
+        "EvaluationCriteria",
+        backref=db.backref("parent", remote_side=[id]),
+        order_by="EvaluationCriteria.id",
     )
     evaluations = db.relationship("Evaluation", backref="criteria", lazy="dynamic")
 
@@ -120,7 +133,7 @@ class Question(db.Model):
     question_type = db.Column(
         db.String(50)
     )  # scale, boolean, text, ranking, multiple_choice
-    # metadata = db.Column(JSONB)  # Store options, scale ranges, etc.
+    meta = db.Column("metadata", JSONType)  # Store options, scale ranges, etc.
     position = db.Column(db.Integer)
     criteria_link = db.Column(db.String(255))  # Which criteria this helps evaluate
 
@@ -134,7 +147,7 @@ class Question(db.Model):
             "id": self.id,
             "question_text": self.question_text,
             "question_type": self.question_type,
-            # "metadata": self.metadata,
+            "metadata": self.meta,
             "position": self.position,
             "criteria_link": self.criteria_link,
         }
@@ -169,10 +182,10 @@ class Evaluation(db.Model):
         db.Integer, db.ForeignKey("decision_options.id"), nullable=False
     )
     criteria_id = db.Column(db.Integer, db.ForeignKey("evaluation_criteria.id"))
-    score = db.Column(db.Float)  # 0-100
+    score = db.Column(db.Float)  # Raw 0-10 per criterion; total when criteria_id is NULL
     reasoning = db.Column(db.Text)
-    strengths = db.Column(JSONB)  # List of strengths
-    weaknesses = db.Column(JSONB)  # List of weaknesses
+    strengths = db.Column(JSONType)  # List of strengths
+    weaknesses = db.Column(JSONType)  # List of weaknesses
     confidence = db.Column(db.String(20))  # high, medium, low
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -0,0 +1,622 @@
+# backend/persistence.py
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import Select, func, insert, literal, select, update
+from sqlalchemy.orm import aliased, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from cache import ResponseCache, cache_from_env
+from incremental import score_fingerprints
+from log_config import get_logger
+from models_decision import (
+    Decision,
+    DecisionOption,
+    Evaluation,
+    EvaluationCriteria,
+    Question,
+    UserResponse,
+    db,
+)
+from json_codec import dumps, dumps_bytes, loads
+from scoring import apply_scores, extract_raw_scores, match_names
+from sensitivity import analyze_sensitivity
+
+QUESTION_METADATA = ("options", "min", "max", "minLabel", "maxLabel")
+# Guards the recursive criteria query against parent_criteria_id cycles
+MAX_CRITERIA_DEPTH = 16
+MAX_PAGE_SIZE = 100
+
+logger = get_logger(__name__)
+
+# Stamps added to a framework after generation; not part of its content
+FRAMEWORK_STAMPS = ("decision_id", "framework_hash")
+
+# Recently generated frameworks by hash and by decision id, so evaluate
+# requests can send a reference instead of the whole framework
+framework_cache = cache_from_env("FRAMEWORK_CACHE", redis_prefix="framework:")
+
+
+def framework_hash(framework: Dict) -> str:
+    """Content hash of a framework, independent of key order and stamps"""
+    content = {k: v for k, v in framework.items() if k not in FRAMEWORK_STAMPS}
+    return hashlib.sha256(dumps_bytes(content, sort_keys=True)).hexdigest()[:32]
+
+
+def _response_position(key, index: int) -> Optional[int]:
+    suffix = str(key).rsplit("_", 1)[-1]
+    return int(suffix) if suffix.isdigit() else index
+
+
+def attach_criteria_tree(decisions: List[Decision]):
+    """
+    Load the criteria hierarchy of every decision with one recursive CTE and fill
+    in Decision.criteria and EvaluationCriteria.sub_criteria, so to_dict() never
+    lazy-loads criteria
+    """
+    ids = [decision.id for decision in decisions]
+    if not ids:
+        return
+
+    tree = (
+        select(EvaluationCriteria.id, literal(0).label("depth"))
+        .where(EvaluationCriteria.decision_id.in_(ids))
+        .where(EvaluationCriteria.parent_criteria_id.is_(None))
+        .cte("criteria_tree", recursive=True)
+    )
+    child = aliased(EvaluationCriteria)
+    tree = tree.union_all(
+        select(child.id, tree.c.depth + 1)
+        .where(child.parent_criteria_id == tree.c.id)
+        .where(tree.c.depth < MAX_CRITERIA_DEPTH)
+    )
+    criteria = db.session.scalars(
+        select(EvaluationCriteria)
+        .join(tree, EvaluationCriteria.id == tree.c.id)
+        .order_by(EvaluationCriteria.id)
+    ).all()
+
+    children: Dict[int, List[EvaluationCriteria]] = {}
+    by_decision: Dict[int, List[EvaluationCriteria]] = {}
+    for criterion in criteria:
+        children.setdefault(criterion.parent_criteria_id, []).append(criterion)
+        by_decision.setdefault(criterion.decision_id, []).append(criterion)
+
+    for criterion in criteria:
+        set_committed_value(criterion, "sub_criteria", children.get(criterion.id, []))
+    for decision in decisions:
+        set_committed_value(decision, "criteria", by_decision.get(decision.id, []))
+
+
+def load_decision_graphs(statement: Select = None) -> List[Decision]:
+    """
+    The decisions selected by `statement` with options, questions and the
+    criteria hierarchy loaded: four queries in total, however many decisions
+    there are
+    """
+    statement = statement if statement is not None else select(Decision)
+    decisions = db.session.scalars(
+        statement.options(
+            selectinload(Decision.options), selectinload(Decision.questions)
+        )
+    ).all()
+    attach_criteria_tree(decisions)
+    return decisions
+
+
+class DecisionStore:
+    """
+    Persists frameworks and evaluations through the models_decision schema.
+
+    Only the decisions row is written on the request thread (its id goes back to
+    the client). Options, criteria, questions, responses and evaluations are
+    written afterwards by a single background writer, one bulk INSERT per table,
+    so writes for a decision land in order without holding up the response.
+    """
+
+    def __init__(self, app=None, frameworks: ResponseCache = None):
+        self.app = None
+        self.frameworks = frameworks if frameworks is not None else framework_cache
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    @property
+    def enabled(self) -> bool:
+        return self.app is not None
+
+    def _submit(self, fn, *args) -> Future:
+        # One writer per process: the executor's thread does not survive a fork
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="decision-writer"
+                )
+                self._pid = os.getpid()
+            executor = self._executor
+        return executor.submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        with self.app.app_context():
+            try:
+                fn(*args)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("Error persisting decision: %s", e)
+
+    def flush(self, timeout: float = None):
+        """Block until every queued write has been committed"""
+        if self.enabled:
+            self._submit(lambda: None).result(timeout)
+
+    def save_framework(self, framework: Dict, session_id: str = None) -> Optional[int]:
+        """
+        Insert the decisions row and queue the rest of the framework. Returns the
+        decision id, or None when persistence is disabled or fails.
+        """
+        if not self.enabled or not framework:
+            return None
+
+        with self.app.app_context():
+            try:
+                decision_id = db.session.scalar(
+                    insert(Decision)
+                    .values(
+                        user_session_id=session_id,
+                        scenario_text=framework.get("scenario_text", ""),
+                        decision_type=framework.get("decision_type"),
+                        analysis_depth=framework.get("depth"),
+                        title=framework.get("title"),
+                        meta={"context_factors": framework.get("context_factors", [])},
+                    )
+                    .returning(Decision.id)
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.exception("Error saving decision: %s", e)
+                return None
+
+        self._submit(self._write_framework, decision_id, framework)
+        return decision_id
+
+    def save_evaluation(
+        self, decision_id: int, framework: Dict, responses: Dict, evaluation: Dict
+    ):
+        if self.enabled and decision_id and evaluation:
+            self._submit(
+                self._write_evaluation, decision_id, framework, responses, evaluation
+            )
+
+    def record_framework(self, framework: Dict, session_id: str = None) -> Dict:
+        """
+        Persist a generated framework and stamp it with its decision id and
+        content hash; either can later stand in for it (see resolve_framework)
+        """
+        if not framework:
+            return framework
+        digest = framework_hash(framework)
+        decision_id = self.save_framework(framework, session_id)
+        if decision_id:
+            framework["decision_id"] = decision_id
+        framework["framework_hash"] = digest
+        self.remember_framework(framework, session_id)
+        return framework
+
+    def remember_framework(self, framework: Dict, session_id: str = None):
+        if not self.frameworks.enabled:
+            return
+        digest = framework.get("framework_hash") or framework_hash(framework)
+        value = dumps(dict(framework, framework_hash=digest))
+        self.frameworks.set(f"hash:{digest}", value)
+        # Ids are sequential, so they only name a framework for its own session
+        if framework.get("decision_id") and session_id:
+            self.frameworks.set(f"id:{session_id}:{framework['decision_id']}", value)
+
+    def load_framework(
+        self, decision_id: int = None, digest: str = None, session_id: str = None
+    ) -> Optional[Dict]:
+        """
+        A framework by content hash, or by decision id for the session that
+        created it. Hashes are only known to the framework cache; ids fall back
+        to the database.
+        """
+        if not digest and not session_id:
+            return None
+        key = f"hash:{digest}" if digest else f"id:{session_id}:{decision_id}"
+        cached = self.frameworks.get(key)
+        if cached is not None:
+            return loads(cached)
+        if digest or not decision_id or not self.enabled:
+            return None
+
+        with self.app.app_context():
+            decision = self._owned_decision(decision_id, session_id)
+            if decision is None:
+                return None
+            framework = self._load_framework(decision)
+        framework["framework_hash"] = framework_hash(framework)
+        self.remember_framework(framework, session_id)
+        return framework
+
+    def resolve_framework(self, data: Dict, session_id: str = None) -> Optional[Dict]:
+        """
+        The framework an evaluate request refers to: the full "framework" when
+        sent, else the one named by "framework_hash", or by "framework_id" when
+        it belongs to session_id. None when a reference matches nothing, so the
+        client can resend the framework.
+        """
+        framework = data.get("framework")
+        if framework:
+            return framework
+        digest = data.get("framework_hash")
+        decision_id = data.get("framework_id")
+        if not digest and not decision_id:
+            return {}
+        try:
+            decision_id = int(decision_id) if decision_id else None
+        except (TypeError, ValueError):
+            return None
+        return self.load_framework(
+            decision_id, str(digest) if digest else None, session_id
+        )
+
+    def record_evaluation(
+        self, framework: Dict, responses: Dict, evaluation: Dict, session_id: str = None
+    ) -> Dict:
+        """
+        Persist an evaluation under the framework's decision id and stamp it with
+        that id. Frameworks from before persistence was enabled, or stamped with
+        another session's decision id, are saved as a new decision first.
+        """
+        if not evaluation:
+            return evaluation
+        decision_id = framework.get("decision_id")
+        # The id comes from the request: only the session that created the
+        # decision may add to it, anyone else gets a decision of their own
+        if not self.owns_decision(decision_id, session_id):
+            decision_id = self.save_framework(framework, session_id)
+        self.save_evaluation(decision_id, framework, responses, evaluation)
+        if decision_id:
+            evaluation["decision_id"] = decision_id
+        return evaluation
+
+    def _write_framework(self, decision_id: int, framework: Dict):
+        options = [
+            {
+                "decision_id": decision_id,
+                "name": option["name"],
+                "description": option.get("description"),
+                "ai_inferred": bool(option.get("inferred")),
+                "position": i,
+            }
+            for i, option in enumerate(framework.get("options", []))
+            if option.get("name")
+        ]
+        criteria = [
+            {
+                "decision_id": decision_id,
+                "name": criterion["name"],
+                "description": criterion.get("description"),
+                "weight": criterion.get("weight"),
+                "category": criterion.get("category"),
+            }
+            for criterion in framework.get("criteria", [])
+            if criterion.get("name")
+        ]
+        questions = [
+            {
+                "decision_id": decision_id,
+                "question_text": question.get("text", ""),
+                "question_type": question.get("type"),
+                "criteria_link": question.get("criteria_link"),
+                "position": i,
+                "metadata": {
+                    k: question[k] for k in QUESTION_METADATA if k in question
+                },
+            }
+            for i, question in enumerate(framework.get("questions", []))
+        ]
+
+        for model, rows in (
+            (DecisionOption, options),
+            (EvaluationCriteria, criteria),
+            (Question, questions),
+        ):
+            if rows:
+                db.session.execute(insert(model.__table__), rows)
+
+    def _write_evaluation(
+        self, decision_id: int, framework: Dict, responses: Dict, evaluation: Dict
+    ):
+        option_ids = dict(
+            db.session.execute(
+                select(DecisionOption.name, DecisionOption.id).where(
+                    DecisionOption.decision_id == decision_id
+                )
+            ).all()
+        )
+        criteria_ids = dict(
+            db.session.execute(
+                select(EvaluationCriteria.name, EvaluationCriteria.id).where(
+                    EvaluationCriteria.decision_id == decision_id
+                )
+            ).all()
+        )
+        question_ids = dict(
+            db.session.execute(
+                select(Question.position, Question.id).where(
+                    Question.decision_id == decision_id
+                )
+            ).all()
+        )
+        # Rows of one evaluation share a timestamp, which is how reads find the
+        # latest one
+        now = datetime.utcnow()
+
+        answers = (
+            enumerate(a.get("response") for a in responses["answers"])
+            if isinstance(responses.get("answers"), list)
+            else (
+                (_response_position(k, i), v)
+                for i, (k, v) in enumerate(responses.items())
+            )
+        )
+        response_rows = [
+            {
+                "question_id": question_ids[position],
+                "response_value": json.dumps(value),
+                "created_at": now,
+            }
+            for position, value in answers
+            if position in question_ids
+        ]
+
+        option_scores = evaluation.get("option_scores") or {}
+        raw_scores = extract_raw_scores(option_scores)
+        evaluation_rows = []
+        for key, name in match_names(list(option_ids), option_scores).items():
+            entry = option_scores[key]
+            evaluation_rows.append(
+                {
+                    "decision_id": decision_id,
+                    "option_id": option_ids[name],
+                    "criteria_id": None,
+                    "score": entry.get("total_score"),
+                    "reasoning": entry.get("rationale"),
+                    "strengths": entry.get("strengths", []),
+                    "weaknesses": entry.get("weaknesses", []),
+                    "confidence": entry.get("confidence"),
+                    "created_at": now,
+                }
+            )
+            scores = raw_scores.get(key, {})
+            for crit_key, crit_name in match_names(list(criteria_ids), scores).items():
+                evaluation_rows.append(
+                    {
+                        "decision_id": decision_id,
+                        "option_id": option_ids[name],
+                        "criteria_id": criteria_ids[crit_name],
+                        "score": scores[crit_key],
+                        "reasoning": None,
+                        "strengths": None,
+                        "weaknesses": None,
+                        "confidence": None,
+                        "created_at": now,
+                    }
+                )
+
+        for model, rows in (
+            (UserResponse, response_rows),
+            (Evaluation, evaluation_rows),
+        ):
+            if rows:
+                db.session.execute(insert(model.__table__), rows)
+
+        db.session.execute(
+            update(Decision)
+            .where(Decision.id == decision_id)
+            .values(
+                summary={
+                    "recommendation": evaluation.get("recommendation", {}),
+                    "decision_insights": evaluation.get("decision_insights", {}),
+                    "model_used": evaluation.get("model_used"),
+                },
+                updated_at=now,
+            )
+        )
+
+    def _owned_decision(
+        self, decision_id: int, session_id: str, graph: bool = True
+    ) -> Optional[Decision]:
+        """
+        The decision if it was created by session_id (app context), with its
+        graph loaded unless graph=False
+        """
+        if not session_id:
+            return None
+        statement = select(Decision).where(
+            Decision.id == decision_id, Decision.user_session_id == session_id
+        )
+        if not graph:
+            return db.session.scalars(statement).first()
+        decisions = load_decision_graphs(statement)
+        return decisions[0] if decisions else None
+
+    def owns_decision(self, decision_id, session_id: str) -> bool:
+        """Whether decision_id (as sent by a client) was created by session_id"""
+        if not self.enabled or not decision_id or not session_id:
+            return False
+        try:
+            decision_id = int(decision_id)
+        except (TypeError, ValueError):
+            return False
+        with self.app.app_context():
+            decision = self._owned_decision(decision_id, session_id, graph=False)
+        return decision is not None
+
+    def load_decision(self, decision_id: int, session_id: str) -> Optional[Dict]:
+        """
+        A stored decision of session_id in the shape the API returns: the
+        framework, the latest responses and the latest evaluation, re-scored
+        locally from raw scores. None for another session's decision.
+        """
+        if not self.enabled:
+            return None
+
+        with self.app.app_context():
+            decision = self._owned_decision(decision_id, session_id)
+            if decision is None:
+                return None
+
+            framework = self._load_framework(decision)
+            responses = self._load_responses(decision_id)
+            evaluation = self._load_evaluation(decision, framework, responses)
+
+        return {
+            "decision_id": decision.id,
+            "status": decision.status,
+            "created_at": (
+                decision.created_at.isoformat() if decision.created_at else None
+            ),
+            "framework": framework,
+            "responses": responses,
+            "evaluation": evaluation,
+        }
+
+    def _load_framework(self, decision: Decision) -> Dict:
+        return {
+            "decision_id": decision.id,
+            "decision_type": decision.decision_type,
+            "title": decision.title,
+            "options": [
+                {
+                    "name": o.name,
+                    "description": o.description,
+                    "inferred": bool(o.ai_inferred),
+                }
+                for o in decision.options
+            ],
+            "criteria": [
+                {
+                    "name": c.name,
+                    "description": c.description,
+                    "weight": c.weight,
+                    "category": c.category,
+                }
+                for c in decision.criteria
+            ],
+            "questions": [
+                dict(
+                    {
+                        "text": q.question_text,
+                        "type": q.question_type,
+                        "criteria_link": q.criteria_link,
+                    },
+                    **(q.meta or {}),
+                )
+                for q in decision.questions
+            ],
+            "context_factors": (decision.meta or {}).get("context_factors", []),
+            "depth": decision.analysis_depth,
+            "scenario_text": decision.scenario_text,
+        }
+
+    def list_decisions(
+        self, session_id: str, page: int = 1, per_page: int = 20
+    ) -> Optional[Dict]:
+        """A page of a session's decisions, newest first, serialized with to_dict"""
+        if not self.enabled:
+            return None
+
+        page = max(1, page)
+        per_page = min(max(1, per_page), MAX_PAGE_SIZE)
+        with self.app.app_context():
+            decisions = load_decision_graphs(
+                select(Decision)
+                .where(Decision.user_session_id == session_id)
+                .order_by(Decision.created_at.desc(), Decision.id.desc())
+                .limit(per_page)
+                .offset((page - 1) * per_page)
+            )
+            return {
+                "decisions": [decision.to_dict() for decision in decisions],
+                "page": page,
+                "per_page": per_page,
+            }
+
+    def _load_responses(self, decision_id: int) -> Dict:
+        latest = (
+            select(func.max(UserResponse.created_at))
+            .select_from(UserResponse)
+            .join(Question, UserResponse.question_id == Question.id)
+            .where(Question.decision_id == decision_id)
+            .scalar_subquery()
+        )
+        rows = db.session.execute(
+            select(Question.position, UserResponse.response_value)
+            .join(Question, UserResponse.question_id == Question.id)
+            .where(Question.decision_id == decision_id)
+            .where(UserResponse.created_at == latest)
+            .order_by(Question.position)
+        ).all()
+        return {f"q_{position}": json.loads(value) for position, value in rows}
+
+    def _load_evaluation(
+        self, decision: Decision, framework: Dict, responses: Dict
+    ) -> Optional[Dict]:
+        latest = (
+            select(func.max(Evaluation.created_at))
+            .where(Evaluation.decision_id == decision.id)
+            .scalar_subquery()
+        )
+        rows = db.session.execute(
+            select(Evaluation, DecisionOption.name, EvaluationCriteria.name)
+            .join(DecisionOption, Evaluation.option_id == DecisionOption.id)
+            .outerjoin(
+                EvaluationCriteria, Evaluation.criteria_id == EvaluationCriteria.id
+            )
+            .where(Evaluation.decision_id == decision.id)
+            .where(Evaluation.created_at == latest)
+        ).all()
+        if not rows:
+            return None
+
+        option_scores: Dict[str, Dict] = {}
+        for row, option, criterion in rows:
+            entry = option_scores.setdefault(option, {"scores": {}})
+            if criterion is None:
+                entry.update(
+                    rationale=row.reasoning,
+                    strengths=row.strengths or [],
+                    weaknesses=row.weaknesses or [],
+                    confidence=row.confidence,
+                )
+            else:
+                entry["scores"][criterion] = row.score
+
+        summary = decision.summary or {}
+        evaluation = {
+            "option_scores": option_scores,
+            "recommendation": dict(summary.get("recommendation") or {}),
+            "decision_insights": summary.get("decision_insights") or {},
+        }
+        evaluation = apply_scores(evaluation, framework)
+        evaluation["sensitivity_analysis"] = analyze_sensitivity(evaluation, framework)
+        evaluation["score_fingerprints"] = score_fingerprints(framework, responses)
+        evaluation["model_used"] = summary.get("model_used")
+        return evaluation
+
+
+decision_store = DecisionStore()
@@ -0,0 +1,180 @@
+# backend/prompt_compaction.py
+import json
+import math
+import threading
+from typing import Dict, List
+
+from incremental import answers_by_criterion
+from scoring import framework_axes
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # Optional dependency; fall back to an estimate
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count with tiktoken when installed, otherwise the usual ~4 chars/token
+    estimate
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def compact_framework(framework: Dict) -> Dict:
+    """
+    Project a framework down to what scoring needs: option names/descriptions and
+    criterion names/descriptions/weights. Questions, the echoed scenario_text and
+    UI metadata (min/max/labels, context_factors) are dropped.
+    """
+    options, criteria, weights = framework_axes(framework)
+    described = {c.get("name"): c for c in framework.get("criteria", [])}
+
+    compact = {"title": framework.get("title", "")}
+    compact["options"] = []
+    for option in framework.get("options", []):
+        if not option.get("name"):
+            continue
+        entry = {"name": option["name"], "description": option.get("description", "")}
+        if option.get("inferred"):
+            entry["inferred"] = True
+        compact["options"].append(entry)
+
+    compact["criteria"] = [
+        {
+            "name": name,
+            "description": described.get(name, {}).get("description", ""),
+            "weight": round(float(weight), 3),
+        }
+        for name, weight in zip(criteria, weights)
+    ]
+    return compact
+
+
+def _compact_response(answer: Dict):
+    value = answer.get("response")
+    if answer.get("type") == "rank":
+        if isinstance(value, dict):
+            value = [
+                value[k]
+                for k in sorted(value, key=lambda k: int(k) if str(k).isdigit() else k)
+            ]
+        if isinstance(value, list):
+            return " > ".join(str(v) for v in value)
+    if answer.get("type") == "scale" and answer.get("max") not in (None, ""):
+        return f"{value}/{answer['max']}"
+    return value
+
+
+def compact_answers(answers: List[Dict]) -> List[Dict]:
+    """
+    Question/answer pairs with the bookkeeping fields stripped
+    """
+    return [
+        {"q": answer.get("question", ""), "a": _compact_response(answer)}
+        for answer in answers
+    ]
+
+
+def compact_responses(framework: Dict, responses: Dict) -> Dict[str, List]:
+    """
+    Group answers under the criterion they inform, so criteria_link is not
+    repeated per answer. Answers linked to several criteria are listed once,
+    under their first criterion, with "also" naming the rest; unlinked answers
+    go under "general". Rank answers are self-describing, so their question
+    text is dropped.
+    """
+    _, criteria, _ = framework_axes(framework)
+    grouped = answers_by_criterion(framework, responses)
+
+    placed = {}
+    for name in criteria:
+        for answer in grouped[name]:
+            key = id(answer)
+            if key in placed:
+                placed[key]["criteria"].append(name)
+            else:
+                placed[key] = {"answer": answer, "criteria": [name]}
+
+    compact: Dict[str, List] = {}
+    for item in placed.values():
+        answer, linked = item["answer"], item["criteria"]
+        entry = {}
+        if answer.get("type") != "rank":
+            entry["q"] = answer.get("question", "")
+        entry["a"] = _compact_response(answer)
+        if len(linked) == len(criteria) and len(criteria) > 1:
+            compact.setdefault("general", []).append(entry)
+            continue
+        if len(linked) > 1:
+            entry["also"] = linked[1:]
+        compact.setdefault(linked[0], []).append(entry)
+    return compact
+
+
+class CompactionStats:
+    """
+    Running prompt token totals before/after compaction, per analysis depth
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_depth: Dict[str, Dict[str, int]] = {}
+
+    def record(self, depth: str, before: int, after: int):
+        with self._lock:
+            stats = self._by_depth.setdefault(
+                depth, {"requests": 0, "tokens_before": 0, "tokens_after": 0}
+            )
+            stats["requests"] += 1
+            stats["tokens_before"] += before
+            stats["tokens_after"] += after
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            result = {}
+            for depth, stats in self._by_depth.items():
+                saved = stats["tokens_before"] - stats["tokens_after"]
+                result[depth] = dict(
+                    stats,
+                    tokens_saved=saved,
+                    saved_ratio=(
+                        round(saved / stats["tokens_before"], 4)
+                        if stats["tokens_before"]
+                        else 0.0
+                    ),
+                )
+            return result
+
+
+compaction_stats = CompactionStats()
+
+
+def compact_evaluation_payload(framework: Dict, responses: Dict) -> Dict:
+    """
+    Compact framework and response serializations for the evaluation prompt, plus
+    token counts against the previous pretty-printed full dumps
+    """
+    framework_text = compact_json(compact_framework(framework))
+    responses_text = compact_json(compact_responses(framework, responses))
+
+    before = count_tokens(json.dumps(framework, indent=2)) + count_tokens(
+        json.dumps(responses, indent=2)
+    )
+    after = count_tokens(framework_text) + count_tokens(responses_text)
+    depth = framework.get("depth", "balanced")
+    compaction_stats.record(depth, before, after)
+
+    return {
+        "framework": framework_text,
+        "responses": responses_text,
+        "stats": {"depth": depth, "tokens_before": before, "tokens_after": after},
+    }
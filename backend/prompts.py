@@ -0,0 +1,343 @@
+# backend/prompts.py
+import hashlib
+import string
+import textwrap
+from typing import Dict
+
+from prompt_compaction import count_tokens
+
+# Providers reuse a cached prompt prefix only from this many tokens on
+# (OpenAI: 1024, matched in 128-token steps)
+MIN_CACHEABLE_TOKENS = 1024
+
+DEPTH_CONFIGS = {
+    "quick": {
+        "time": "30 seconds",
+        "questions": "1–3",
+        "criteria": "2–5",
+        "description": "Just the essentials; focus on surface-level distinctions",
+    },
+    "balanced": {
+        "time": "3 minutes",
+        "questions": "4–7",
+        "criteria": "6–9",
+        "description": "Well-rounded view across major considerations",
+    },
+    "thorough": {
+        "time": "10 minutes",
+        "questions": "8–14",
+        "criteria": "10–14",
+        "description": "Comprehensive breakdown with thoughtful depth",
+    },
+}
+
+
+def depth_config(depth: str) -> Dict[str, str]:
+    return DEPTH_CONFIGS.get(depth, DEPTH_CONFIGS["balanced"])
+
+
+def normalize_depth(depth) -> str:
+    """
+    The depth a request asked for if it is one of DEPTH_CONFIGS, else balanced.
+    Applied where requests come in, since depth labels metrics and keys caches.
+    """
+    return depth if isinstance(depth, str) and depth in DEPTH_CONFIGS else "balanced"
+
+
+def _clean(text: str) -> str:
+    return textwrap.dedent(text).strip()
+
+
+class PromptTemplate:
+    """
+    A prompt split into a static body and a dynamic tail. The body (with the
+    instructions sent ahead of it) is identical for every call, so it forms the
+    prompt prefix upstream prompt caching can reuse; only the tail is formatted
+    per call. The fingerprint changes whenever any of the text does.
+    """
+
+    def __init__(
+        self, name: str, version: int, instructions: str, static: str, dynamic: str
+    ):
+        self.name = name
+        self.version = version
+        self.instructions = _clean(instructions)
+        self.static = _clean(static)
+        self.dynamic = _clean(dynamic)
+        self.fields = sorted(
+            {
+                field
+                for _, field, _, _ in string.Formatter().parse(self.dynamic)
+                if field
+            }
+        )
+        digest = hashlib.sha256()
+        for part in (name, str(version), self.instructions, self.static, self.dynamic):
+            digest.update(part.encode("utf-8") + b"\x00")
+        self.fingerprint = digest.hexdigest()[:16]
+        self.prefix_tokens = count_tokens(self.instructions) + count_tokens(self.static)
+
+    def render(self, **values) -> str:
+        # Values are substituted as-is; braces inside them are not re-parsed
+        return f"{self.static}\n\n{self.dynamic.format(**values)}"
+
+    def describe(self) -> Dict:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "fields": self.fields,
+            "prefix_tokens": self.prefix_tokens,
+        }
+
+
+_RESPONSES_FORMAT = """
+    USER RESPONSES are grouped by criterion: "q" = question, "a" = answer, scale answers are value/max,
+    rank answers are ordered most to least important, "also" lists other criteria an answer informs,
+    "general" answers apply to every criterion.
+"""
+
+_OPTION_SCORE_STRUCTURE = """
+        "Option Name": {
+        "scores": {"Criterion Name": float (0 to 10)},
+        "rationale": "One sentence linking the scores to the user's responses",
+        "strengths": ["Specific strength aligned with user's stated values"],
+        "weaknesses": ["Specific weakness based on user's constraints"],
+        "confidence": "high" | "medium" | "low"
+        }
+"""
+
+ANALYSIS = PromptTemplate(
+    "analysis",
+    1,
+    instructions="You are an expert decision analyst who builds structured, personalized frameworks to navigate complex choices.",
+    static="""
+    You are a decision analyst helping someone think through a complex decision. Your goal is to understand THEIR context, values, and constraints—not to evaluate the options for them.
+
+    Analyze the user scenario given at the end and create a decision framework following these principles:
+
+    1. IDENTIFY OPTIONS: Extract explicitly stated options and infer logical alternatives the user may not have considered.
+
+    2. DEFINE CRITERIA: Create evaluation dimensions based on what typically matters in this type of decision.
+
+    3. DESIGN QUESTIONS: Create questions that reveal the USER'S context and preferences, NOT questions that evaluate the options directly.
+
+    CRITICAL QUESTION GUIDELINES:
+    - Ask about the user's values, constraints, and priorities
+    - Never ask users to rank or rate the specific options
+    - Never ask questions the AI can answer (e.g., "which city is more expensive?")
+    - Focus on uncovering what matters TO THEM
+
+    GOOD QUESTIONS:
+    ✓ "How important is financial stability to you right now?" (reveals risk tolerance)
+    ✓ "What does work-life balance mean to you?" (reveals lifestyle priorities)
+    ✓ "How comfortable are you with major life changes?" (reveals change tolerance)
+
+    BAD QUESTIONS:
+    ✗ "Rank these cities by affordability" (AI already knows this)
+    ✗ "Which option seems more appealing?" (too direct/leading)
+    ✗ "Rate Option A on a scale of 1-10" (evaluates option, not user context)
+
+    QUESTION TYPES:
+    - scale: Use for measuring importance/comfort levels (always include min, max, minLabel, maxLabel)
+    - mcq: Multiple choice. Use for yes/no preferences or more nuanced options
+    - rank: Use ONLY for ranking abstract priorities (never the actual options)
+    - text: Use for context the AI cannot infer
+
+    You may use mcq for yes/no questions, but avoid binary questions that don't reveal user context.
+    Include at least 2 non-scale questions.
+
+    Respond with valid JSON only:
+    {
+        "decision_type": "{decision_type}",
+        "title": "{concise_title}",
+        "options": [
+        {"name": "", "description": "", "inferred": boolean}
+        ],
+        "criteria": [
+        {
+            "name": "",
+            "description": "",
+            "weight": float,  // Each weight must be between 0 and 1 and all weights must sum to exactly 1.0
+            "category": "financial|practical|emotional|strategic"
+        }
+        ],
+        "questions": [
+        {
+            "text": "",
+            "type": "scale|rank|mcq|text",
+            "criteria_link": "",
+            "options": [], // For rank type and mcq: abstract priorities, not the decision options
+            "min": , // For scale only
+            "max": , // For scale only
+            "minLabel": "", // For scale only
+            "maxLabel": "", // For scale only
+        }
+        ],
+        "context_factors": []
+    }
+
+    Output must be valid JSON only. Do not include markdown or explanations.
+    """,
+    dynamic="""
+    Analysis Depth: {depth} ({description})
+    Target Questions: exactly {questions}
+
+    User Scenario: "{scenario}"
+    """,
+)
+
+EVALUATION = PromptTemplate(
+    "evaluation",
+    1,
+    instructions="You are an expert decision analyst tasked with evaluating options using a structured framework. Your analysis should be thorough, nuanced, and actionable.",
+    static="""
+    EVALUATION INSTRUCTIONS:
+    Evaluate ALL options (both explicit and AI-inferred) in the DECISION FRAMEWORK given at the end, using the user's stated values, constraints, and priorities.
+    """
+    + _RESPONSES_FORMAT
+    + """
+    SCORING METHOD (STRICT):
+    For each option, assign every criterion a raw score from 0 to 10 based on how well the option aligns with the user's values.
+    Report raw scores only. Do NOT apply weights, compute totals or rank options: weighted scores,
+    total scores and the ranking are computed exactly from your raw scores after you respond.
+
+    SCORING GUIDANCE:
+    - Use user's responses to justify each score
+    - Do not use generic assumptions — base everything on user's expressed preferences
+    - Use the exact option and criterion names from the framework
+
+    ANALYSIS REQUIREMENTS:
+    - Justify scores with clear links to user input (e.g., “scores high on flexibility, which you rated as very important”)
+    - Highlight tradeoffs and tensions between values
+    - Identify strengths and weaknesses *specific to the user*, not general platitudes
+    - Set confidence level as "high", "medium", or "low" depending on clarity and specificity of user input
+    - Flag any options you inferred that were not user-provided
+
+    OUTPUT: Valid **pure JSON** (no markdown or extra explanations), matching this structure:
+
+    {
+    "option_scores": {"""
+    + _OPTION_SCORE_STRUCTURE.rstrip()
+    + """,
+        ...
+    },
+    "recommendation": {
+        "reasoning": "Why the option with the highest weighted score best fits the user's values and context (2-3 sentences)",
+        "alternatives": ["Option B if user's priority X increases", "Option C if concern Y becomes more relevant"],
+        "red_flags": ["Risk due to concern about X", "Potential mismatch with user's constraint Y"]
+    },
+    "decision_insights": {
+        "key_tradeoff": "Primary tension the user must resolve (e.g., growth vs stability)",
+        "surprise_finding": "Non-obvious insight from user's values"
+    }
+    }
+    """,
+    dynamic="""
+    DECISION FRAMEWORK:
+    {framework}
+
+    USER RESPONSES:
+    {responses}
+    """,
+)
+
+# The options to score come last, so every fan-out call of one evaluation
+# shares the prefix up to and including the responses
+OPTION_SCORES = PromptTemplate(
+    "option_scores",
+    1,
+    instructions=EVALUATION.instructions,
+    static="""
+    Score the OPTIONS TO SCORE given at the end against the DECISION FRAMEWORK. The remaining
+    options in the framework are scored separately; use them only as a reference point.
+    """
+    + _RESPONSES_FORMAT
+    + """
+    For each option to score, assign every criterion a raw score from 0 to 10 based on how well the
+    option aligns with the user's values. Do not weight or total the scores. Justify scores with the
+    user's responses, not generic assumptions. Set confidence to "high", "medium" or "low" depending on
+    how clear the user's input is. Use the exact option and criterion names from the framework.
+
+    OUTPUT: Valid **pure JSON** (no markdown or extra explanations):
+    {
+    "option_scores": {"""
+    + _OPTION_SCORE_STRUCTURE
+    + """    }
+    }
+    """,
+    dynamic="""
+    DECISION FRAMEWORK:
+    {framework}
+
+    USER RESPONSES:
+    {responses}
+
+    OPTIONS TO SCORE: {options}
+    """,
+)
+
+RESCORE = PromptTemplate(
+    "rescore",
+    1,
+    instructions=EVALUATION.instructions,
+    static="""
+    The user changed some answers. For every option given at the end, assign each of the CRITERIA TO
+    RE-SCORE a raw score from 0 to 10 based on how well the option aligns with the user's values.
+    Do not weight or total the scores. Use the exact option and criterion names given.
+
+    OUTPUT: Valid **pure JSON** (no markdown or extra explanations):
+    {
+    "option_scores": {
+        "Option Name": {
+        "scores": {"Criterion Name": float (0 to 10)},
+        "rationale": "One sentence linking the new scores to the user's responses"
+        }
+    }
+    }
+    """,
+    dynamic="""
+    DECISION: {title}
+    SCENARIO: {scenario}
+    OPTIONS: {options}
+
+    CRITERIA TO RE-SCORE:
+    {criteria}
+
+    UPDATED USER RESPONSES FOR THESE CRITERIA:
+    {responses}
+    """,
+)
+
+FRAGMENT_REPAIR = PromptTemplate(
+    "fragment_repair",
+    1,
+    instructions="You correct parts of JSON documents so they match a schema, keeping their content wherever it is already valid.",
+    static="""
+    Part of a JSON document you produced is invalid. Correct only that part: keep the current content
+    wherever it is valid and change only what the problems require.
+    OUTPUT: Valid **pure JSON** (no markdown or extra explanations): {"value": <corrected field>}
+    """,
+    dynamic="""
+    CONTEXT: {context}
+    FIELD: {field}
+    CURRENT VALUE: {value}
+    PROBLEMS:
+    {problems}
+    FIELD SCHEMA: {schema}
+    """,
+)
+
+# Built once at import; names are stable, versions bump with the text
+PROMPTS: Dict[str, PromptTemplate] = {
+    template.name: template
+    for template in (ANALYSIS, EVALUATION, OPTION_SCORES, RESCORE, FRAGMENT_REPAIR)
+}
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    return PROMPTS[name]
+
+
+def prompt_registry() -> Dict[str, Dict]:
+    """Version, fingerprint and static prefix size of every template"""
+    return {name: template.describe() for name, template in PROMPTS.items()}
@@ -0,0 +1,652 @@
+# backend/rate_limit.py
+"""
+Admission control for the LLM-bound routes:
+
+- a token bucket per client address charged with the expected
+  token cost of the request's stage and depth, so one client cannot use up the
+  upstream rate limits for everyone;
+- a cap on concurrent upstream calls, per process or shared by every worker;
+- adaptive throttling: an upstream 429 halves the upstream concurrency, and
+  requests for a model cooling down after one are shed until its Retry-After
+  has passed. Successful calls grow the concurrency back one slot at a time.
+
+Shed requests get a 429 with Retry-After.
+
+Client buckets are off unless RATE_LIMIT_BACKEND names a store. Behind a
+proxy or load balancer (the Heroku router included) every request arrives
+from the proxy's address, so also set RATE_LIMIT_TRUSTED_PROXIES to the
+proxy's addresses (10.0.0.0/8 on Heroku); otherwise all clients share one
+bucket.
+"""
+import asyncio
+import ipaddress
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from dotenv import load_dotenv
+from openai import RateLimitError
+
+from log_config import get_logger
+from metrics import RATE_LIMITED
+from prompts import ANALYSIS, EVALUATION
+from routing import ModelRouter, model_router
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the file backend is then disabled
+    fcntl = None
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Seconds between attempts to take an upstream slot
+POLL_INTERVAL = 0.02
+# Upper bound on an upstream Retry-After we honor
+MAX_COOLDOWN = 60.0
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(f"Rate limited ({reason}), retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def request_cost(stage: str, depth: str, router: ModelRouter = None) -> int:
+    """
+    Expected tokens of a request: its prompt's static prefix plus the output
+    budget of its route (deeper analyses get larger budgets)
+    """
+    route = (router or model_router).route(stage, depth)
+    template = ANALYSIS if stage == "analyze" else EVALUATION
+    return template.prefix_tokens + (route.max_output_tokens or 0)
+
+
+def parse_networks(value: str) -> List:
+    """Comma-separated addresses / CIDR ranges, e.g. "10.0.0.0/8,127.0.0.1" """
+    return [
+        ipaddress.ip_network(part.strip(), strict=False)
+        for part in (value or "").split(",")
+        if part.strip()
+    ]
+
+
+def _trusted(address: str, proxies: Sequence) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def client_key(
+    remote_addr: Optional[str], forwarded_for: str = "", trusted_proxies=()
+) -> str:
+    """
+    Bucket key: the client's address. Session ids are not used, since the
+    client picks them freely. X-Forwarded-For is only read when the peer is a
+    trusted proxy, and then from the right: the first hop that is not a trusted
+    proxy is the client, so a client cannot pick its own address.
+    """
+    address = remote_addr or "unknown"
+    if _trusted(address, trusted_proxies):
+        hops = [hop.strip() for hop in (forwarded_for or "").split(",")]
+        for hop in reversed([hop for hop in hops if hop]):
+            address = hop
+            if not _trusted(hop, trusted_proxies):
+                break
+    return "ip:" + address[:64]
+
+
+class MemoryBuckets:
+    """
+    Token buckets in this process; the least recently used are dropped beyond
+    max_keys (a dropped bucket starts over full)
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        """Take cost tokens; returns 0 if taken, else seconds until they would be"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                return (cost - tokens) / rate
+            self._buckets[key] = (tokens - cost, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0.0
+
+
+class SQLiteBuckets:
+    """
+    Token buckets shared by every worker process on the same host
+    """
+
+    def __init__(self, path: str = "rate_limit.sqlite3"):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; take() opens its own write transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        now = time.time()
+        conn = self._connect()
+        # Taken up front so concurrent workers cannot both spend the same tokens
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = capacity if row is None else row[0] + (now - row[1]) * rate
+            tokens = min(capacity, tokens)
+            wait = (cost - tokens) / rate if tokens < cost else 0.0
+            if not wait:
+                tokens -= cost
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) "
+                "VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                # Buckets refilled to capacity are the same as no row at all
+                conn.execute(
+                    "DELETE FROM rate_buckets WHERE updated < ?",
+                    (now - capacity / rate,),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+# Refill and spend in one round trip, on the server's clock
+_REDIS_TAKE = """
+local cost = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local capacity = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = capacity
+if state[1] then
+    tokens = math.min(capacity, tonumber(state[1]) + (now - tonumber(state[2])) * rate)
+end
+if tokens < cost then
+    return tostring((cost - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - cost), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return '0'
+"""
+
+
+class RedisBuckets:
+    """
+    Token buckets on any client exposing the redis-py eval() call, for workers
+    spread over several hosts
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisBuckets":
+        import redis  # Optional dependency, only needed for this backend
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def take(self, key: str, cost: float, rate: float, capacity: float) -> float:
+        wait = self.client.eval(_REDIS_TAKE, 1, self.prefix + key, cost, rate, capacity)
+        if isinstance(wait, bytes):
+            wait = wait.decode("utf-8")
+        return float(wait)
+
+
+class MemorySlots:
+    """Upstream call slots counted in this process"""
+
+    def __init__(self):
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, limit: int):
+        with self._lock:
+            if self.in_use >= limit:
+                return None
+            self.in_use += 1
+            return True
+
+    def release(self, token):
+        with self._lock:
+            self.in_use -= 1
+
+
+class FileSlots:
+    """
+    Upstream call slots shared by the workers on one host: slot i is held by
+    flock()ing its own file, so a crashed worker's slots free themselves
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), "broadly-upstream"
+        )
+        os.makedirs(self.directory, exist_ok=True)
+
+    def try_acquire(self, limit: int):
+        # From a random slot on, so workers do not all contend for slot 0
+        start = random.randrange(limit)
+        for i in range(limit):
+            path = os.path.join(self.directory, f"slot-{(start + i) % limit}.lock")
+            fd = os.open(path, os.O_CREAT | os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def release(self, token):
+        try:
+            fcntl.flock(token, fcntl.LOCK_UN)
+        finally:
+            os.close(token)
+
+
+class RedisSlots:
+    """
+    Upstream call slots on any client exposing the redis-py set(nx=, px=)/get/
+    delete subset. Each slot is a key leased for `lease` seconds, so slots of a
+    crashed worker expire.
+    """
+
+    def __init__(self, client, lease: float = 300.0, prefix: str = "upstream:"):
+        self.client = client
+        self.lease = lease
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisSlots":
+        import redis  # Optional dependency, only needed for this backend
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def try_acquire(self, limit: int):
+        token = uuid.uuid4().hex
+        start = random.randrange(limit)
+        for i in range(limit):
+            key = f"{self.prefix}{(start + i) % limit}"
+            if self.client.set(key, token, nx=True, px=int(self.lease * 1000)):
+                return key, token
+        return None
+
+    def release(self, token):
+        key, value = token
+        current = self.client.get(key)
+        if isinstance(current, bytes):
+            current = current.decode("utf-8")
+        if current == value:
+            self.client.delete(key)
+
+
+def _retry_after(error: Exception, default: float) -> float:
+    """Seconds an upstream 429 asks us to wait (retry-after-ms / retry-after)"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return min(MAX_COOLDOWN, float(headers["retry-after-ms"]) / 1000)
+        if headers.get("retry-after"):
+            return min(MAX_COOLDOWN, float(headers["retry-after"]))
+    except (TypeError, ValueError):
+        pass
+    return default
+
+
+class UpstreamLimiter:
+    """
+    Caps concurrent upstream calls at `limit`, which adapts between
+    min_concurrency and max_concurrency: halved on an upstream 429 (at most once
+    per cooldown), grown by 1/limit per successful call. A model that answered
+    429 gets no new calls until its Retry-After has passed. The adaptive state
+    is per process; with shared slots the cap itself is global.
+    """
+
+    def __init__(
+        self,
+        slots=None,
+        max_concurrency: int = 64,
+        min_concurrency: int = 1,
+        queue_timeout: float = 30.0,
+        cooldown: float = 1.0,
+    ):
+        self.slots = slots
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.cooldown = cooldown
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.throttled = 0
+        self._blocked_until: Dict[str, float] = {}
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "UpstreamLimiter":
+        """
+        UPSTREAM_SLOTS_BACKEND is memory (default, a cap per process), file
+        (shared by the workers on one host), redis or none (no cap)
+        """
+        max_concurrency = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "64"))
+        backend_name = os.getenv("UPSTREAM_SLOTS_BACKEND", "memory").lower()
+        if max_concurrency <= 0 or backend_name == "none":
+            slots = None
+        elif backend_name == "file" and fcntl is not None:
+            slots = FileSlots(os.getenv("UPSTREAM_SLOTS_DIR") or None)
+        elif backend_name == "redis":
+            slots = RedisSlots.from_url(
+                os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            )
+        else:
+            slots = MemorySlots()
+        return cls(
+            slots,
+            max_concurrency=max(1, max_concurrency),
+            min_concurrency=int(os.getenv("UPSTREAM_MIN_CONCURRENCY", "1")),
+            queue_timeout=float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "30")),
+            cooldown=float(os.getenv("UPSTREAM_COOLDOWN", "1")),
+        )
+
+    def cooldown_remaining(self, models: Iterable[str]) -> float:
+        """Seconds until any of `models` takes calls again (0 = one does now)"""
+        now = time.monotonic()
+        with self._lock:
+            return max(
+                0.0,
+                min(self._blocked_until.get(model, 0.0) - now for model in models),
+            )
+
+    def _try_acquire(self, model: str):
+        """(acquired, token); not acquired while the model cools down"""
+        if self.cooldown_remaining([model]) > 0:
+            return False, None
+        if self.slots is None:
+            return True, None
+        token = self.slots.try_acquire(max(self.min_concurrency, int(self.limit)))
+        return token is not None, token
+
+    def _timed_out(self, model: str) -> RateLimited:
+        RATE_LIMITED.inc(reason="upstream_busy")
+        return RateLimited(
+            max(self.cooldown_remaining([model]), self.cooldown), "upstream_busy"
+        )
+
+    def acquire(self, model: str):
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            acquired, token = self._try_acquire(model)
+            if acquired:
+                return token
+            if time.monotonic() >= deadline:
+                raise self._timed_out(model)
+            time.sleep(POLL_INTERVAL)
+
+    @property
+    def _slots_block(self) -> bool:
+        # File locks and Redis round-trips are I/O; the in-process counter is not
+        return self.slots is not None and not isinstance(self.slots, MemorySlots)
+
+    async def _off_loop(self, fn, *args):
+        if not self._slots_block:
+            return fn(*args)
+        # Shielded so a cancelled request still returns its slot
+        return await asyncio.shield(asyncio.to_thread(fn, *args))
+
+    async def acquire_async(self, model: str):
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            acquired, token = await self._off_loop(self._try_acquire, model)
+            if acquired:
+                return token
+            if time.monotonic() >= deadline:
+                raise self._timed_out(model)
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def _started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def _finished(self, model: str, token, error: BaseException = None):
+        if self.slots is not None:
+            self.slots.release(token)
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            if error is None:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                return
+            if not isinstance(error, RateLimitError):
+                return
+            self.throttled += 1
+            wait = _retry_after(error, self.cooldown)
+            self._blocked_until[model] = max(
+                self._blocked_until.get(model, 0.0), now + wait
+            )
+            # One 429 burst is one signal, however many calls it failed
+            if now - self._last_decrease >= max(wait, self.cooldown):
+                self._last_decrease = now
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                logger.warning(
+                    "Upstream 429 from %s: concurrency down to %d, cooling down %.1fs",
+                    model,
+                    int(self.limit),
+                    wait,
+                )
+
+    @contextmanager
+    def slot(self, model: str):
+        """Hold an upstream slot for one call to `model`"""
+        token = self.acquire(model)
+        self._started()
+        try:
+            yield
+        except BaseException as e:
+            self._finished(model, token, e)
+            raise
+        self._finished(model, token)
+
+    @asynccontextmanager
+    async def slot_async(self, model: str):
+        token = await self.acquire_async(model)
+        self._started()
+        try:
+            yield
+        except BaseException as e:
+            await self._off_loop(self._finished, model, token, e)
+            raise
+        await self._off_loop(self._finished, model, token)
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "backend": type(self.slots).__name__ if self.slots else None,
+                "limit": int(self.limit),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "upstream_429s": self.throttled,
+                "cooling_down": {
+                    model: round(until - now, 2)
+                    for model, until in self._blocked_until.items()
+                    if until > now
+                },
+            }
+
+
+class RateLimiter:
+    """
+    Per-client admission: a request is shed when every model of its route is
+    cooling down after an upstream 429, or when the client's bucket (refilled
+    at tokens_per_minute, holding up to burst) lacks its expected token cost
+    """
+
+    def __init__(
+        self,
+        buckets=None,
+        tokens_per_minute: float = 60000,
+        burst: float = None,
+        upstream: UpstreamLimiter = None,
+        router: ModelRouter = None,
+        trusted_proxies: Sequence = (),
+    ):
+        self.buckets = buckets
+        self.rate = tokens_per_minute / 60
+        self.burst = burst or tokens_per_minute
+        self.upstream = upstream if upstream is not None else upstream_limiter
+        self.router = router if router is not None else model_router
+        self.trusted_proxies = list(trusted_proxies)
+        self.admitted = 0
+        self.shed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, upstream: UpstreamLimiter = None) -> "RateLimiter":
+        """
+        RATE_LIMIT_BACKEND is none (default, no client buckets), memory (buckets
+        per process), sqlite (shared by the workers on one host) or redis.
+        Set RATE_LIMIT_TRUSTED_PROXIES too when running behind a proxy.
+        """
+        backend_name = os.getenv("RATE_LIMIT_BACKEND", "none").lower()
+        if backend_name == "memory":
+            buckets = MemoryBuckets(int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000")))
+        elif backend_name == "sqlite":
+            buckets = SQLiteBuckets(os.getenv("RATE_LIMIT_PATH", "rate_limit.sqlite3"))
+        elif backend_name == "redis":
+            buckets = RedisBuckets.from_url(
+                os.getenv("REDIS_URL", "redis://localhost:6379/0")
+            )
+        else:
+            buckets = None
+        trusted_proxies = parse_networks(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", ""))
+        if buckets is not None and not trusted_proxies:
+            logger.warning(
+                "Client rate limits are keyed on the peer address; behind a proxy "
+                "set RATE_LIMIT_TRUSTED_PROXIES or every client shares one bucket"
+            )
+        tokens_per_minute = float(os.getenv("RATE_LIMIT_TOKENS_PER_MINUTE", "60000"))
+        return cls(
+            buckets,
+            tokens_per_minute=tokens_per_minute,
+            burst=float(os.getenv("RATE_LIMIT_BURST", "0")) or None,
+            upstream=upstream,
+            trusted_proxies=trusted_proxies,
+        )
+
+    def key(self, remote_addr: Optional[str], forwarded_for: str = "") -> str:
+        return client_key(remote_addr, forwarded_for, self.trusted_proxies)
+
+    def _shed(self, retry_after: float, reason: str) -> RateLimited:
+        RATE_LIMITED.inc(reason=reason)
+        with self._lock:
+            self.shed[reason] = self.shed.get(reason, 0) + 1
+        return RateLimited(retry_after, reason)
+
+    def check(self, key: str, stage: str, depth: str):
+        """Admit one request or raise RateLimited"""
+        route = self.router.route(stage, depth)
+        # Checked first, so clients are not charged for requests shed anyway
+        wait = self.upstream.cooldown_remaining(route.models)
+        if wait > 0:
+            raise self._shed(wait, "upstream")
+
+        if self.buckets is not None:
+            # A request costing more than the burst could never be admitted
+            cost = min(request_cost(stage, depth, self.router), self.burst)
+            try:
+                wait = self.buckets.take(key, cost, self.rate, self.burst)
+            except Exception as e:
+                # Fail open: a broken limiter store must not take the API down
+                logger.warning("Rate limit check failed: %s", e)
+                wait = 0.0
+            if wait > 0:
+                raise self._shed(wait, "client")
+
+        with self._lock:
+            self.admitted += 1
+
+    def wait(self, key: str, stage: str, depth: str, timeout: float):
+        """
+        Admit one request like check(), sleeping while the client is over its
+        limit; raises RateLimited if that would take longer than timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.check(key, stage, depth)
+            except RateLimited as e:
+                if time.monotonic() + e.retry_after > deadline:
+                    raise
+                time.sleep(e.retry_after)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            clients = {
+                "backend": type(self.buckets).__name__ if self.buckets else None,
+                "tokens_per_minute": round(self.rate * 60),
+                "burst": self.burst,
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+            }
+        costs = {
+            stage: {
+                depth: request_cost(stage, depth, self.router)
+                for depth in ("quick", "balanced", "thorough")
+            }
+            for stage in ("analyze", "evaluate")
+        }
+        return {
+            "clients": clients,
+            "costs": costs,
+            "upstream": self.upstream.snapshot(),
+        }
+
+
+upstream_limiter = UpstreamLimiter.from_env()
+rate_limiter = RateLimiter.from_env(upstream_limiter)
@@ -0,0 +1,354 @@
+# backend/routing.py
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from dotenv import load_dotenv
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+from log_config import get_logger
+from metrics import ROUTE_EVENTS
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+GPT_4O_MINI = "gpt-4o-mini-2024-07-18"
+GPT_41 = "gpt-4.1-2025-04-14"
+GPT_41_MINI = "gpt-4.1-mini-2025-04-14"
+
+# stage -> depth ("*" matches any) -> route. Models are in order of preference;
+# later ones are the failover and hedge targets. slo is the p95 latency budget
+# of one call in seconds, max_output_tokens the output budget per call and
+# hedge_after the delay before a hedged call to the next model (None = off).
+DEFAULT_ROUTES = {
+    "analyze": {
+        "quick": {"models": [GPT_4O_MINI], "slo": 10.0, "max_output_tokens": 2000},
+        "balanced": {
+            "models": [GPT_41, GPT_41_MINI],
+            "slo": 30.0,
+            "max_output_tokens": 4000,
+        },
+        "thorough": {
+            "models": [GPT_41, GPT_41_MINI],
+            "slo": 45.0,
+            "max_output_tokens": 6000,
+        },
+    },
+    "evaluate": {
+        "quick": {"models": [GPT_4O_MINI], "slo": 15.0, "max_output_tokens": 3000},
+        "balanced": {
+            "models": [GPT_41, GPT_41_MINI],
+            "slo": 40.0,
+            "max_output_tokens": 6000,
+        },
+        "thorough": {
+            "models": [GPT_41, GPT_41_MINI],
+            "slo": 60.0,
+            "max_output_tokens": 10000,
+        },
+    },
+    # Re-asks of single invalid fragments (structured.py)
+    "repair": {
+        "*": {
+            "models": [GPT_41_MINI, GPT_4O_MINI],
+            "slo": 10.0,
+            "max_output_tokens": 1500,
+        },
+    },
+}
+
+# Seconds of history per model; a model failed away from is retried once its
+# slow or failed samples have aged out
+WINDOW_SECONDS = float(os.getenv("ROUTING_WINDOW_SECONDS", "300"))
+# Below this many samples in the window a model counts as healthy
+MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", "5"))
+MAX_ERROR_RATE = float(os.getenv("ROUTING_MAX_ERROR_RATE", "0.5"))
+HEDGE_WORKERS = int(os.getenv("ROUTING_HEDGE_WORKERS", "16"))
+
+# Upstream-side failures worth retrying on the route's next model; a bad
+# request would fail there too
+FAILOVER_ERRORS = (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+
+# Runs both sides of a hedged call, so the caller can wait on either
+T = TypeVar("T")
+
+hedge_executor = ThreadPoolExecutor(
+    max_workers=HEDGE_WORKERS, thread_name_prefix="llm-hedge"
+)
+
+
+def load_routes() -> Dict:
+    """
+    DEFAULT_ROUTES with MODEL_ROUTES (JSON, or the path of a JSON file) merged in
+    per stage and depth, e.g. {"evaluate": {"balanced": {"hedge_after": 8}}}
+    """
+    routes = {stage: dict(depths) for stage, depths in DEFAULT_ROUTES.items()}
+    raw = os.getenv("MODEL_ROUTES", "").strip()
+    if not raw:
+        return routes
+    if not raw.startswith("{"):
+        with open(raw, "r") as f:
+            raw = f.read()
+    for stage, depths in json.loads(raw).items():
+        stage_routes = routes.setdefault(stage, {})
+        for depth, config in depths.items():
+            stage_routes[depth] = {**stage_routes.get(depth, {}), **config}
+    return routes
+
+
+class Route:
+    """Models and budgets for one stage at one depth"""
+
+    def __init__(
+        self,
+        stage: str,
+        depth: str,
+        models: List[str],
+        slo: float = None,
+        max_output_tokens: int = None,
+        hedge_after: float = None,
+    ):
+        if not models:
+            raise ValueError(f"Route {stage}/{depth} has no models")
+        self.stage = stage
+        self.depth = depth
+        self.models = list(models)
+        self.slo = slo
+        self.max_output_tokens = max_output_tokens
+        self.hedge_after = hedge_after
+
+    def next_model(self, model: str) -> Optional[str]:
+        """The model to hedge or fail over to from `model`"""
+        later = (
+            self.models[self.models.index(model) + 1 :] if model in self.models else []
+        )
+        others = later or [m for m in self.models if m != model]
+        return others[0] if others else None
+
+
+class ModelStats:
+    """Latencies and outcomes of one model's calls within a rolling time window"""
+
+    def __init__(self, window: float = WINDOW_SECONDS):
+        self.window = window
+        self._samples = deque()  # (monotonic time, seconds, ok)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool = True):
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, seconds, ok))
+            self._trim(now)
+
+    def _trim(self, now: float):
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+    def summary(self) -> Dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            samples = list(self._samples)
+        latencies = sorted(seconds for _, seconds, ok in samples if ok)
+        errors = sum(1 for _, _, ok in samples if not ok)
+
+        def percentile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            rank = max(1, round(q / 100 * len(latencies)))
+            return round(latencies[min(rank, len(latencies)) - 1], 3)
+
+        return {
+            "calls": len(samples),
+            "errors": errors,
+            "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+            "p50": percentile(50),
+            "p95": percentile(95),
+        }
+
+
+class ModelRouter:
+    """
+    Picks the model for each call from the route table: the first model of the
+    route whose rolling p95 is within the route's SLO and whose error rate is
+    acceptable, else the fastest one. Stats are per process.
+    """
+
+    def __init__(
+        self,
+        routes: Dict = None,
+        window: float = WINDOW_SECONDS,
+        min_samples: int = MIN_SAMPLES,
+        max_error_rate: float = MAX_ERROR_RATE,
+    ):
+        self.routes = routes if routes is not None else load_routes()
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self._stats: Dict[str, ModelStats] = {}
+        # Last model chosen per (stage, depth), so changes are logged once
+        self._chosen: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def route(self, stage: str, depth: str = None) -> Route:
+        depths = self.routes.get(stage) or self.routes["evaluate"]
+        config = depths.get(depth) or depths.get("*") or depths.get("balanced")
+        if config is None:
+            raise ValueError(f"No route for {stage}/{depth}")
+        return Route(stage, depth, **config)
+
+    def stats(self, model: str) -> ModelStats:
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                stats = self._stats[model] = ModelStats(self.window)
+            return stats
+
+    def record(self, model: str, seconds: float, ok: bool = True):
+        self.stats(model).record(seconds, ok)
+
+    def healthy(self, model: str, slo: float = None) -> bool:
+        summary = self.stats(model).summary()
+        if summary["calls"] < self.min_samples:
+            return True
+        if summary["error_rate"] > self.max_error_rate:
+            return False
+        return slo is None or summary["p95"] is None or summary["p95"] <= slo
+
+    def choose(self, stage: str, depth: str = None) -> str:
+        route = self.route(stage, depth)
+        healthy = [model for model in route.models if self.healthy(model, route.slo)]
+        if healthy:
+            model = healthy[0]
+            event = "failover" if model != route.models[0] else None
+        else:
+            # Every model is over budget: take the one with the lowest p95
+            def p95(model: str) -> float:
+                value = self.stats(model).summary()["p95"]
+                return value if value is not None else 0.0
+
+            model = min(route.models, key=p95)
+            event = "all_over_budget"
+
+        with self._lock:
+            changed = self._chosen.get((stage, depth), route.models[0]) != model
+            self._chosen[(stage, depth)] = model
+        if changed:
+            logger.info(
+                "Routing %s/%s to %s (%s)", stage, depth, model, event or "recovered"
+            )
+        if event is not None:
+            ROUTE_EVENTS.inc(stage=stage, model=model, event=event)
+        return model
+
+    def event(self, route: Route, model: str, event: str):
+        logger.info("Routing %s/%s: %s -> %s", route.stage, route.depth, event, model)
+        ROUTE_EVENTS.inc(stage=route.stage, model=model, event=event)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            models = list(self._stats)
+        return {
+            "models": {model: self.stats(model).summary() for model in models},
+            "routes": self.routes,
+        }
+
+
+def hedged(
+    primary: Callable[[], T],
+    backup: Callable[[], T],
+    delay: float,
+    notify: Callable[[str], None] = None,
+) -> T:
+    """
+    Runs primary; if it has not finished `delay` seconds after it started,
+    starts backup as well and returns whichever succeeds first (backup alone if
+    primary fails early with one of FAILOVER_ERRORS). The losing call finishes
+    in the background.
+    """
+    notify = notify or (lambda event: None)
+    started = threading.Event()
+
+    def run_primary():
+        started.set()
+        return primary()
+
+    first = hedge_executor.submit(run_primary)
+    # Time spent queued behind other calls for an executor thread is not the
+    # primary being slow, so it does not count towards the delay
+    started.wait()
+    done, _ = wait([first], timeout=delay)
+    if done:
+        if not isinstance(first.exception(), FAILOVER_ERRORS):
+            return first.result()
+        notify("retry")
+        return backup()
+
+    notify("hedge_fired")
+    second = hedge_executor.submit(backup)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    notify("hedge_won")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def hedged_async(
+    primary: Callable[[], Awaitable[T]],
+    backup: Callable[[], Awaitable[T]],
+    delay: float,
+    notify: Callable[[str], None] = None,
+) -> T:
+    """asyncio counterpart of hedged(); the losing call is cancelled"""
+    notify = notify or (lambda event: None)
+    first = asyncio.ensure_future(primary())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        if not isinstance(first.exception(), FAILOVER_ERRORS):
+            return first.result()
+        notify("retry")
+        return await backup()
+
+    notify("hedge_fired")
+    second = asyncio.ensure_future(backup())
+    pending = {first, second}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        notify("hedge_won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+model_router = ModelRouter()
@@ -0,0 +1,160 @@
+# backend/scoring.py
+import difflib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Score used when the model omits a criterion for an option
+NEUTRAL_SCORE = 5.0
+
+
+def match_names(names: List[str], candidates) -> Dict[str, str]:
+    """
+    Map each candidate key onto the canonical name it refers to. The model does
+    not always echo names verbatim, so matching ignores case and whitespace and
+    falls back to a close fuzzy match.
+    """
+    lookup = {name.strip().lower(): name for name in names}
+    mapping = {}
+    unmatched = []
+    for candidate in candidates:
+        name = lookup.get(str(candidate).strip().lower())
+        if name is not None:
+            mapping[candidate] = name
+        else:
+            unmatched.append(candidate)
+
+    taken = set(mapping.values())
+    for candidate in unmatched:
+        remaining = [key for key, name in lookup.items() if name not in taken]
+        close = difflib.get_close_matches(
+            str(candidate).strip().lower(), remaining, n=1, cutoff=0.8
+        )
+        if close:
+            mapping[candidate] = lookup[close[0]]
+            taken.add(lookup[close[0]])
+    return mapping
+
+
+def normalize_weights(weights) -> np.ndarray:
+    """
+    Clip negative weights and rescale so they sum to 1.0. All-zero weights
+    become uniform.
+    """
+    w = np.clip(np.asarray(weights, dtype=float), 0.0, None)
+    w = np.nan_to_num(w)
+    total = w.sum()
+    if total <= 0:
+        return np.full(len(w), 1.0 / len(w)) if len(w) else w
+    return w / total
+
+
+def framework_axes(framework: Dict) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    Option names, criterion names and normalized weight vector of a framework
+    """
+    options = [o.get("name", "") for o in framework.get("options", []) if o.get("name")]
+    criteria = framework.get("criteria", [])
+    names = [c.get("name", "") for c in criteria if c.get("name")]
+    weights = [float(c.get("weight") or 0.0) for c in criteria if c.get("name")]
+    return options, names, normalize_weights(weights)
+
+
+def build_score_matrix(
+    options: List[str], criteria: List[str], raw_scores: Dict[str, Dict]
+) -> np.ndarray:
+    """
+    options x criteria matrix of raw 0-10 scores from {option: {criterion: score}}
+    """
+    matrix = np.full((len(options), len(criteria)), np.nan)
+    option_index = {name: i for i, name in enumerate(options)}
+    criterion_index = {name: j for j, name in enumerate(criteria)}
+
+    for option_key, option_name in match_names(options, raw_scores).items():
+        scores = raw_scores[option_key] or {}
+        i = option_index[option_name]
+        for crit_key, crit_name in match_names(criteria, scores).items():
+            try:
+                matrix[i, criterion_index[crit_name]] = float(scores[crit_key])
+            except (TypeError, ValueError):
+                continue
+
+    matrix = np.where(np.isnan(matrix), NEUTRAL_SCORE, matrix)
+    return np.clip(matrix, 0.0, 10.0)
+
+
+def weighted_scores(
+    matrix: np.ndarray, weights: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Weighted per-criterion scores and per-option totals (0-10 scale)
+    """
+    weighted = matrix * weights[np.newaxis, :]
+    return weighted, weighted.sum(axis=1)
+
+
+def rank_options(totals: np.ndarray) -> np.ndarray:
+    """
+    Option indices from best to worst; ties keep framework order
+    """
+    return np.argsort(-totals, kind="stable")
+
+
+def extract_raw_scores(option_scores: Dict) -> Dict[str, Dict]:
+    raw = {}
+    for name, entry in option_scores.items():
+        if not isinstance(entry, dict):
+            continue
+        # "raw_scores" is present when re-scoring an already scored evaluation
+        raw[name] = entry.get("scores") or entry.get("raw_scores") or {}
+    return raw
+
+
+def apply_scores(evaluation: Dict, framework: Dict) -> Dict:
+    """
+    Compute criteria_scores, total_score, ranking and primary_choice from the raw
+    per-criterion scores the model returned, so the arithmetic is exact.
+    """
+    option_scores = evaluation.get("option_scores") or {}
+    raw = extract_raw_scores(option_scores)
+
+    options, criteria, weights = framework_axes(framework)
+    options = options or list(raw)
+    if not options or not criteria:
+        return evaluation
+
+    matrix = build_score_matrix(options, criteria, raw)
+    weighted, totals = weighted_scores(matrix, weights)
+    order = rank_options(totals)
+
+    entries = {}
+    for key, name in match_names(options, option_scores).items():
+        if isinstance(option_scores[key], dict):
+            entries[name] = option_scores[key]
+
+    # Reported totals are the sum of the reported (rounded) components so they
+    # always add up; ranking uses the unrounded totals
+    rounded = np.round(weighted, 2)
+    display_totals = np.round(rounded.sum(axis=1), 2)
+
+    scored = {}
+    for rank, i in enumerate(order, start=1):
+        name = options[i]
+        entry = dict(entries.get(name, {}))
+        entry.pop("scores", None)
+        entry["raw_scores"] = dict(zip(criteria, np.round(matrix[i], 2).tolist()))
+        entry["criteria_scores"] = dict(zip(criteria, rounded[i].tolist()))
+        entry["total_score"] = float(display_totals[i])
+        entry["rank"] = rank
+        entry.setdefault("strengths", [])
+        entry.setdefault("weaknesses", [])
+        entry.setdefault("confidence", "medium")
+        scored[name] = entry
+
+    evaluation["option_scores"] = scored
+    evaluation["ranking"] = [options[i] for i in order]
+    evaluation["weights"] = dict(zip(criteria, np.round(weights, 4).tolist()))
+
+    recommendation = evaluation.setdefault("recommendation", {})
+    recommendation["primary_choice"] = options[order[0]]
+    return evaluation
@@ -0,0 +1,368 @@
+# backend/semantic_cache.py
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from log_config import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+Embedder = Callable[[str], np.ndarray]
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_TERM = re.compile(r"\b[\w'.-]+\b")
+# Boundaries between the alternatives of a scenario ("job A in NYC or job B in
+# Austin"); names and numbers in one clause describe the same alternative
+_CLAUSE = re.compile(r"\b(?:or|vs|versus|and|against)\b|[;/]|[.!?](?:\s+|$)", re.I)
+# Common words that carry no decision content; dropping them lets paraphrases
+# ("should I take..." / "I'm deciding whether to take...") line up
+STOPWORDS = frozenset(
+    """a about am an and are as at be been being between but by can could do does
+    doing for from had has have having i i'm if in into is it its me my of on or
+    our should so than that the their them then there these they this to vs
+    versus was we were what whether which while who will with would you your
+    deciding decide decision choose choosing trying help option options""".split()
+)
+
+
+def _hash(feature: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(
+        hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little"
+    )
+
+
+class HashingEmbedder:
+    """
+    Deterministic, offline text embedding: signed feature hashing of content word
+    unigrams, bigrams and character trigrams into `dim` buckets, L2-normalized.
+    Any callable mapping text to a 1-D vector can be used instead.
+    """
+
+    def __init__(self, dim: int = 2048):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        words = [w for w in _WORD.findall(text.lower()) if w not in STOPWORDS]
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"<{word}>"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        return features
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            h = _hash(feature)
+            vector[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+def salient_terms(text: str) -> frozenset:
+    """
+    Names and numbers in a scenario ("NYC", "Austin", "$120k", "2 years")
+    """
+    terms = set()
+    for sentence in re.split(r"[.!?]\s+", text.strip()):
+        for i, term in enumerate(_TERM.findall(sentence)):
+            if any(ch.isdigit() for ch in term):
+                terms.add(term.lower())
+            elif i > 0 and term[0].isupper() and term not in ("I", "I'm"):
+                terms.add(term.lower())
+    return frozenset(terms)
+
+
+def _terms_agree(terms: frozenset, words: frozenset, other_terms, other_words) -> bool:
+    """
+    Each scenario's names and numbers must appear in the other, so "job in NYC vs
+    Austin" never serves a framework built for "job in NYC vs Boston", while an
+    all-lowercase paraphrase still matches
+    """
+    return terms <= set(other_words) and set(other_terms) <= words
+
+
+def term_groups(text: str, vocabulary) -> frozenset:
+    """
+    The vocabulary terms of each clause of `text`, e.g. {{a, nyc}, {b, austin}}
+    for "job A in NYC or job B in Austin"
+    """
+    groups = set()
+    for clause in _CLAUSE.split(text):
+        found = frozenset(t.lower() for t in _TERM.findall(clause)) & vocabulary
+        if found:
+            groups.add(found)
+    return frozenset(groups)
+
+
+def _roles_agree(scenario: str, other: str, vocabulary: frozenset) -> bool:
+    """
+    Names and numbers must also be grouped the same way: "job B in NYC or job A
+    in Austin" has the terms of "job A in NYC or job B in Austin" but swaps what
+    they describe, while listing the alternatives in another order is fine
+    """
+    return term_groups(scenario, vocabulary) == term_groups(other, vocabulary)
+
+
+class VectorIndex:
+    """
+    Row-per-entry matrix of unit vectors with cosine top-k search. Removal swaps
+    the last row into the freed slot, so the matrix stays dense.
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self._vectors = np.zeros((max(1, capacity), dim), dtype=np.float32)
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str, vector: np.ndarray):
+        if key in self._rows:
+            self._vectors[self._rows[key]] = vector
+            return
+        if len(self._keys) == len(self._vectors):
+            grown = np.zeros((len(self._vectors) * 2, self.dim), dtype=np.float32)
+            grown[: len(self._keys)] = self._vectors[: len(self._keys)]
+            self._vectors = grown
+        self._rows[key] = len(self._keys)
+        self._vectors[len(self._keys)] = vector
+        self._keys.append(key)
+
+    def remove(self, key: str):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._keys) - 1
+        if row != last:
+            moved = self._keys[last]
+            self._vectors[row] = self._vectors[last]
+            self._keys[row] = moved
+            self._rows[moved] = row
+        self._keys.pop()
+
+    def search(self, vector: np.ndarray, k: int = 5) -> List[Tuple[str, float]]:
+        count = len(self._keys)
+        if not count:
+            return []
+        similarities = self._vectors[:count] @ vector
+        k = min(k, count)
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(self._keys[i], float(similarities[i])) for i in top]
+
+    def vectors(self) -> Tuple[List[str], np.ndarray]:
+        return list(self._keys), self._vectors[: len(self._keys)].copy()
+
+
+class SemanticCache:
+    """
+    Near-duplicate scenario cache for analyze_scenario. A lookup returns the
+    stored framework of the most similar scenario analysed at the same depth (and
+    prompt version) when their cosine similarity reaches `threshold` and their
+    names/numbers agree.
+    Entries are evicted least-recently-used beyond `max_size`; with a `path`
+    the index is saved to an .npz file periodically and on exit.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder = None,
+        threshold: float = 0.9,
+        max_size: int = 1000,
+        path: Optional[str] = None,
+        top_k: int = 5,
+        save_interval: float = 30.0,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_size = max_size
+        self.path = path
+        self.top_k = top_k
+        self.save_interval = save_interval
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._index: Optional[VectorIndex] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self._hit_similarity = 0.0
+
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def _key(self, scenario: str, depth: str, version: str = "") -> str:
+        return hashlib.sha256(
+            f"{version}\x00{depth}\x00{scenario.strip()}".encode()
+        ).hexdigest()
+
+    def _ensure_index(self, vector: np.ndarray) -> VectorIndex:
+        if self._index is None:
+            self._index = VectorIndex(len(vector), capacity=min(self.max_size, 1024))
+        return self._index
+
+    def get(self, scenario: str, depth: str, version: str = "") -> Optional[Dict]:
+        vector = np.asarray(self.embedder(scenario), dtype=np.float32)
+        terms = salient_terms(scenario)
+        words = frozenset(t.lower() for t in _TERM.findall(scenario))
+
+        with self._lock:
+            self.lookups += 1
+            if self._index is None:
+                return None
+            for key, similarity in self._index.search(vector, self.top_k):
+                if similarity < self.threshold:
+                    break
+                entry = self._entries[key]
+                if (
+                    entry["depth"] != depth
+                    or entry.get("version", "") != version
+                    or not _terms_agree(terms, words, entry["terms"], entry["words"])
+                    or not _roles_agree(
+                        scenario,
+                        entry["scenario"],
+                        terms | frozenset(entry["terms"]),
+                    )
+                ):
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self._hit_similarity += similarity
+                logger.info(
+                    "Semantic cache hit (%.3f) for: %s",
+                    similarity,
+                    entry["scenario"][:60],
+                )
+                return json.loads(entry["framework"])
+        return None
+
+    def set(self, scenario: str, depth: str, framework: Dict, version: str = ""):
+        vector = np.asarray(self.embedder(scenario), dtype=np.float32)
+        key = self._key(scenario, depth, version)
+        # Stored as text: callers go on to mutate the framework they return
+        framework = {
+            k: v
+            for k, v in framework.items()
+            if k not in ("scenario_text", "depth", "decision_id")
+        }
+        entry = {
+            "scenario": scenario,
+            "depth": depth,
+            "version": version,
+            "terms": sorted(salient_terms(scenario)),
+            "words": sorted({t.lower() for t in _TERM.findall(scenario)}),
+            "framework": json.dumps(framework),
+        }
+
+        with self._lock:
+            self._ensure_index(vector).add(key, vector)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self._index.remove(evicted)
+                self.evictions += 1
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= self.save_interval
+
+        if self.path and due:
+            self.save()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.lookups - self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "mean_hit_similarity": (
+                    round(self._hit_similarity / self.hits, 4) if self.hits else None
+                ),
+                "evictions": self.evictions,
+                "threshold": self.threshold,
+            }
+
+    def save(self):
+        """Write entries (in LRU order) and vectors atomically to self.path"""
+        with self._lock:
+            if not self.path or not self._dirty or self._index is None:
+                return
+            keys, vectors = self._index.vectors()
+            rows = {key: i for i, key in enumerate(keys)}
+            order = list(self._entries)
+            entries = [self._entries[key] for key in order]
+            vectors = vectors[[rows[key] for key in order]]
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    vectors=vectors,
+                    keys=np.array(order),
+                    entries=np.array(json.dumps(entries)),
+                )
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning("Semantic cache save failed: %s", e)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                vectors = data["vectors"]
+                keys = [str(key) for key in data["keys"]]
+                entries = json.loads(str(data["entries"]))
+        except Exception as e:
+            logger.warning("Semantic cache load failed: %s", e)
+            return
+
+        with self._lock:
+            # Oldest first, keeping only the newest max_size entries
+            for key, vector, entry in list(zip(keys, vectors, entries))[
+                -self.max_size :
+            ]:
+                self._ensure_index(vector).add(key, vector)
+                self._entries[key] = entry
+        logger.info(
+            "Semantic cache loaded %d scenarios from %s", len(self._entries), self.path
+        )
+
+
+def semantic_cache_from_env() -> Optional[SemanticCache]:
+    """
+    Build the semantic cache from SEMANTIC_CACHE_* environment variables. It is
+    off unless SEMANTIC_CACHE is set to 1/true.
+    """
+    if os.getenv("SEMANTIC_CACHE", "0").lower() not in ("1", "true", "yes"):
+        return None
+    return SemanticCache(
+        embedder=HashingEmbedder(dim=int(os.getenv("SEMANTIC_CACHE_DIM", "2048"))),
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+        max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+        path=os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache.npz") or None,
+    )
+
+
+semantic_cache = semantic_cache_from_env()
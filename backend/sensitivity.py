@@ -0,0 +1,192 @@
+# backend/sensitivity.py
+import copy
+import math
+from numbers import Real
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from scoring import apply_scores, build_score_matrix, extract_raw_scores, framework_axes
+
+# Total Dirichlet concentration for weight sampling: higher keeps sampled
+# weights closer to the user's weights
+DEFAULT_CONCENTRATION = 50.0
+DEFAULT_SAMPLES = 5000
+
+
+def break_even_weights(matrix: np.ndarray, weights: np.ndarray, top: int) -> np.ndarray:
+    """
+    Rank-reversal thresholds for every (challenger, criterion) pair.
+
+    When criterion j's weight moves to t and the other weights are rescaled
+    proportionally, each option's total is linear in t:
+        T_i(t) = t * m_ij + (1 - t) * R_ij,   R_ij = (T_i - w_j m_ij) / (1 - w_j)
+    so the weight at which challenger b ties the current top option a is
+        t* = dR / (dR - dm),  dR = R_aj - R_bj,  dm = m_aj - m_bj
+    Pairs that never cross inside [0, 1] are NaN.
+    """
+    totals = matrix @ weights
+    rest = 1.0 - weights
+    safe_rest = np.where(rest > 1e-12, rest, 1.0)
+    others = (totals[:, np.newaxis] - matrix * weights[np.newaxis, :]) / safe_rest
+    others = np.where(rest > 1e-12, others, matrix)
+
+    d_rest = others[top][np.newaxis, :] - others
+    d_crit = matrix[top][np.newaxis, :] - matrix
+    denom = d_rest - d_crit
+    with np.errstate(divide="ignore", invalid="ignore"):
+        threshold = np.where(np.abs(denom) > 1e-12, d_rest / denom, np.nan)
+
+    threshold[top, :] = np.nan
+    return np.where((threshold >= 0.0) & (threshold <= 1.0), threshold, np.nan)
+
+
+def stability(
+    matrix: np.ndarray,
+    weights: np.ndarray,
+    samples: int = DEFAULT_SAMPLES,
+    concentration: float = DEFAULT_CONCENTRATION,
+    seed: Optional[int] = 0,
+) -> np.ndarray:
+    """
+    Probability that each option ranks first when the weights are resampled from
+    a Dirichlet distribution centred on the current weights
+    """
+    rng = np.random.default_rng(seed)
+    alpha = np.maximum(weights * concentration, 1e-3)
+    sampled = rng.dirichlet(alpha, size=samples)  # samples x criteria
+    winners = np.argmax(sampled @ matrix.T, axis=1)  # samples
+    return np.bincount(winners, minlength=matrix.shape[0]) / samples
+
+
+def sensitivity_report(
+    matrix: np.ndarray,
+    weights: np.ndarray,
+    options: List[str],
+    criteria: List[str],
+    samples: int = DEFAULT_SAMPLES,
+    max_factors: int = 3,
+) -> Dict:
+    """
+    Break-even points per criterion, Monte Carlo stability per option and the
+    human-readable critical_factors / robust_choice summary
+    """
+    totals = matrix @ weights
+    top = int(np.argmax(totals))
+    threshold = break_even_weights(matrix, weights, top)
+
+    break_even = []
+    for j, criterion in enumerate(criteria):
+        entry = {
+            "criterion": criterion,
+            "weight": round(float(weights[j]), 4),
+            "increase_to": None,
+            "decrease_to": None,
+        }
+        column = threshold[:, j]
+        for direction, mask in (
+            ("increase_to", column > weights[j]),
+            ("decrease_to", column < weights[j]),
+        ):
+            candidates = np.where(mask, np.abs(column - weights[j]), np.inf)
+            i = int(np.argmin(candidates))
+            if np.isfinite(candidates[i]):
+                entry[direction] = {
+                    "weight": round(float(column[i]), 4),
+                    "new_top_choice": options[i],
+                }
+        break_even.append(entry)
+
+    probabilities = stability(matrix, weights, samples=samples)
+    stability_by_option = {
+        name: round(float(p), 4) for name, p in zip(options, probabilities)
+    }
+
+    # The criteria whose weight has to move the least to change the top choice
+    shifts = []
+    for entry in break_even:
+        for direction, verb in (("increase_to", "rises"), ("decrease_to", "falls")):
+            if entry[direction]:
+                move = abs(entry[direction]["weight"] - entry["weight"])
+                shifts.append((move, entry, verb, entry[direction]))
+
+    critical_factors = []
+    seen = set()
+    for move, entry, verb, shift in sorted(shifts, key=lambda s: s[0]):
+        if entry["criterion"] in seen or len(critical_factors) >= max_factors:
+            continue
+        seen.add(entry["criterion"])
+        critical_factors.append(
+            f"If {entry['criterion']} {verb} from {entry['weight']:.0%} to "
+            f"{shift['weight']:.0%} of the decision, the top choice shifts "
+            f"to {shift['new_top_choice']}"
+        )
+
+    return {
+        "critical_factors": critical_factors,
+        "robust_choice": options[int(np.argmax(probabilities))],
+        "stability": stability_by_option,
+        "break_even": break_even,
+        "samples": samples,
+    }
+
+
+def analyze_sensitivity(
+    evaluation: Dict, framework: Dict, samples: int = DEFAULT_SAMPLES
+) -> Dict:
+    """
+    Sensitivity analysis of a scored evaluation (see scoring.apply_scores)
+    """
+    options, criteria, weights = framework_axes(framework)
+    raw = extract_raw_scores(evaluation.get("option_scores") or {})
+    options = options or list(raw)
+    if not options or not criteria:
+        return {}
+
+    matrix = build_score_matrix(options, criteria, raw)
+    return sensitivity_report(matrix, weights, options, criteria, samples=samples)
+
+
+def validate_weights(weights) -> Dict[str, float]:
+    """
+    {criterion: weight} as floats; raises ValueError naming the first weight
+    that is not a finite, non-negative number
+    """
+    if weights is None:
+        return {}
+    if not isinstance(weights, dict):
+        raise ValueError("weights must be an object mapping criterion names to numbers")
+    validated = {}
+    for name, value in weights.items():
+        if isinstance(value, bool) or not isinstance(value, Real):
+            raise ValueError(f"Weight for {name!r} must be a number")
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f"Weight for {name!r} must be a non-negative number")
+        validated[name] = float(value)
+    return validated
+
+
+def reweight(
+    evaluation: Dict,
+    framework: Dict,
+    weights: Dict[str, float],
+    samples: int = DEFAULT_SAMPLES,
+) -> Dict:
+    """
+    Re-rank a scored evaluation under user-adjusted criterion weights, without an
+    LLM round-trip. Criteria missing from `weights` keep their framework weight.
+    Raises ValueError for weights that are not non-negative numbers.
+    """
+    weights = validate_weights(weights)
+    framework = copy.deepcopy(framework)
+    lowered = {str(k).strip().lower(): v for k, v in weights.items()}
+    for criterion in framework.get("criteria", []):
+        key = str(criterion.get("name", "")).strip().lower()
+        if key in lowered:
+            criterion["weight"] = lowered[key]
+
+    evaluation = apply_scores(copy.deepcopy(evaluation), framework)
+    evaluation["sensitivity_analysis"] = analyze_sensitivity(
+        evaluation, framework, samples=samples
+    )
+    return evaluation
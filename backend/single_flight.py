@@ -0,0 +1,279 @@
+# backend/single_flight.py
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the file backend is then disabled
+    fcntl = None
+
+
+load_dotenv()
+
+
+class FlightStats:
+    """
+    Counters shared by the thread and asyncio flight groups of a process
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.coalesced_across_workers = 0
+
+    def record(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self, in_flight: int = 0) -> Dict:
+        with self._lock:
+            requests = self.leaders + self.coalesced
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_across_workers": self.coalesced_across_workers,
+                "coalesced_ratio": (
+                    round(self.coalesced / requests, 4) if requests else 0.0
+                ),
+                "in_flight": in_flight,
+            }
+
+
+class FileLock:
+    """
+    Cross-worker lock for workers on one host. Keys hash onto a fixed set of
+    flock()ed stripe files, so the directory never grows past `stripes` files;
+    two keys sharing a stripe only cost the second an extra cache lookup.
+    """
+
+    def __init__(
+        self, directory: str = None, timeout: float = 180.0, stripes: int = 256
+    ):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), "broadly-flight"
+        )
+        self.timeout = timeout
+        self.stripes = max(1, stripes)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        stripe = int.from_bytes(digest[:4], "big") % self.stripes
+        return os.path.join(self.directory, f"stripe-{stripe}.lock")
+
+    def acquire(self, key: str) -> Tuple[object, bool]:
+        """Block until the lock is held (or timeout); returns (token, waited)"""
+        fd = os.open(self.path(key), os.O_CREAT | os.O_RDWR)
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd, waited
+            except BlockingIOError:
+                waited = True
+                if time.monotonic() >= deadline:
+                    # Give up on coalescing rather than on the request
+                    return fd, waited
+                time.sleep(0.05)
+
+    def release(self, key: str, token):
+        try:
+            fcntl.flock(token, fcntl.LOCK_UN)
+        finally:
+            os.close(token)
+
+
+class RedisLock:
+    """
+    Cross-worker lock on any client exposing the redis-py set(nx=, px=)/get/delete
+    subset, for workers spread over several hosts
+    """
+
+    def __init__(self, client, timeout: float = 180.0, prefix: str = "flight:"):
+        self.client = client
+        self.timeout = timeout
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisLock":
+        import redis  # Optional dependency, only needed for this backend
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def acquire(self, key: str) -> Tuple[object, bool]:
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while not self.client.set(
+            self.prefix + key, token, nx=True, px=int(self.timeout * 1000)
+        ):
+            waited = True
+            if time.monotonic() >= deadline:
+                return None, waited
+            time.sleep(0.05)
+        return token, waited
+
+    def release(self, key: str, token):
+        if token is None:
+            return
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        if value == token:
+            self.client.delete(self.prefix + key)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one: the first caller
+    (the leader) runs the function, later callers wait for and share its result
+    or exception. An optional cross-worker lock (FileLock / RedisLock) lets the
+    leaders of different worker processes take turns, so all but the first find
+    the result in a shared response cache instead of calling upstream again.
+    """
+
+    def __init__(self, lock=None, stats: FlightStats = None):
+        self.lock = lock
+        self.stats = stats or flight_stats
+        self._calls: Dict[str, _Call] = {}
+        self._mutex = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], object]):
+        with self._mutex:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self.stats.record("coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self.stats.record("leaders")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._mutex:
+                del self._calls[key]
+            call.done.set()
+
+    @contextmanager
+    def across_workers(self, key: str):
+        """
+        Hold the cross-worker lock for `key`. Yields True when another worker
+        held it first, i.e. its result may already be in the shared cache.
+        """
+        if self.lock is None:
+            yield False
+            return
+        token, waited = self.lock.acquire(_lock_name(key))
+        try:
+            yield waited
+        finally:
+            self.lock.release(_lock_name(key), token)
+
+    def in_flight(self) -> int:
+        with self._mutex:
+            return len(self._calls)
+
+    def snapshot(self) -> Dict:
+        return self.stats.snapshot(self.in_flight())
+
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight for one event loop. The cross-worker lock
+    is acquired in a thread so waiting never blocks the loop.
+    """
+
+    def __init__(self, lock=None, stats: FlightStats = None):
+        self.lock = lock
+        self.stats = stats or flight_stats
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            self.stats.record("leaders")
+            # Its own task, so a disconnecting leader does not cancel the call
+            # its followers are waiting on
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.stats.record("coalesced")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the outcome so a failure nobody awaited is not logged
+        if not task.cancelled():
+            task.exception()
+
+    async def acquire_across_workers(self, key: str) -> Tuple[object, bool]:
+        if self.lock is None:
+            return None, False
+        return await asyncio.to_thread(self.lock.acquire, _lock_name(key))
+
+    async def release_across_workers(self, key: str, token):
+        if self.lock is not None:
+            await asyncio.to_thread(self.lock.release, _lock_name(key), token)
+
+    def snapshot(self) -> Dict:
+        return self.stats.snapshot(len(self._calls))
+
+
+def _lock_name(key: str) -> str:
+    # Keys are already sha256 hex digests; shorten for file names / redis keys
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def lock_from_env():
+    """
+    Cross-worker lock from SINGLE_FLIGHT_BACKEND: none (default, coalesce within
+    a worker only), file or redis. Only useful with a shared response cache
+    (RESPONSE_CACHE_BACKEND=sqlite or redis).
+    """
+    backend_name = os.getenv("SINGLE_FLIGHT_BACKEND", "none").lower()
+    timeout = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "180"))
+
+    if backend_name == "file" and fcntl is not None:
+        return FileLock(
+            os.getenv("SINGLE_FLIGHT_LOCK_DIR") or None,
+            timeout=timeout,
+            stripes=int(os.getenv("SINGLE_FLIGHT_LOCK_STRIPES", "256")),
+        )
+    if backend_name == "redis":
+        return RedisLock.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"), timeout=timeout
+        )
+    return None
+
+
+flight_stats = FlightStats()
+single_flight = SingleFlight(lock_from_env(), flight_stats)
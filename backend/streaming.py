@@ -0,0 +1,202 @@
+# backend/streaming.py
+import json
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from json_codec import dumps
+from structured import loads_lenient
+
+
+def format_sse(event: str, data: Any) -> str:
+    """
+    Serialize one Server-Sent Event frame
+    """
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+class IncrementalJSONParser:
+    """
+    Incremental parser for the framework / evaluation JSON produced by the model.
+
+    Text is fed chunk by chunk as it streams in. Whenever a member of the root
+    object is complete it is reported:
+      - ("field", {"field": key, "value": scalar}) for scalar members
+      - ("item", {"field": key, "key": index_or_name, "value": child}) for each
+        child of an array / object member (options, criteria, option_scores, ...)
+
+    Anything before the first "{" (e.g. a markdown fence) is skipped, and
+    almost-JSON members (trailing commas, comments) go through loads_lenient.
+    """
+
+    def __init__(self):
+        # Chunks are kept as fed, with the offset of each, rather than appended
+        # to one growing string: that would copy the whole text on every feed
+        self._chunks: List[str] = []
+        self._offsets: List[int] = []
+        self._length = 0
+        self._document: Optional[str] = None
+        self._pos = 0
+        self._root_start: Optional[int] = None
+        self._root_end: Optional[int] = None
+
+        self._stack: List[str] = []
+        self._expect_key: List[bool] = []
+        self._in_string = False
+        self._escape = False
+        self._key_start: Optional[int] = None
+
+        # Only the root's members (level 1) and their children (level 2) are tracked
+        self._starts: Dict[int, Optional[int]] = {1: None, 2: None}
+        self._keys: Dict[int, Any] = {1: None, 2: None}
+        self._index = 0
+
+    @property
+    def done(self) -> bool:
+        return self._root_end is not None
+
+    @property
+    def document(self) -> str:
+        """
+        Raw text of the root object, without any surrounding fences or prose
+        """
+        if not self.done:
+            return ""
+        if self._document is None:
+            self._document = self._slice(self._root_start, self._root_end)
+        return self._document
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict]]:
+        events: List[Tuple[str, Dict]] = []
+        if not chunk or self.done:
+            return events
+        base = self._length
+        self._chunks.append(chunk)
+        self._offsets.append(base)
+        self._length += len(chunk)
+
+        # Earlier chunks are always scanned to the end, so this one starts at base
+        while self._pos < self._length and not self.done:
+            i = self._pos
+            ch = chunk[i - base]
+            self._pos += 1
+
+            if not self._stack:
+                if ch == "{":
+                    self._root_start = i
+                    self._push(ch)
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(i, events)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._begin_value(i, is_string=True)
+            elif ch in "{[":
+                self._begin_value(i)
+                self._push(ch)
+            elif ch in "}]":
+                self._end_literal(i, events)
+                self._stack.pop()
+                self._expect_key.pop()
+                if not self._stack:
+                    self._root_end = i + 1
+                else:
+                    self._complete(len(self._stack), i + 1, events)
+            elif ch == ",":
+                self._end_literal(i, events)
+                if self._stack[-1] == "{":
+                    self._expect_key[-1] = True
+            elif ch == ":":
+                self._expect_key[-1] = False
+            elif not ch.isspace():
+                self._begin_value(i)
+
+        return events
+
+    def result(self) -> Any:
+        """
+        Parse the root object. A document cut off early is closed by the repair
+        parser; raises ValueError when there is nothing to repair.
+        """
+        return loads_lenient(self.document if self.done else "".join(self._chunks))
+
+    def _slice(self, start: int, end: int) -> str:
+        """Text between two absolute offsets, from the chunks it spans"""
+        first = bisect_right(self._offsets, start) - 1
+        parts = []
+        for offset, chunk in zip(self._offsets[first:], self._chunks[first:]):
+            if offset >= end:
+                break
+            parts.append(chunk[max(0, start - offset) : end - offset])
+        return "".join(parts)
+
+    def _push(self, ch: str):
+        self._stack.append(ch)
+        self._expect_key.append(ch == "{")
+        level = len(self._stack)
+        if level == 2:
+            self._index = 0
+        if level in self._starts:
+            self._starts[level] = None
+
+    def _begin_value(self, i: int, is_string: bool = False):
+        level = len(self._stack)
+        if self._stack[-1] == "{" and self._expect_key[-1]:
+            if is_string:
+                self._key_start = i
+            return
+        if level in self._starts and self._starts[level] is None:
+            self._starts[level] = i
+
+    def _end_string(self, i: int, events: List):
+        level = len(self._stack)
+        if self._key_start is not None:
+            if level in self._keys:
+                self._keys[level] = json.loads(self._slice(self._key_start, i + 1))
+            self._key_start = None
+            return
+        self._complete(level, i + 1, events)
+
+    def _end_literal(self, i: int, events: List):
+        level = len(self._stack)
+        if level in self._starts and self._starts[level] is not None:
+            self._complete(level, i, events)
+
+    def _complete(self, level: int, end: int, events: List):
+        if level not in self._starts or self._starts[level] is None:
+            return
+        start = self._starts[level]
+        self._starts[level] = None
+
+        if level == 1:
+            # Containers were already streamed item by item; a value starts at
+            # its first non-space character, so that is all there is to check
+            if self._slice(start, start + 1) not in "{[":
+                raw = self._slice(start, end).strip()
+                events.append(
+                    ("field", {"field": self._keys[1], "value": loads_lenient(raw)})
+                )
+        else:
+            if self._stack[1] == "[":
+                key = self._index
+                self._index += 1
+            else:
+                key = self._keys[2]
+            events.append(
+                (
+                    "item",
+                    {
+                        "field": self._keys[1],
+                        "key": key,
+                        "value": loads_lenient(self._slice(start, end).strip()),
+                    },
+                )
+            )
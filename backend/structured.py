@@ -0,0 +1,618 @@
+# backend/structured.py
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, ValidationError
+from pydantic import field_validator, model_validator
+from typing_extensions import Annotated
+
+from metrics import OUTPUT_REPAIRS
+from prompt_compaction import compact_json
+from prompts import FRAGMENT_REPAIR
+from scoring import match_names
+
+load_dotenv()
+
+# Ask the API for output constrained to the JSON schema (Responses API
+# text.format); set to 0 for models or proxies without structured outputs
+STRUCTURED_OUTPUTS = os.getenv("STRUCTURED_OUTPUTS", "1").lower() in ("1", "true")
+# Invalid fragments re-asked per model output; the rest are dropped (0 = never)
+REASK_MAX_FRAGMENTS = int(os.getenv("STRUCTURED_REASK_MAX", "3"))
+
+REPAIR_INSTRUCTIONS = FRAGMENT_REPAIR.instructions
+
+
+# --- Schemas -----------------------------------------------------------------
+
+
+class _Schema(BaseModel):
+    # Extra keys the model adds are kept, not rejected
+    model_config = ConfigDict(extra="allow")
+
+
+# Out-of-range scores are clamped (as scoring does) rather than re-asked
+Score = Annotated[float, AfterValidator(lambda value: min(max(value, 0.0), 10.0))]
+
+QUESTION_TYPES = ("scale", "rank", "mcq", "boolean", "text")
+_TYPE_ALIASES = {
+    "multiple_choice": "mcq",
+    "choice": "mcq",
+    "ranking": "rank",
+    "yes_no": "boolean",
+    "bool": "boolean",
+    "open": "text",
+}
+
+
+class FrameworkOption(_Schema):
+    name: str = Field(min_length=1)
+    description: str = ""
+    inferred: bool = False
+
+
+class FrameworkCriterion(_Schema):
+    name: str = Field(min_length=1)
+    description: str = ""
+    # Normalized to sum to 1 when scoring, so only the sign matters here
+    weight: float = Field(ge=0)
+    category: str = ""
+
+
+class FrameworkQuestion(_Schema):
+    text: str = Field(min_length=1)
+    type: Literal[QUESTION_TYPES]
+    criteria_link: str = ""
+    options: List[str] = []
+    min: Optional[float] = None
+    max: Optional[float] = None
+    minLabel: Optional[str] = None
+    maxLabel: Optional[str] = None
+
+    @field_validator("type", mode="before")
+    @classmethod
+    def _normalize_type(cls, value):
+        if not isinstance(value, str):
+            return value
+        value = value.strip().lower().replace("-", "_")
+        return _TYPE_ALIASES.get(value, value)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _scale_bounds(cls, data):
+        # Scales are often given as numeric options instead of min/max
+        if isinstance(data, dict) and data.get("type") == "scale":
+            try:
+                values = [float(option) for option in data.get("options") or []]
+            except (TypeError, ValueError):
+                return data
+            if values and data.get("min") is None and data.get("max") is None:
+                data = dict(data, min=min(values), max=max(values))
+        return data
+
+    @model_validator(mode="after")
+    def _complete_for_type(self):
+        # The frontend cannot render these questions without the extra fields
+        if self.type == "scale" and (
+            self.min is None or self.max is None or self.min >= self.max
+        ):
+            raise ValueError("scale questions need numeric min < max")
+        if self.type in ("mcq", "rank") and not self.options:
+            raise ValueError(f"{self.type} questions need options")
+        return self
+
+
+class Framework(_Schema):
+    decision_type: str = ""
+    title: str = ""
+    options: List[FrameworkOption] = Field(min_length=1)
+    criteria: List[FrameworkCriterion] = Field(min_length=1)
+    questions: List[FrameworkQuestion] = Field(min_length=1)
+    context_factors: List[str] = []
+
+
+def _scores_alias(data):
+    # The model sometimes names the raw scores after the output field
+    if isinstance(data, dict) and "scores" not in data:
+        for alias in ("raw_scores", "criteria_scores"):
+            if isinstance(data.get(alias), dict):
+                return dict(data, scores=data[alias])
+    return data
+
+
+class OptionScore(_Schema):
+    scores: Dict[str, Score]
+    rationale: str = ""
+    strengths: List[str] = []
+    weaknesses: List[str] = []
+    confidence: Literal["high", "medium", "low"] = "medium"
+
+    _scores_alias = model_validator(mode="before")(_scores_alias)
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _lower_confidence(cls, value):
+        return value.strip().lower() if isinstance(value, str) else value
+
+
+class Recommendation(_Schema):
+    reasoning: str = ""
+    alternatives: List[str] = []
+    red_flags: List[str] = []
+
+
+class DecisionInsights(_Schema):
+    key_tradeoff: str = ""
+    surprise_finding: str = ""
+
+
+class Evaluation(_Schema):
+    option_scores: Dict[str, OptionScore]
+    recommendation: Recommendation = Field(default_factory=Recommendation)
+    decision_insights: DecisionInsights = Field(default_factory=DecisionInsights)
+
+
+class OptionScores(_Schema):
+    """Output of one fan-out call"""
+
+    option_scores: Dict[str, OptionScore]
+
+
+class RescoreEntry(_Schema):
+    scores: Dict[str, Score]
+    rationale: str = ""
+
+    _scores_alias = model_validator(mode="before")(_scores_alias)
+
+
+class Rescore(_Schema):
+    """Output of an incremental re-score call"""
+
+    option_scores: Dict[str, RescoreEntry]
+
+
+SCHEMAS = {
+    "framework": Framework,
+    "evaluation": Evaluation,
+    "option_scores": OptionScores,
+    "rescore": Rescore,
+}
+# Top-level fields whose items are validated (and re-asked) one by one
+ITEM_FIELDS = ("options", "criteria", "questions", "option_scores")
+REQUIRED_FIELDS = ("options", "criteria", "questions", "option_scores")
+
+
+# --- Strict JSON schemas for structured outputs ------------------------------
+
+_STRICT_KEYS = {"type", "properties", "items", "enum", "anyOf", "$ref", "description"}
+
+
+def strict_schema(model) -> Dict:
+    """
+    JSON schema of a pydantic model in the subset structured outputs accepts in
+    strict mode: every property required, no additional properties, no
+    defaults or range keywords (ranges are checked locally), $refs inlined
+    """
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def convert(node):
+        if isinstance(node, list):
+            return [convert(child) for child in node]
+        if not isinstance(node, dict):
+            return node
+        if "$ref" in node:
+            return convert(defs[node["$ref"].rsplit("/", 1)[-1]])
+        out = {}
+        for key, value in node.items():
+            if key not in _STRICT_KEYS:
+                continue
+            if key == "properties":
+                out[key] = {name: convert(child) for name, child in value.items()}
+            else:
+                out[key] = convert(value)
+        if out.get("type") == "object":
+            out["additionalProperties"] = False
+            out["required"] = list(out.get("properties", {}))
+        return out
+
+    return convert(schema)
+
+
+def _object(properties: Dict) -> Dict:
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def _option_entry(criteria: Sequence[str], full: bool = True) -> Dict:
+    entry = {
+        "scores": _object({name: {"type": "number"} for name in criteria}),
+        "rationale": {"type": "string"},
+    }
+    if full:
+        entry["strengths"] = {"type": "array", "items": {"type": "string"}}
+        entry["weaknesses"] = {"type": "array", "items": {"type": "string"}}
+        entry["confidence"] = {"type": "string", "enum": ["high", "medium", "low"]}
+    return _object(entry)
+
+
+FRAMEWORK_SCHEMA = strict_schema(Framework)
+RECOMMENDATION_SCHEMA = strict_schema(Recommendation)
+INSIGHTS_SCHEMA = strict_schema(DecisionInsights)
+
+
+@lru_cache(maxsize=256)
+def document_schema(
+    kind: str, options: Tuple[str, ...] = (), criteria: Tuple[str, ...] = ()
+) -> Dict:
+    """
+    Strict schema of a whole output. Score schemas name every option and
+    criterion, so the model cannot drop or rename them.
+    """
+    if kind == "framework":
+        return FRAMEWORK_SCHEMA
+    entry = _option_entry(criteria, full=kind != "rescore")
+    properties = {"option_scores": _object({name: entry for name in options})}
+    if kind == "evaluation":
+        properties["recommendation"] = RECOMMENDATION_SCHEMA
+        properties["decision_insights"] = INSIGHTS_SCHEMA
+    return _object(properties)
+
+
+def text_format(
+    kind: str, options: Sequence[str] = (), criteria: Sequence[str] = ()
+) -> Optional[Dict]:
+    """Responses API text.format for a kind of output, or None when disabled"""
+    if not STRUCTURED_OUTPUTS or (kind != "framework" and not options):
+        return None
+    return {
+        "type": "json_schema",
+        "name": kind,
+        "schema": document_schema(kind, tuple(options), tuple(criteria)),
+        "strict": True,
+    }
+
+
+# --- Tolerant parsing --------------------------------------------------------
+
+_LITERALS = {"True": "true", "False": "false", "None": "null", "NaN": "null"}
+
+
+def _last_significant(out: List[str]) -> int:
+    k = len(out) - 1
+    while k >= 0 and out[k].isspace():
+        k -= 1
+    return k
+
+
+def _drop_trailing_comma(out: List[str]):
+    k = _last_significant(out)
+    if k >= 0 and out[k] == ",":
+        del out[k]
+
+
+def _ends_value(out: List[str]) -> bool:
+    k = _last_significant(out)
+    return k >= 0 and (out[k][-1] in '"}]' or out[k][-1].isalnum())
+
+
+def repair_json(text: str) -> str:
+    """
+    Rewrite almost-JSON into JSON: drops markdown fences and prose around the
+    root, // and /* */ comments and trailing commas; inserts missing commas
+    between values; escapes raw newlines in strings; maps Python literals; and
+    closes a document cut off mid-way. Raises ValueError when there is no root.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("No JSON document in model output")
+
+    out: List[str] = []
+    stack: List[str] = []
+    expect_key: List[bool] = []
+    in_string = escape = False
+    key_start: Optional[int] = None  # where an unfinished object key begins
+    i, n = min(starts), len(text)
+
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == '"':
+                in_string = False
+                out.append(ch)
+            elif ch < " ":
+                out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}.get(ch, " "))
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+
+        in_object = bool(stack) and stack[-1] == "{"
+        starts_value = ch in '"{[-' or ch.isalnum()
+        if starts_value and stack and _ends_value(out):
+            # Two values in a row: the model left out a comma
+            if stack[-1] == "[" or (in_object and not expect_key[-1] and ch == '"'):
+                out.append(",")
+                if in_object:
+                    expect_key[-1] = True
+
+        if ch == '"':
+            in_string = True
+            if in_object and expect_key[-1]:
+                key_start = len(out)
+            out.append(ch)
+        elif ch in "{[":
+            stack.append(ch)
+            expect_key.append(ch == "{")
+            out.append(ch)
+        elif ch in "}]":
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            key_start = None
+            out.append("}" if stack.pop() == "{" else "]")
+            expect_key.pop()
+            if not stack:
+                break
+        elif ch == ",":
+            out.append(ch)
+            if in_object:
+                expect_key[-1] = True
+        elif ch == ":":
+            key_start = None
+            if in_object:
+                expect_key[-1] = False
+            out.append(ch)
+        elif ch.isalpha() or ch == "_":
+            end = i
+            while end < n and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            out.append(_LITERALS.get(word, word))
+            i = end
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if stack:
+        # Cut off mid-document: finish the last value and close what is open
+        if key_start is not None:
+            del out[key_start:]
+        elif in_string:
+            if escape:
+                out.pop()
+            out.append('"')
+        _drop_trailing_comma(out)
+        k = _last_significant(out)
+        if k >= 0 and out[k] == ":":
+            out.append("null")
+        out.extend("}" if opener == "{" else "]" for opener in reversed(stack))
+    return "".join(out)
+
+
+def loads_lenient(text: str) -> Any:
+    """
+    json.loads, falling back to repair_json for almost-JSON. Raises the
+    original JSONDecodeError when the text cannot be repaired.
+    """
+    try:
+        return json.loads(text)
+    except ValueError as error:
+        try:
+            value = json.loads(repair_json(text))
+        except ValueError:
+            raise error
+    OUTPUT_REPAIRS.inc(action="local_repair")
+    return value
+
+
+# --- Validation and targeted re-asks -----------------------------------------
+
+
+class Fragment:
+    """One invalid or incomplete part of an output, e.g. ("criteria", 3)"""
+
+    def __init__(self, path: Tuple, problems: List[str], invalid: bool):
+        self.path = path
+        self.problems = problems
+        # Invalid fragments are dropped if the re-ask does not fix them;
+        # merely incomplete ones (missing scores) are kept
+        self.invalid = invalid
+
+    @property
+    def label(self) -> str:
+        return "".join(
+            (
+                f"[{part}]"
+                if isinstance(part, int)
+                else f"[{json.dumps(part, ensure_ascii=False)}]"
+            )
+            for part in self.path[1:]
+        ).join(["" if not self.path else str(self.path[0]), ""])
+
+
+def _fragment_path(loc: Tuple) -> Tuple:
+    if len(loc) >= 2 and loc[0] in ITEM_FIELDS:
+        return tuple(loc[:2])
+    return tuple(loc[:1])
+
+
+def _describe(loc: Tuple, path: Tuple, message: str) -> str:
+    rest = ".".join(str(part) for part in loc[len(path) :])
+    return f"{rest}: {message}" if rest else message
+
+
+class OutputCheck:
+    """
+    Validates one parsed model output against its schema and collects invalid
+    fragments, each of which can be re-asked on its own: reasks() gives the
+    prompts, apply() splices in the answers, result() drops whatever is still
+    invalid and returns the validated document.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        data: Any,
+        options: Sequence[str] = (),
+        criteria: Sequence[str] = (),
+        context: str = "",
+    ):
+        if not isinstance(data, dict):
+            raise ValueError(f"Expected a JSON object for {kind}")
+        self.kind = kind
+        self.data = data
+        self.options = list(options)
+        self.criteria = list(criteria)
+        self.context = context
+        self.model = SCHEMAS[kind]
+        self.fragments = self._find_fragments()
+
+    def _find_fragments(self) -> List[Fragment]:
+        problems: Dict[Tuple, List[str]] = {}
+        invalid = set()
+        try:
+            self.model.model_validate(self.data)
+        except ValidationError as e:
+            for error in e.errors():
+                path = _fragment_path(error["loc"])
+                problems.setdefault(path, []).append(
+                    _describe(error["loc"], path, error["msg"])
+                )
+                invalid.add(path)
+        for path, problem in self._coverage():
+            problems.setdefault(path, []).append(problem)
+        return [
+            Fragment(path, found, path in invalid) for path, found in problems.items()
+        ]
+
+    def _coverage(self):
+        """Options and criteria the scores should cover but do not"""
+        scores = self.data.get("option_scores")
+        if not self.options or not isinstance(scores, dict):
+            return
+        mapping = match_names(self.options, scores)
+        covered = set(mapping.values())
+        for name in self.options:
+            if name not in covered:
+                yield ("option_scores", name), "missing: this option was not scored"
+        for key in mapping:
+            entry = _scores_alias(scores[key])
+            if not isinstance(entry, dict) or not isinstance(entry.get("scores"), dict):
+                continue
+            scored = set(match_names(self.criteria, entry["scores"]).values())
+            missing = [name for name in self.criteria if name not in scored]
+            if missing:
+                yield ("option_scores", key), f"scores: missing {compact_json(missing)}"
+
+    def _value(self, path: Tuple):
+        value = self.data
+        for part in path:
+            try:
+                value = value[part]
+            except (KeyError, IndexError, TypeError):
+                return None
+        return value
+
+    def _schema(self, path: Tuple) -> Dict:
+        schema = document_schema(self.kind, tuple(self.options), tuple(self.criteria))
+        for part in path:
+            if "items" in schema:
+                schema = schema["items"]
+            elif part in schema.get("properties", {}):
+                schema = schema["properties"][part]
+            elif path[0] == "option_scores":
+                # A score entry under a name not in the framework
+                schema = _option_entry(self.criteria, full=self.kind != "rescore")
+            else:
+                return {"type": "string"}
+        return schema
+
+    def _prompt(self, fragment: Fragment) -> str:
+        return FRAGMENT_REPAIR.render(
+            context=self.context,
+            field=fragment.label,
+            value=compact_json(self._value(fragment.path)),
+            problems="\n".join(f"- {problem}" for problem in fragment.problems),
+            schema=compact_json(self._schema(fragment.path)),
+        )
+
+    def reasks(self, limit: int = REASK_MAX_FRAGMENTS) -> List[Tuple]:
+        """(fragment, prompt, text_format) for each fragment worth re-asking"""
+        calls = []
+        for fragment in self.fragments[: max(0, limit)]:
+            fmt = None
+            if STRUCTURED_OUTPUTS:
+                fmt = {
+                    "type": "json_schema",
+                    "name": "fragment",
+                    "schema": _object({"value": self._schema(fragment.path)}),
+                    "strict": True,
+                }
+            calls.append((fragment, self._prompt(fragment), fmt))
+        return calls
+
+    def apply(self, fragment: Fragment, output_text: str):
+        answer = loads_lenient(output_text)
+        value = (
+            answer["value"]
+            if isinstance(answer, dict) and "value" in answer
+            else answer
+        )
+        target = self.data
+        for part in fragment.path[:-1]:
+            target = target[part]
+        target[fragment.path[-1]] = value
+        OUTPUT_REPAIRS.inc(action="reask")
+
+    def result(self) -> Dict:
+        """
+        The validated document. Still-invalid items are dropped (list items
+        removed, score entries fall back to neutral scores); raises ValueError
+        when a required field itself is unusable.
+        """
+        remaining = [f for f in self._find_fragments() if f.invalid]
+        # Delete list items from the end so earlier indices stay valid
+        for fragment in sorted(
+            remaining, key=lambda f: str(f.path[-1]).zfill(8), reverse=True
+        ):
+            self._drop(fragment.path)
+        try:
+            validated = self.model.model_validate(self.data)
+        except ValidationError as e:
+            raise ValueError(f"Invalid {self.kind} output: {e.error_count()} errors")
+        return validated.model_dump(exclude_unset=True)
+
+    def _drop(self, path: Tuple):
+        if len(path) == 2:
+            container = self.data.get(path[0])
+            if isinstance(container, list) and isinstance(path[1], int):
+                del container[path[1]]
+            elif isinstance(container, dict):
+                container.pop(path[1], None)
+            OUTPUT_REPAIRS.inc(action="dropped")
+        elif len(path) == 1 and path[0] not in REQUIRED_FIELDS:
+            self.data.pop(path[0], None)
+            OUTPUT_REPAIRS.inc(action="dropped")
@@ -0,0 +1,190 @@
+# backend/test/test_asgi.py
+import asyncio
+import gzip
+import json
+import threading
+
+import pytest
+
+import asgi
+from asgi import ConcurrencyLimiter, DecisionASGIApp, Overloaded
+
+
+class _Engine:
+    def __init__(self):
+        self.calls = []
+
+    async def analyze_scenario(self, scenario, depth, use_cache=True):
+        self.calls.append((scenario, depth, use_cache))
+        return {"decision": scenario, "depth": depth}
+
+
+class _Store:
+    def record_framework(self, framework, session_id):
+        return dict(framework, session=session_id)
+
+
+class _Limits:
+    def key(self, remote_addr, forwarded_for=""):
+        return f"ip:{remote_addr}"
+
+    def check(self, key, stage, depth):
+        pass
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(asgi, "decision_store", _Store())
+    monkeypatch.setattr(asgi, "rate_limiter", _Limits())
+    return DecisionASGIApp(asgi.flask_app, engine=_Engine())
+
+
+def _post(app, path, chunks, headers=()):
+    """Run one POST through the app; (status, headers, body)"""
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "query_string": b"",
+        "headers": list(headers),
+        "client": ("203.0.113.7", 5000),
+    }
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = sent[0]
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], dict(start["headers"]), body
+
+
+def test_analyze_is_served_by_the_async_engine(app):
+    status, headers, body = _post(
+        app,
+        "/api/analyze",
+        [b'{"scenario": "Tea or', b' coffee?"}'],
+        [(b"x-session-id", b"abc")],
+    )
+    assert status == 200
+    assert headers[b"content-type"] == b"application/json"
+    assert json.loads(body) == {
+        "decision": "Tea or coffee?",
+        "depth": "balanced",
+        "session": "abc",
+    }
+    assert app.engine.calls == [("Tea or coffee?", "balanced", True)]
+
+
+def test_gzip_request_body_is_decoded(app):
+    status, _, body = _post(
+        app,
+        "/api/analyze",
+        [gzip.compress(b'{"scenario": "x"}')],
+        [(b"content-encoding", b"gzip")],
+    )
+    assert status == 200
+    assert json.loads(body)["decision"] == "x"
+
+
+@pytest.mark.parametrize("payload", [b"[]", b'"x"', b"{not json"])
+def test_body_that_is_not_a_json_object_is_a_400(app, payload):
+    status, _, body = _post(app, "/api/analyze", [payload])
+    assert status == 400
+    assert json.loads(body) == {"error": "Invalid JSON body"}
+    assert app.engine.calls == []
+
+
+def test_oversized_body_is_refused_while_it_is_read(app, monkeypatch):
+    monkeypatch.setattr(asgi, "MAX_REQUEST_BYTES", 16)
+    status, _, _ = _post(
+        app, "/api/analyze", [b'{"scenario": ', b'"' + b"x" * 32 + b'"}']
+    )
+    assert status == 413
+    # Compressed bodies are capped on the wire bytes as well
+    status, _, _ = _post(
+        app,
+        "/api/analyze",
+        [gzip.compress(b"x" * 4096, mtime=0)],
+        [(b"content-encoding", b"gzip")],
+    )
+    assert status == 413
+
+
+def test_unknown_content_encoding_is_a_415(app):
+    status, _, _ = _post(
+        app, "/api/analyze", [b"{}"], [(b"content-encoding", b"compress")]
+    )
+    assert status == 415
+
+
+def test_concurrency_limiter_queues_then_sheds():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+        order = []
+
+        async def hold(name):
+            async with limiter.slot():
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.create_task(hold("first"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(hold("second"))
+        await asyncio.sleep(0.01)
+        assert limiter.in_flight == 1 and limiter.waiting == 1
+        # The one queue place is taken, so a third request is shed at once
+        with pytest.raises(Overloaded):
+            async with limiter.slot():
+                pass
+        release.set()
+        await asyncio.wait_for(asyncio.gather(first, second), 5)
+        assert order == ["first", "second"]
+        assert limiter.in_flight == 0 and limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_concurrency_limiter_sheds_after_the_queue_timeout():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=4, queue_timeout=0.05)
+        async with limiter.slot():
+            with pytest.raises(Overloaded):
+                async with limiter.slot():
+                    pass
+        assert limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_async_engine_reads_disk_cache_off_the_event_loop(tmp_path):
+    from async_decision_engine import AsyncDecisionEngine
+    from cache import ResponseCache, SQLiteCache
+
+    backend = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    threads = []
+    get = backend.get
+
+    def tracked_get(key):
+        threads.append(threading.get_ident())
+        return get(key)
+
+    backend.get = tracked_get
+    engine = AsyncDecisionEngine(client=object(), cache=ResponseCache(backend))
+
+    async def scenario():
+        await engine._cache_set("k", "v")
+        return await engine._cache_get("k"), threading.get_ident()
+
+    value, loop_thread = asyncio.run(scenario())
+    assert value == "v"
+    assert threads and loop_thread not in threads
@@ -0,0 +1,55 @@
+# backend/test/test_batch.py
+import pytest
+
+import batch
+
+
+class _Engine:
+    def __init__(self):
+        self.analyzed = []
+
+    def analyze_scenario(self, scenario, depth, use_cache=True, raise_errors=False):
+        self.analyzed.append(scenario)
+        return {"decision": scenario, "depth": depth}
+
+
+def test_parse_items_numbers_lines_and_checks_depth():
+    items = batch.parse_items(['"Tea or coffee?"', "", '{"id": "b", "scenario": "x"}'])
+    assert items == [
+        {"id": "1", "scenario": "Tea or coffee?", "depth": "balanced"},
+        {"id": "b", "scenario": "x", "depth": "balanced"},
+    ]
+    with pytest.raises(ValueError, match="Line 1"):
+        batch.parse_items(['{"scenario": "x", "depth": "deep"}'])
+
+
+def test_checkpoint_path_is_namespaced_per_owner(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_CHECKPOINT_DIR", str(tmp_path))
+    mine = batch.checkpoint_path("nightly", "ip:203.0.113.7")
+    theirs = batch.checkpoint_path("nightly", "ip:198.51.100.1")
+    assert mine != theirs
+    assert mine.startswith(str(tmp_path)) and mine.endswith("nightly.jsonl")
+
+
+def test_runner_admits_each_item_and_records_refusals(tmp_path):
+    items = batch.parse_items(['"a"', '"b"', '"c"'])
+    admitted = []
+
+    def admit(item):
+        if item["id"] == "2":
+            raise RuntimeError("over limit")
+        admitted.append(item["id"])
+
+    engine = _Engine()
+    checkpoint = batch.Checkpoint(str(tmp_path / "run.jsonl"))
+    checkpoint.acquire()
+    runner = batch.BatchRunner(engine, concurrency=2, admit=admit)
+    results = {result["id"]: result for result in runner.run(items, checkpoint)}
+    checkpoint.close()
+
+    assert sorted(admitted) == ["1", "3"]
+    assert sorted(engine.analyzed) == ["a", "c"]
+    assert "over limit" in results["2"]["error"]
+    # The refused item is retried on resume, the others are replayed
+    resumed = batch.Checkpoint(str(tmp_path / "run.jsonl"))
+    assert sorted(resumed.done) == ["1", "3"]
@@ -0,0 +1,119 @@
+# backend/test/test_cache.py
+import time
+
+import pytest
+
+import cache
+
+
+class _Redis:
+    """The get/set(ex=)/delete/scan_iter subset RedisCache uses"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at < time.time():
+            del self.data[key]
+            return None
+        return value.encode("utf-8") if value is not None else None
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, time.time() + ex if ex else None)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if key.startswith(match.rstrip("*"))]
+
+
+def _backend(name, tmp_path, ttl):
+    if name == "memory":
+        return cache.MemoryCache(ttl=ttl)
+    if name == "sqlite":
+        return cache.SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl=ttl)
+    return cache.RedisCache(_Redis(), ttl=ttl)
+
+
+BACKENDS = ["memory", "sqlite", "redis"]
+
+
+def test_cache_key_ignores_whitespace_but_not_format():
+    key = cache.cache_key("m", "inst", "a  prompt\n")
+    assert key == cache.cache_key("m", "inst", " a prompt")
+    assert key != cache.cache_key("m", "inst", "a prompt", "framework")
+    assert key != cache.cache_key("other", "inst", "a prompt")
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_backend_round_trip_and_clear(name, tmp_path):
+    backend = _backend(name, tmp_path, ttl=None)
+    assert backend.get("k") is None
+    backend.set("k", '{"a": 1}')
+    backend.set("k", '{"a": 2}')
+    assert backend.get("k") == '{"a": 2}'
+    backend.clear()
+    assert backend.get("k") is None
+
+
+@pytest.mark.parametrize("name", ["memory", "sqlite"])
+def test_entries_expire_after_ttl(name, tmp_path):
+    backend = _backend(name, tmp_path, ttl=0.05)
+    backend.set("k", "v")
+    assert backend.get("k") == "v"
+    time.sleep(0.1)
+    assert backend.get("k") is None
+
+
+def test_redis_entries_carry_the_ttl():
+    backend = cache.RedisCache(_Redis(), ttl=30, prefix="llm:")
+    backend.set("k", "v")
+    value, expires_at = backend.client.data["llm:k"]
+    assert value == "v" and 29 < expires_at - time.time() <= 30
+
+
+def test_memory_cache_drops_least_recently_used():
+    backend = cache.MemoryCache(max_size=2)
+    backend.set("a", "1")
+    backend.set("b", "2")
+    backend.get("a")
+    backend.set("c", "3")
+    assert backend.get("b") is None
+    assert backend.get("a") == "1" and backend.get("c") == "3"
+
+
+def test_response_cache_counts_and_survives_a_broken_backend():
+    front = cache.ResponseCache(cache.MemoryCache())
+    front.set("k", "v")
+    assert front.get("k") == "v"
+    assert front.get("missing") is None
+    assert front.stats() == {
+        "backend": "MemoryCache",
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+    }
+
+    class Broken:
+        def get(self, key):
+            raise OSError("disk gone")
+
+        set = get
+
+    broken = cache.ResponseCache(Broken())
+    broken.set("k", "v")
+    assert broken.get("k") is None
+    assert not cache.ResponseCache().enabled
+
+
+def test_cache_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("TEST_CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("TEST_CACHE_PATH", str(tmp_path / "env.sqlite3"))
+    monkeypatch.setenv("TEST_CACHE_TTL", "0")
+    built = cache.cache_from_env("TEST_CACHE")
+    assert isinstance(built.backend, cache.SQLiteCache)
+    assert built.backend.ttl is None
+    monkeypatch.setenv("TEST_CACHE_BACKEND", "none")
+    assert cache.cache_from_env("TEST_CACHE").backend is None
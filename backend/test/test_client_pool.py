@@ -0,0 +1,96 @@
+# backend/test/test_client_pool.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import client_pool
+
+
+class _Models(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    peers = []
+
+    def do_GET(self):
+        self.peers.append(self.client_address)
+        body = json.dumps({"object": "list", "data": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Models)
+    _Models.peers = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_MAX_RETRIES", "0")
+    monkeypatch.setattr(client_pool, "_clients", {})
+    monkeypatch.setattr(client_pool, "_async_clients", {})
+    yield _Models.peers
+    client_pool.reset_client()
+    server.shutdown()
+    server.server_close()
+
+
+def test_calls_share_one_client_and_one_connection(upstream):
+    client = client_pool.get_client()
+    assert client_pool.get_client() is client
+    for _ in range(3):
+        client_pool.get_client().models.list()
+    # Every request after the first reused the kept-alive connection
+    assert len(upstream) == 3
+    assert len(set(upstream)) == 1
+
+
+def test_threads_share_the_client(upstream):
+    seen = []
+    threads = [
+        threading.Thread(target=lambda: seen.append(client_pool.get_client()))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(client) for client in seen}) == 1
+
+
+def test_forked_worker_builds_its_own_client(upstream, monkeypatch):
+    parent = client_pool.get_client()
+    monkeypatch.setattr(client_pool.os, "getpid", lambda: -1)
+    child = client_pool.get_client()
+    assert child is not parent
+    assert list(client_pool._clients) == [-1]
+
+
+def test_reset_client_builds_a_fresh_one(upstream):
+    first = client_pool.get_client()
+    client_pool.reset_client()
+    assert client_pool.get_client() is not first
+
+
+def test_warm_up_opens_a_pooled_connection(upstream, monkeypatch):
+    monkeypatch.setenv("OPENAI_WARMUP", "1")
+    assert client_pool.warm_up()
+    client_pool.get_client().models.list()
+    assert len(set(upstream)) == 1
+    monkeypatch.setenv("OPENAI_WARMUP", "0")
+    assert not client_pool.warm_up()
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("OPENAI_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("OPENAI_KEEPALIVE_EXPIRY", "12.5")
+    settings = client_pool.ClientSettings.from_env()
+    limits = settings.limits()
+    assert limits.max_connections == 7
+    assert limits.keepalive_expiry == 12.5
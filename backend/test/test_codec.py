@@ -0,0 +1,159 @@
+# backend/test/test_codec.py
+import gzip
+import io
+import json
+import zlib
+from datetime import datetime
+
+import pytest
+from flask import Flask, jsonify
+
+import compression
+import json_codec
+
+DOCUMENT = {"b": [1, 2.5, None, True], "a": "é ✓", "n": {"x": {}}}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def codec(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(json_codec, "_orjson", None)
+    elif json_codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    return json_codec
+
+
+def test_round_trip_matches_the_stdlib(codec):
+    encoded = codec.dumps(DOCUMENT, sort_keys=True)
+    assert encoded == json.dumps(
+        DOCUMENT, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    assert codec.loads(encoded) == DOCUMENT
+    assert codec.loads(encoded.encode("utf-8")) == DOCUMENT
+    with pytest.raises(ValueError):
+        codec.loads("{not json")
+
+
+def test_values_orjson_rejects_fall_back_to_the_stdlib(codec):
+    big = 2**70
+    assert codec.dumps({"n": big}) == '{"n":%d}' % big
+    assert codec.dumps({1: "a"}) == '{"1":"a"}'
+    assert codec.dumps({"a": 1}, indent=True) == '{\n  "a": 1\n}'
+
+
+def test_flask_provider_keeps_flask_output(codec):
+    app = Flask(__name__)
+    app.json = json_codec.FastJSONProvider(app)
+    when = datetime(2024, 5, 1, 12, 30)
+    with app.app_context():
+        body = jsonify({"when": when, "b": 1, "a": 2}).get_data(as_text=True)
+        assert app.json.loads(body) == {
+            "a": 2,
+            "b": 1,
+            "when": "Wed, 01 May 2024 12:30:00 GMT",
+        }
+        assert body.index('"a"') < body.index('"b"')
+
+
+@pytest.mark.parametrize(
+    "accept, chosen",
+    [
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0", None),
+        ("*", "gzip"),
+        ("*;q=0, identity", None),
+        ("deflate", None),
+        ("", None),
+        ("GZIP;q=0.5, br;q=0", "gzip"),
+    ],
+)
+def test_choose_encoding(accept, chosen, monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert compression.choose_encoding(accept) == chosen
+
+
+def test_gzip_and_deflate_bodies_decompress():
+    body = json.dumps(DOCUMENT).encode()
+    assert compression.decompress(compression.compress(body, "gzip"), "gzip") == body
+    assert compression.decompress(zlib.compress(body), "deflate") == body
+    raw = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    assert compression.decompress(raw.compress(body) + raw.flush(), "deflate") == body
+
+
+def test_decompress_rejects_bombs_and_junk():
+    bomb = gzip.compress(b"0" * 10000)
+    with pytest.raises(compression.BodyTooLarge):
+        compression.decompress(bomb, "gzip", limit=1000)
+    with pytest.raises(compression.UnsupportedEncoding):
+        compression.decompress(b"x", "compress")
+    with pytest.raises(ValueError):
+        compression.decompress(gzip.compress(b"{}")[:-6], "gzip")
+    with pytest.raises(ValueError):
+        compression.decompress(b"not gzip", "gzip")
+
+
+def _app():
+    app = Flask(__name__)
+    compression.init_app(app)
+
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        from flask import request
+
+        return {"got": request.get_json(), "pad": "x" * 2000}
+
+    return app
+
+
+def _call(app, body, headers):
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/echo",
+        "SERVER_NAME": "test",
+        "SERVER_PORT": "80",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+    }
+    environ.update(
+        {"HTTP_" + k.upper().replace("-", "_"): v for k, v in headers.items()}
+    )
+    status = []
+
+    def start_response(line, response_headers, exc_info=None):
+        status.append((int(line.split()[0]), dict(response_headers)))
+
+    chunks = app.wsgi_app(environ, start_response)
+    return status[0][0], status[0][1], b"".join(chunks)
+
+
+def test_compressed_request_and_response(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    app = _app()
+    status, headers, body = _call(
+        app,
+        gzip.compress(b'{"a": 1}'),
+        {"Content-Encoding": "gzip", "Accept-Encoding": "gzip"},
+    )
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in headers["Vary"]
+    assert json.loads(gzip.decompress(body))["got"] == {"a": 1}
+
+    # Without Accept-Encoding the response goes out as is
+    status, headers, body = _call(app, b'{"a": 1}', {})
+    assert "Content-Encoding" not in headers
+    assert json.loads(body)["got"] == {"a": 1}
+
+
+def test_middleware_maps_body_errors_to_statuses(monkeypatch):
+    app = _app()
+    assert _call(app, b"x", {"Content-Encoding": "compress"})[0] == 415
+    assert _call(app, b"junk", {"Content-Encoding": "gzip"})[0] == 400
+    monkeypatch.setattr(compression, "MAX_REQUEST_BYTES", 64)
+    bomb = gzip.compress(b"0" * 10000)
+    assert _call(app, bomb, {"Content-Encoding": "gzip"})[0] == 413
+    # The wire bytes are capped too, before any decompression
+    assert _call(app, b"0" * 100, {"Content-Encoding": "gzip"})[0] == 413
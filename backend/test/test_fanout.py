@@ -0,0 +1,86 @@
+# backend/test/test_fanout.py
+from fanout import chunk_options, local_summary, merge_option_scores, should_fan_out
+
+
+def _evaluation(top_total: float = 8.0, runner_up_total: float = 6.0):
+    return {
+        "ranking": ["Lisbon", "Porto", "Faro"],
+        "option_scores": {
+            "Lisbon": {
+                "total_score": top_total,
+                "raw_scores": {"Cost": 4, "Weather": 9},
+                "criteria_scores": {"Cost": 1.2, "Weather": 4.5},
+                "weaknesses": ["Crowded in summer"],
+            },
+            "Porto": {
+                "total_score": runner_up_total,
+                "raw_scores": {"Cost": 8, "Weather": 6},
+                "criteria_scores": {"Cost": 2.4, "Weather": 3.0},
+            },
+            "Faro": {
+                "total_score": 5.0,
+                "raw_scores": {"Cost": 6, "Weather": 8},
+                "criteria_scores": {"Cost": 1.8, "Weather": 4.0},
+            },
+        },
+    }
+
+
+def _framework(inferred=()):
+    return {
+        "options": [
+            {"name": name, "inferred": name in inferred}
+            for name in ("Lisbon", "Porto", "Faro")
+        ]
+    }
+
+
+def test_should_fan_out_only_with_several_options():
+    assert should_fan_out(3, requested=True)
+    assert not should_fan_out(1, requested=True)
+    assert not should_fan_out(5, requested=False)
+
+
+def test_chunks_and_merge():
+    assert chunk_options(["a", "b", "c"], 2) == [["a", "b"], ["c"]]
+    merged = merge_option_scores(
+        [{"option_scores": {"a": {"x": 1}}}, {"option_scores": {"b": {"x": 2}}}, {}]
+    )
+    assert merged == {"option_scores": {"a": {"x": 1}, "b": {"x": 2}}}
+
+
+def test_local_summary_recommendation():
+    summary = local_summary(_evaluation(), _framework())
+    recommendation = summary["recommendation"]
+    assert recommendation["primary_choice"] == "Lisbon"
+    assert "driven mostly by Weather and Cost" in recommendation["reasoning"]
+    assert recommendation["alternatives"][0] == "Porto if Cost matters more to you"
+    assert recommendation["red_flags"] == [
+        "Crowded in summer",
+        "Lisbon scores low on Cost",
+    ]
+    insights = summary["decision_insights"]
+    assert (
+        insights["key_tradeoff"]
+        == "Lisbon's strength in Weather vs Porto's strength in Cost"
+    )
+    assert insights["surprise_finding"] == ""
+
+
+def test_local_summary_flags_inferred_option_near_the_top():
+    summary = local_summary(_evaluation(), _framework(inferred=("Porto",)))
+    assert summary["decision_insights"]["surprise_finding"] == (
+        "Porto, an option you had not listed, ranks near the top"
+    )
+    # Only the top two count
+    summary = local_summary(_evaluation(), _framework(inferred=("Faro",)))
+    assert summary["decision_insights"]["surprise_finding"] == ""
+
+
+def test_local_summary_near_tie_wins_over_inferred():
+    summary = local_summary(_evaluation(6.1, 6.0), _framework(inferred=("Porto",)))
+    assert "nearly tied" in summary["decision_insights"]["surprise_finding"]
+
+
+def test_local_summary_without_ranking():
+    assert local_summary({}) == {}
@@ -0,0 +1,166 @@
+# backend/test/test_incremental.py
+import copy
+
+from incremental import (
+    answers_by_criterion,
+    merge_scores,
+    plan_incremental,
+    question_answers,
+    score_fingerprints,
+)
+
+FRAMEWORK = {
+    "scenario_text": "How should I commute?",
+    "options": [{"name": "Car"}, {"name": "Train"}],
+    "criteria": [
+        {"name": "Cost", "weight": 2, "description": "Monthly spend"},
+        {"name": "Speed", "weight": 1, "description": "Door to door"},
+    ],
+    "questions": [
+        {"text": "Budget?", "type": "scale", "max": 5, "criteria_link": "Cost"},
+        {"text": "Rush?", "type": "scale", "max": 5, "criteria_link": "speed"},
+        {"text": "Anything else?", "type": "text", "criteria_link": ""},
+    ],
+}
+RESPONSES = {"q_0": 4, "q_1": 2, "q_2": "I hate traffic"}
+
+
+def _previous(responses=RESPONSES):
+    return {
+        "score_fingerprints": score_fingerprints(FRAMEWORK, responses),
+        "option_scores": {
+            "Car": {"raw_scores": {"Cost": 3, "Speed": 8}, "rationale": "old"},
+            "Train": {"raw_scores": {"Cost": 7, "Speed": 6}},
+        },
+    }
+
+
+def test_question_answers_accepts_both_shapes():
+    indexed = question_answers(FRAMEWORK, {"q_1": 2})
+    assert indexed == [
+        {
+            "question": "Rush?",
+            "type": "scale",
+            "max": 5,
+            "criteria_link": "speed",
+            "response": 2,
+        }
+    ]
+    listed = question_answers(FRAMEWORK, {"answers": [{"response": 4}]})
+    assert listed[0]["question"] == "Budget?"
+    assert listed[0]["criteria_link"] == "Cost"
+
+
+def test_unlinked_answers_inform_every_criterion():
+    grouped = answers_by_criterion(FRAMEWORK, RESPONSES)
+    assert [a["response"] for a in grouped["Cost"]] == [4, "I hate traffic"]
+    assert [a["response"] for a in grouped["Speed"]] == [2, "I hate traffic"]
+
+
+def test_fingerprints_ignore_weights_and_option_order():
+    reweighted = copy.deepcopy(FRAMEWORK)
+    reweighted["criteria"][0]["weight"] = 9
+    reweighted["options"].reverse()
+    assert score_fingerprints(reweighted, RESPONSES) == score_fingerprints(
+        FRAMEWORK, RESPONSES
+    )
+
+
+def test_plan_requeries_only_criteria_whose_answers_changed():
+    plan = plan_incremental(FRAMEWORK, dict(RESPONSES, q_1=5), _previous())
+    assert plan.changed == ["Speed"]
+    assert [a["response"] for a in plan.answers] == [5, "I hate traffic"]
+    assert plan.fingerprints == score_fingerprints(FRAMEWORK, dict(RESPONSES, q_1=5))
+
+
+def test_plan_needs_full_evaluation():
+    # No previous result
+    assert plan_incremental(FRAMEWORK, RESPONSES, None) is None
+    # Every criterion changed (the general answer feeds both)
+    assert plan_incremental(FRAMEWORK, dict(RESPONSES, q_2="x"), _previous()) is None
+    # Different option set
+    changed = copy.deepcopy(FRAMEWORK)
+    changed["options"].append({"name": "Bike"})
+    assert plan_incremental(changed, RESPONSES, _previous()) is None
+    # Previous scores missing an option
+    previous = _previous()
+    del previous["option_scores"]["Train"]
+    assert plan_incremental(FRAMEWORK, dict(RESPONSES, q_1=5), previous) is None
+
+
+def test_merge_scores_overlays_fresh_criteria():
+    previous = _previous()
+    partial = {
+        "option_scores": {
+            "car": {"scores": {"speed": 5}, "rationale": "new"},
+            "Train": {"scores": {"Speed": 9}},
+        }
+    }
+    merged = merge_scores(previous, partial, ["Cost", "Speed"])
+    assert merged["option_scores"]["Car"]["raw_scores"] == {"Cost": 3, "Speed": 5}
+    assert merged["option_scores"]["Car"]["rationale"] == "new"
+    assert merged["option_scores"]["Train"]["raw_scores"] == {"Cost": 7, "Speed": 9}
+    # The previous evaluation is left alone
+    assert previous["option_scores"]["Car"]["raw_scores"]["Speed"] == 8
+
+
+def _engine():
+    from cache import ResponseCache
+    from decision_engine import DecisionEngine
+
+    return DecisionEngine(client=object(), cache=ResponseCache())
+
+
+def _scored_previous(engine):
+    evaluation = {
+        "option_scores": {
+            "Car": {"scores": {"Cost": 3, "Speed": 9}},
+            "Train": {"scores": {"Cost": 7, "Speed": 6}},
+        },
+        "recommendation": {
+            "reasoning": "Train is cheaper and fast enough.",
+            "alternatives": ["Car"],
+            "red_flags": [],
+        },
+        "decision_insights": {"key_tradeoff": "Train's cost vs Car's speed"},
+    }
+    return engine._finish_evaluation(evaluation, FRAMEWORK, RESPONSES, "model")
+
+
+def test_incremental_result_rebuilds_narrative_when_the_winner_changes():
+    engine = _engine()
+    previous = _scored_previous(engine)
+    assert previous["ranking"] == ["Train", "Car"]
+
+    responses = dict(RESPONSES, q_1=5)
+    plan = plan_incremental(FRAMEWORK, responses, previous)
+    partial = {
+        "option_scores": {
+            "Car": {"scores": {"Speed": 10}},
+            "Train": {"scores": {"Speed": 0}},
+        }
+    }
+    result = engine._finish_incremental(
+        previous, partial, plan, FRAMEWORK, responses, "model"
+    )
+
+    assert result["ranking"] == ["Car", "Train"]
+    recommendation = result["recommendation"]
+    assert recommendation["primary_choice"] == "Car"
+    assert recommendation["reasoning"].startswith("Car has the highest weighted score")
+    assert recommendation["alternatives"][0].startswith("Train")
+    assert "Train's cost" not in result["decision_insights"]["key_tradeoff"]
+    assert result["incremental"] == {"rescored_criteria": ["Speed"]}
+
+
+def test_incremental_result_keeps_narrative_when_the_order_holds():
+    engine = _engine()
+    previous = _scored_previous(engine)
+    responses = dict(RESPONSES, q_1=5)
+    plan = plan_incremental(FRAMEWORK, responses, previous)
+    partial = {"option_scores": {"Car": {"scores": {"Speed": 8}}}}
+    result = engine._finish_incremental(
+        previous, partial, plan, FRAMEWORK, responses, "model"
+    )
+    assert result["ranking"] == ["Train", "Car"]
+    assert result["recommendation"]["reasoning"] == "Train is cheaper and fast enough."
@@ -0,0 +1,134 @@
+# backend/test/test_jobs.py
+import sqlite3
+import time
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def queue(tmp_path):
+    # Jobs are run by hand with _execute, no worker threads are started
+    queue = jobs.JobQueue(
+        jobs.SQLiteJobStore(str(tmp_path / "jobs.sqlite3")),
+        max_depth=2,
+        max_attempts=2,
+        backoff=0,
+    )
+    queue._pid = None
+    queue.start = lambda: None
+    return queue
+
+
+def _run_next(queue):
+    row = queue.store.claim(queue.lease)
+    assert row is not None
+    queue._execute(row)
+
+
+def test_job_runs_and_reports_result(queue):
+    queue.register("echo", lambda payload: {"echo": payload["text"]})
+    job_id = queue.submit("echo", {"text": "hi"})
+    assert queue.get(job_id)["status"] == "queued"
+
+    _run_next(queue)
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["result"] == {"echo": "hi"}
+    assert job["attempts"] == 1
+    assert job["timing"]["run_ms"] is not None
+
+
+def test_transient_failure_is_retried_then_fails(queue):
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        raise jobs.JobFailed("try again")
+
+    queue.register("flaky", flaky)
+    job_id = queue.submit("flaky", {})
+    _run_next(queue)
+    assert queue.get(job_id)["status"] == "queued"
+    time.sleep(0.01)
+    _run_next(queue)
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert "try again" in job["error"]
+    assert len(calls) == 2
+
+
+def test_other_errors_fail_at_once(queue):
+    def broken(payload):
+        raise KeyError("scenario")
+
+    queue.register("broken", broken)
+    job_id = queue.submit("broken", {})
+    _run_next(queue)
+    assert queue.get(job_id)["status"] == "failed"
+
+
+def test_submit_rejects_unknown_kind_and_full_queue(queue):
+    queue.register("echo", lambda payload: payload)
+    with pytest.raises(ValueError):
+        queue.submit("nope", {})
+    queue.submit("echo", {})
+    queue.submit("echo", {})
+    with pytest.raises(jobs.QueueFull):
+        queue.submit("echo", {})
+
+
+def test_purge_drops_finished_jobs(queue):
+    queue.register("echo", lambda payload: payload)
+    job_id = queue.submit("echo", {})
+    _run_next(queue)
+    queue.store.purge(older_than=-1)
+    assert queue.get(job_id) is None
+
+
+def test_expired_lease_is_reclaimed_until_attempts_run_out(queue):
+    queue.register("echo", lambda payload: payload)
+    job_id = queue.submit("echo", {})
+    # Two workers die mid-job: each claim leases the job without finishing it
+    assert queue.store.claim(-1, queue.max_attempts)["id"] == job_id
+    assert queue.store.claim(-1, queue.max_attempts)["id"] == job_id
+    assert queue.store.claim(queue.lease, queue.max_attempts) is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 2
+    assert "lease expired" in job["error"]
+
+
+def test_store_errors_do_not_escape_the_worker(queue, monkeypatch):
+    def broken(payload):
+        raise KeyError("scenario")
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    queue.register("broken", broken)
+    job_id = queue.submit("broken", {})
+    monkeypatch.setattr(queue.store, "fail", locked)
+    _run_next(queue)
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_job_stream_reports_a_job_that_disappears(monkeypatch):
+    import decisions
+    from app import app
+
+    job = {"job_id": "j1", "status": "queued", "attempts": 0}
+    answers = iter([job, None])
+    monkeypatch.setattr(decisions.job_queue, "get", lambda job_id: next(answers))
+    monkeypatch.setattr(decisions, "JOB_POLL_INTERVAL", 0)
+
+    with app.test_request_context("/api/jobs/j1?stream=1"):
+        response = decisions.get_job("j1")
+        body = "".join(
+            chunk if isinstance(chunk, str) else chunk.decode()
+            for chunk in response.response
+        )
+    assert response.status_code == 200
+    assert body.startswith("event: status")
+    assert "event: error" in body and "Job not found" in body
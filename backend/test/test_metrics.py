@@ -0,0 +1,59 @@
+# backend/test/test_metrics.py
+from types import SimpleNamespace
+
+import metrics
+
+
+def test_counter_and_histogram_text_format(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    errors = metrics.Counter("test_errors", "Errors.", ["kind"])
+    errors.inc(kind='say "hi"\n')
+    errors.inc(2, kind="b")
+    latency = metrics.Histogram("test_seconds", "Latency.", ["route"], (0.1, 1))
+    for value in (0.05, 0.5, 5):
+        latency.observe(value, route="/x")
+
+    assert metrics.render_metrics().splitlines() == [
+        "# HELP test_errors Errors.",
+        "# TYPE test_errors counter",
+        'test_errors_total{kind="b"} 2',
+        'test_errors_total{kind="say \\"hi\\"\\n"} 1',
+        "# HELP test_seconds Latency.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="/x",le="0.1"} 1',
+        'test_seconds_bucket{route="/x",le="1"} 2',
+        'test_seconds_bucket{route="/x",le="+Inf"} 3',
+        'test_seconds_sum{route="/x"} 5.55',
+        'test_seconds_count{route="/x"} 3',
+    ]
+
+
+def test_bucket_bounds_are_inclusive(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    histogram = metrics.Histogram("edge", "Edge.", buckets=(1, 2))
+    histogram.observe(1)
+    assert 'edge_bucket{le="1"} 1' in histogram.render()
+
+
+def test_metrics_endpoint_exposes_token_usage():
+    from app import app
+
+    usage = SimpleNamespace(
+        input_tokens=300,
+        output_tokens=80,
+        input_tokens_details=SimpleNamespace(cached_tokens=200),
+    )
+    metrics.record_usage("metrics-test-model", "quick", usage)
+
+    with app.test_request_context("/metrics"):
+        response = app.view_functions["metrics"]()
+    body = response.get_data(as_text=True)
+    assert response.content_type == metrics.CONTENT_TYPE
+    assert "# TYPE broadly_llm_tokens histogram" in body
+    labels = 'model="metrics-test-model",depth="quick"'
+    assert f'broadly_llm_tokens_bucket{{{labels},kind="input",le="250"}} 0' in body
+    assert f'broadly_llm_tokens_bucket{{{labels},kind="input",le="500"}} 1' in body
+    assert f'broadly_llm_tokens_sum{{{labels},kind="cached_input"}} 200' in body
+    assert f'broadly_llm_tokens_count{{{labels},kind="output"}} 1' in body
+    stats = metrics.prompt_cache_stats.snapshot()["metrics-test-model"]
+    assert stats["cached_ratio"] == round(200 / 300, 4)
@@ -0,0 +1,158 @@
+# backend/test/test_persistence.py
+import copy
+import json
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from cache import ResponseCache
+from models_decision import (
+    Decision,
+    DecisionOption,
+    Evaluation,
+    EvaluationCriteria,
+    Question,
+    db,
+)
+from persistence import DecisionStore, load_decision_graphs
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(HERE, "framework.json"), encoding="utf-8") as f:
+    FRAMEWORK = json.load(f)
+# The fixture predates scenario_text being stored as plain text
+FRAMEWORK["scenario_text"] = FRAMEWORK["scenario_text"]["scenario"]
+
+
+def _evaluation(summary: str):
+    return {
+        "option_scores": {
+            option["name"]: {
+                "raw_scores": {c["name"]: 5 for c in FRAMEWORK["criteria"]},
+                "total_score": 5.0,
+            }
+            for option in FRAMEWORK["options"]
+        },
+        "recommendation": {"primary_choice": FRAMEWORK["options"][0]["name"]},
+        "decision_insights": {"key_tradeoff": summary},
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'test.sqlite3'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    store = DecisionStore(app, frameworks=ResponseCache())
+    yield store
+    store.flush()
+    with app.app_context():
+        db.engine.dispose()
+
+
+def _count(store, model, decision_id):
+    with store.app.app_context():
+        return model.query.filter_by(decision_id=decision_id).count()
+
+
+def test_owner_can_add_evaluations_to_its_decision(store):
+    framework = store.record_framework(copy.deepcopy(FRAMEWORK), "session-a")
+    evaluation = store.record_evaluation(
+        framework, {"q_0": 3}, _evaluation("mine"), "session-a"
+    )
+    store.flush()
+    assert evaluation["decision_id"] == framework["decision_id"]
+    assert _count(store, Evaluation, framework["decision_id"]) > 0
+
+
+def test_other_session_cannot_write_to_a_decision(store):
+    framework = store.record_framework(copy.deepcopy(FRAMEWORK), "session-a")
+    store.record_evaluation(framework, {}, _evaluation("mine"), "session-a")
+    store.flush()
+    evaluations_before = _count(store, Evaluation, framework["decision_id"])
+
+    # Session B replays A's framework, decision_id included
+    stolen = copy.deepcopy(framework)
+    evaluation = store.record_evaluation(
+        stolen, {}, _evaluation("overwritten"), "session-b"
+    )
+    store.flush()
+
+    assert evaluation["decision_id"] != framework["decision_id"]
+    assert _count(store, Evaluation, framework["decision_id"]) == evaluations_before
+    with store.app.app_context():
+        original = db.session.get(Decision, framework["decision_id"])
+        copied = db.session.get(Decision, evaluation["decision_id"])
+        assert original.summary["decision_insights"]["key_tradeoff"] == "mine"
+        assert copied.user_session_id == "session-b"
+        assert copied.summary["decision_insights"]["key_tradeoff"] == "overwritten"
+
+
+def test_decision_reads_are_limited_to_the_owner(store):
+    framework = store.record_framework(copy.deepcopy(FRAMEWORK), "session-a")
+    store.flush()
+    decision_id = framework["decision_id"]
+    assert store.load_decision(decision_id, "session-a")["decision_id"] == decision_id
+    assert store.load_decision(decision_id, "session-b") is None
+    assert store.load_decision(decision_id, None) is None
+    assert store.resolve_framework({"framework_id": decision_id}, "session-b") is None
+    assert store.owns_decision(str(decision_id), "session-a")
+    assert not store.owns_decision("nope", "session-a")
+
+
+def _add_decision(n: int) -> Decision:
+    decision = Decision(scenario_text=f"Scenario {n}", user_session_id="s")
+    decision.options = [
+        DecisionOption(name=f"Option {i}", position=i) for i in range(3)
+    ]
+    decision.questions = [
+        Question(question_text=f"Q{i}", question_type="scale", position=i)
+        for i in range(2)
+    ]
+    db.session.add(decision)
+    db.session.flush()
+    parent = EvaluationCriteria(decision_id=decision.id, name="Cost", weight=0.5)
+    db.session.add(parent)
+    db.session.flush()
+    child = EvaluationCriteria(
+        decision_id=decision.id, name="Fees", parent_criteria_id=parent.id
+    )
+    db.session.add(child)
+    db.session.flush()
+    db.session.add(
+        EvaluationCriteria(
+            decision_id=decision.id, name="Bank fees", parent_criteria_id=child.id
+        )
+    )
+    return decision
+
+
+@pytest.mark.parametrize("decisions", [1, 12])
+def test_decision_graphs_load_in_a_constant_number_of_queries(store, decisions):
+    with store.app.app_context():
+        for n in range(decisions):
+            _add_decision(n)
+        db.session.commit()
+        db.session.expunge_all()
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            loaded = [d.to_dict() for d in load_decision_graphs()]
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+
+    assert len(statements) == 4
+    assert len(loaded) == decisions
+    for decision in loaded:
+        assert len(decision["options"]) == 3 and len(decision["questions"]) == 2
+        (root,) = [c for c in decision["criteria"] if c["parent_criteria_id"] is None]
+        assert root["sub_criteria"][0]["sub_criteria"][0]["name"] == "Bank fees"
@@ -0,0 +1,84 @@
+# backend/test/test_prompt_compaction.py
+import json
+import os
+
+import pytest
+
+import prompt_compaction as pc
+from incremental import question_answers
+from scoring import framework_axes
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(HERE, "framework.json"), encoding="utf-8") as f:
+    FRAMEWORK = json.load(f)
+with open(os.path.join(HERE, "responses.json"), encoding="utf-8") as f:
+    RESPONSES = json.load(f)
+
+
+def test_compact_framework_round_trips_what_scoring_needs():
+    payload = pc.compact_evaluation_payload(FRAMEWORK, RESPONSES)
+    compact = json.loads(payload["framework"])
+    options, criteria, weights = framework_axes(FRAMEWORK)
+    assert [o["name"] for o in compact["options"]] == options
+    assert [c["name"] for c in compact["criteria"]] == criteria
+    assert [c["weight"] for c in compact["criteria"]] == pytest.approx(
+        weights, abs=1e-3
+    )
+    # The rest of the framework is not sent
+    assert "questions" not in compact and "scenario_text" not in compact
+    # Compacted criteria score the same as the originals
+    assert framework_axes(compact)[1] == criteria
+
+
+def test_compact_responses_keep_every_answer_once():
+    payload = pc.compact_evaluation_payload(FRAMEWORK, RESPONSES)
+    compact = json.loads(payload["responses"])
+    sent = [entry["a"] for entries in compact.values() for entry in entries]
+    answers = question_answers(FRAMEWORK, RESPONSES)
+    assert sorted(map(str, sent)) == sorted(
+        str(pc._compact_response(answer)) for answer in answers
+    )
+    _, criteria, _ = framework_axes(FRAMEWORK)
+    for name, entries in compact.items():
+        assert name == "general" or name in criteria
+        for entry in entries:
+            assert set(entry.get("also", [])) <= set(criteria)
+
+
+def test_compact_payload_is_smaller_and_recorded():
+    stats = pc.CompactionStats()
+    stats.record("balanced", 100, 40)
+    stats.record("balanced", 50, 20)
+    assert stats.snapshot()["balanced"] == {
+        "requests": 2,
+        "tokens_before": 150,
+        "tokens_after": 60,
+        "tokens_saved": 90,
+        "saved_ratio": 0.6,
+    }
+    payload = pc.compact_evaluation_payload(FRAMEWORK, RESPONSES)
+    assert payload["stats"]["tokens_after"] < payload["stats"]["tokens_before"]
+
+
+def test_answer_formats():
+    assert pc._compact_response({"type": "scale", "max": 5, "response": 4}) == "4/5"
+    rank = {"type": "rank", "response": {"1": "b", "0": "a", "2": "c"}}
+    assert pc._compact_response(rank) == "a > b > c"
+    assert pc._compact_response({"type": "text", "response": "hi"}) == "hi"
+
+
+def test_answer_linked_to_every_criterion_goes_under_general():
+    framework = {
+        "options": [{"name": "A"}, {"name": "B"}],
+        "criteria": [{"name": "Cost", "weight": 1}, {"name": "Fun", "weight": 1}],
+        "questions": [
+            {"text": "Budget?", "type": "scale", "max": 5, "criteria_link": "Cost"},
+            {"text": "Anything else?", "type": "text", "criteria_link": ""},
+        ],
+    }
+    compact = pc.compact_responses(framework, {"q_0": 3, "q_1": "no pets"})
+    assert compact == {
+        "Cost": [{"q": "Budget?", "a": "3/5"}],
+        "general": [{"q": "Anything else?", "a": "no pets"}],
+    }
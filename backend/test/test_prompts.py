@@ -0,0 +1,15 @@
+# backend/test/test_prompts.py
+import pytest
+
+from prompts import DEPTH_CONFIGS, depth_config, normalize_depth
+
+
+@pytest.mark.parametrize("depth", sorted(DEPTH_CONFIGS))
+def test_normalize_depth_keeps_known_depths(depth):
+    assert normalize_depth(depth) == depth
+
+
+@pytest.mark.parametrize("depth", [None, "", "deep", "QUICK", 3, ["quick"], {}])
+def test_normalize_depth_falls_back_to_balanced(depth):
+    assert normalize_depth(depth) == "balanced"
+    assert depth_config(normalize_depth(depth)) == DEPTH_CONFIGS["balanced"]
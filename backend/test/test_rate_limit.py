@@ -0,0 +1,200 @@
+# backend/test/test_rate_limit.py
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+import rate_limit as rl
+from routing import ModelRouter
+
+
+def _rate_limit_error(retry_after_ms: str = "1500") -> RateLimitError:
+    request = httpx.Request("POST", "http://upstream/v1/responses")
+    response = httpx.Response(
+        429, request=request, headers={"retry-after-ms": retry_after_ms}
+    )
+    return RateLimitError("slow down", response=response, body=None)
+
+
+@pytest.mark.parametrize(
+    "buckets", [rl.MemoryBuckets, rl.SQLiteBuckets], ids=["memory", "sqlite"]
+)
+def test_bucket_admits_burst_then_waits(buckets, tmp_path):
+    if buckets is rl.SQLiteBuckets:
+        store = buckets(str(tmp_path / "buckets.sqlite3"))
+    else:
+        store = buckets()
+    waits = [store.take("client", 40, 10, 100) for _ in range(3)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(2.0, abs=0.1)
+    # Buckets are independent per key
+    assert store.take("other", 40, 10, 100) == 0.0
+
+
+def test_memory_buckets_drop_least_recently_used():
+    store = rl.MemoryBuckets(max_keys=2)
+    for key in ("a", "b", "c"):
+        store.take(key, 100, 1, 100)
+    # "a" was dropped, so it starts over with a full bucket
+    assert store.take("a", 100, 1, 100) == 0.0
+    assert store.take("c", 100, 1, 100) > 0
+
+
+def test_client_key_ignores_forwarded_for_from_untrusted_peer():
+    assert rl.client_key("203.0.113.7") == "ip:203.0.113.7"
+    assert rl.client_key("203.0.113.7", "198.51.100.1") == "ip:203.0.113.7"
+    assert rl.client_key(None) == "ip:unknown"
+
+
+def test_client_key_walks_trusted_proxies_from_the_right():
+    proxies = rl.parse_networks("10.0.0.0/8, 127.0.0.1")
+    # The client prepended a forged hop; the proxy appended the real address
+    forwarded = "198.51.100.1, 203.0.113.7, 10.0.0.2"
+    assert rl.client_key("10.0.0.1", forwarded, proxies) == "ip:203.0.113.7"
+    assert rl.client_key("127.0.0.1", "203.0.113.7", proxies) == "ip:203.0.113.7"
+    # Nothing but proxies: the outermost one is the best we know
+    assert rl.client_key("10.0.0.1", "10.0.0.2", proxies) == "ip:10.0.0.2"
+    assert rl.client_key("10.0.0.1", "", proxies) == "ip:10.0.0.1"
+
+
+def test_rate_limiter_key_does_not_depend_on_session():
+    limiter = rl.RateLimiter(rl.MemoryBuckets(), trusted_proxies=())
+    assert limiter.key("203.0.113.7") == limiter.key("203.0.113.7", "198.51.100.1")
+
+
+def test_upstream_slots_cap_concurrency():
+    limiter = rl.UpstreamLimiter(rl.MemorySlots(), max_concurrency=3)
+    current, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call():
+        with limiter.slot("model"):
+            with lock:
+                current[0] += 1
+                peak[0] = max(peak[0], current[0])
+            time.sleep(0.02)
+            with lock:
+                current[0] -= 1
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 3
+    assert limiter.snapshot()["in_flight"] == 0
+
+
+def test_async_slot_takes_shared_slots_off_the_event_loop(tmp_path):
+    slots = rl.FileSlots(str(tmp_path))
+    limiter = rl.UpstreamLimiter(slots, max_concurrency=2)
+    threads = []
+    acquire, release = slots.try_acquire, slots.release
+
+    def try_acquire(limit):
+        threads.append(threading.get_ident())
+        return acquire(limit)
+
+    def release_slot(token):
+        threads.append(threading.get_ident())
+        release(token)
+
+    slots.try_acquire, slots.release = try_acquire, release_slot
+
+    async def call():
+        async with limiter.slot_async("model"):
+            return threading.get_ident()
+
+    loop_thread = asyncio.run(call())
+    assert len(threads) == 2 and loop_thread not in threads
+    assert limiter.snapshot()["in_flight"] == 0
+
+
+def test_upstream_429_halves_limit_and_cools_model():
+    limiter = rl.UpstreamLimiter(rl.MemorySlots(), max_concurrency=16, cooldown=0.5)
+    # Three calls in flight fail together
+    with pytest.raises(RateLimitError):
+        with limiter.slot("model"), limiter.slot("model"), limiter.slot("model"):
+            raise _rate_limit_error()
+    snapshot = limiter.snapshot()
+    # One burst of 429s is one signal
+    assert snapshot["limit"] == 8
+    assert snapshot["upstream_429s"] == 3
+    assert 1.0 < limiter.cooldown_remaining(["model"]) <= 1.5
+    assert limiter.cooldown_remaining(["model", "other"]) == 0.0
+
+
+def test_check_sheds_client_over_budget():
+    router = ModelRouter()
+    limiter = rl.RateLimiter(
+        rl.MemoryBuckets(),
+        tokens_per_minute=rl.request_cost("analyze", "quick", router) * 2,
+        upstream=rl.UpstreamLimiter(),
+        router=router,
+    )
+    limiter.check("ip:a", "analyze", "quick")
+    limiter.check("ip:a", "analyze", "quick")
+    with pytest.raises(rl.RateLimited) as shed:
+        limiter.check("ip:a", "analyze", "quick")
+    assert shed.value.reason == "client"
+    assert int(shed.value.retry_after_header) >= 1
+    limiter.check("ip:b", "analyze", "quick")
+
+
+def test_client_buckets_are_off_unless_configured(monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_BACKEND", raising=False)
+    assert rl.RateLimiter.from_env(rl.UpstreamLimiter()).buckets is None
+
+
+def test_clients_behind_a_trusted_router_get_their_own_buckets(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "memory")
+    monkeypatch.setenv("RATE_LIMIT_TRUSTED_PROXIES", "10.0.0.0/8")
+    router = ModelRouter()
+    monkeypatch.setenv(
+        "RATE_LIMIT_TOKENS_PER_MINUTE", str(rl.request_cost("analyze", "quick", router))
+    )
+    limiter = rl.RateLimiter.from_env(rl.UpstreamLimiter())
+    limiter.router = router
+    # Both requests reach the dyno from the same router address
+    first = limiter.key("10.1.2.3", "203.0.113.7")
+    second = limiter.key("10.1.2.3", "198.51.100.1")
+    assert first == "ip:203.0.113.7" and second == "ip:198.51.100.1"
+    limiter.check(first, "analyze", "quick")
+    limiter.check(second, "analyze", "quick")
+    with pytest.raises(rl.RateLimited):
+        limiter.check(limiter.key("10.4.5.6", "203.0.113.7"), "analyze", "quick")
+
+
+def test_check_sheds_when_every_route_model_cools_down():
+    router = ModelRouter()
+    upstream = rl.UpstreamLimiter(rl.MemorySlots())
+    limiter = rl.RateLimiter(rl.MemoryBuckets(), upstream=upstream, router=router)
+    for model in router.route("evaluate", "balanced").models:
+        with pytest.raises(RateLimitError):
+            with upstream.slot(model):
+                raise _rate_limit_error("5000")
+    with pytest.raises(rl.RateLimited) as shed:
+        limiter.check("ip:a", "evaluate", "balanced")
+    assert shed.value.reason == "upstream"
+
+
+def test_wait_sleeps_until_admitted_or_times_out():
+    router = ModelRouter()
+    cost = rl.request_cost("analyze", "quick", router)
+    # Refills one request's worth every 0.2s
+    limiter = rl.RateLimiter(
+        rl.MemoryBuckets(),
+        tokens_per_minute=cost * 300,
+        burst=cost,
+        upstream=rl.UpstreamLimiter(),
+        router=router,
+    )
+    limiter.check("ip:a", "analyze", "quick")
+    started = time.monotonic()
+    limiter.wait("ip:a", "analyze", "quick", timeout=1)
+    assert 0.1 < time.monotonic() - started < 0.5
+    with pytest.raises(rl.RateLimited):
+        limiter.wait("ip:a", "analyze", "quick", timeout=0.05)
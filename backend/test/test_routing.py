@@ -0,0 +1,143 @@
+# backend/test/test_routing.py
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+from openai import APIConnectionError
+
+import routing
+from async_decision_engine import AsyncDecisionEngine
+from cache import MemoryCache, ResponseCache, cache_key
+from decision_engine import DecisionEngine
+
+
+def _connection_error() -> APIConnectionError:
+    return APIConnectionError(
+        request=httpx.Request("POST", "http://upstream/v1/responses")
+    )
+
+
+def _answer(value, seconds=0.0):
+    def call():
+        time.sleep(seconds)
+        return value
+
+    return call
+
+
+def test_fast_primary_is_not_hedged():
+    events = []
+    result = routing.hedged(_answer("a"), _answer("b"), 0.5, events.append)
+    assert result == "a" and events == []
+
+
+def test_slow_primary_is_hedged_and_backup_wins():
+    events = []
+    result = routing.hedged(_answer("a", 0.5), _answer("b"), 0.05, events.append)
+    assert result == "b"
+    assert events == ["hedge_fired", "hedge_won"]
+
+
+def test_failing_primary_fails_over_to_backup():
+    def primary():
+        raise _connection_error()
+
+    events = []
+    assert routing.hedged(primary, _answer("b"), 0.5, events.append) == "b"
+    assert events == ["retry"]
+
+
+def test_time_queued_for_a_hedge_thread_does_not_fire_the_hedge(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(routing, "hedge_executor", executor)
+    # Another call holds the only thread for longer than the hedge delay
+    executor.submit(time.sleep, 0.2)
+    events = []
+    result = routing.hedged(_answer("a", 0.02), _answer("b"), 0.1, events.append)
+    assert result == "a" and events == []
+    executor.shutdown()
+
+
+def test_async_hedge_cancels_the_slow_primary():
+    cancelled = []
+
+    async def primary():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "a"
+
+    async def backup():
+        return "b"
+
+    events = []
+    result = asyncio.run(routing.hedged_async(primary, backup, 0.02, events.append))
+    assert result == "b"
+    assert events == ["hedge_fired", "hedge_won"]
+    assert cancelled == [True]
+
+
+ROUTES = {"evaluate": {"balanced": {"models": ["primary", "backup"]}}}
+
+
+def _engine(engine_class, upstream):
+    engine = engine_class(
+        client=object(),
+        cache=ResponseCache(MemoryCache()),
+        router=routing.ModelRouter(routes=ROUTES),
+    )
+    engine._call_upstream = upstream
+    return engine
+
+
+def test_backup_answer_is_cached_under_the_backup_model():
+    def upstream(model, *args):
+        if model == "primary":
+            raise _connection_error()
+        return '{"answer": "backup"}'
+
+    engine = _engine(DecisionEngine, upstream)
+    text = engine._create_text("primary", "inst", "prompt", depth="balanced")
+    assert text == '{"answer": "backup"}'
+    assert engine.cache.get(cache_key("primary", "inst", "prompt", "")) is None
+    assert engine.cache.get(cache_key("backup", "inst", "prompt", "")) == text
+
+
+def test_async_backup_answer_is_cached_under_the_backup_model():
+    async def upstream(model, *args):
+        if model == "primary":
+            raise _connection_error()
+        return '{"answer": "backup"}'
+
+    engine = _engine(AsyncDecisionEngine, upstream)
+    text = asyncio.run(
+        engine._create_text("primary", "inst", "prompt", depth="balanced")
+    )
+    assert text == '{"answer": "backup"}'
+    assert engine.cache.get(cache_key("primary", "inst", "prompt", "")) is None
+    assert engine.cache.get(cache_key("backup", "inst", "prompt", "")) == text
+
+
+@pytest.mark.parametrize("engine_class", [DecisionEngine, AsyncDecisionEngine])
+def test_primary_answer_is_cached_under_the_primary_model(engine_class):
+    calls = []
+
+    def upstream(model, *args):
+        calls.append(model)
+        return '{"answer": "primary"}'
+
+    async def upstream_async(model, *args):
+        return upstream(model, *args)
+
+    engine = _engine(
+        engine_class, upstream if engine_class is DecisionEngine else upstream_async
+    )
+    text = engine._create_text("primary", "inst", "prompt", depth="balanced")
+    if engine_class is AsyncDecisionEngine:
+        text = asyncio.run(text)
+    assert calls == ["primary"]
+    assert engine.cache.get(cache_key("primary", "inst", "prompt", "")) == text
@@ -0,0 +1,118 @@
+# backend/test/test_scoring.py
+import numpy as np
+import pytest
+
+from scoring import (
+    NEUTRAL_SCORE,
+    apply_scores,
+    build_score_matrix,
+    framework_axes,
+    match_names,
+    normalize_weights,
+    rank_options,
+)
+
+FRAMEWORK = {
+    "options": [{"name": "Car"}, {"name": "Train"}, {"name": "Bike"}],
+    "criteria": [
+        {"name": "Cost", "weight": 2},
+        {"name": "Speed", "weight": 1},
+        {"name": "Comfort", "weight": 1},
+    ],
+}
+
+
+def test_match_names_ignores_case_and_fuzzy_typos():
+    mapping = match_names(["Cost", "Speed"], [" cost ", "Sped", "Weather"])
+    assert mapping == {" cost ": "Cost", "Sped": "Speed"}
+
+
+def test_match_names_does_not_map_two_candidates_to_one_name():
+    mapping = match_names(["Speed"], ["speed", "Sped"])
+    assert mapping == {"speed": "Speed"}
+
+
+def test_normalize_weights():
+    assert normalize_weights([2, 1, 1]).tolist() == [0.5, 0.25, 0.25]
+    assert normalize_weights([-1, 1]).tolist() == [0.0, 1.0]
+    assert normalize_weights([0, 0]).tolist() == [0.5, 0.5]
+    assert normalize_weights([]).tolist() == []
+
+
+def test_framework_axes():
+    options, criteria, weights = framework_axes(FRAMEWORK)
+    assert options == ["Car", "Train", "Bike"]
+    assert criteria == ["Cost", "Speed", "Comfort"]
+    assert weights.tolist() == [0.5, 0.25, 0.25]
+
+
+def test_build_score_matrix_fills_gaps_with_neutral_score():
+    matrix = build_score_matrix(
+        ["Car", "Train"],
+        ["Cost", "Speed"],
+        {"car": {"cost": 3, "Speed": "fast"}, "Train": {"Cost": "7"}},
+    )
+    assert matrix.tolist() == [
+        [3.0, NEUTRAL_SCORE],
+        [7.0, NEUTRAL_SCORE],
+    ]
+
+
+def test_rank_options_keeps_framework_order_on_ties():
+    assert rank_options(np.array([5.0, 7.0, 5.0])).tolist() == [1, 0, 2]
+
+
+def test_apply_scores_ranks_with_exact_arithmetic():
+    evaluation = {
+        "option_scores": {
+            "Car": {"scores": {"Cost": 4, "Speed": 9, "Comfort": 8}},
+            "train": {"scores": {"Cost": 8, "Speed": 6, "Comfort": 7}},
+            "Bike": {"scores": {"Cost": 10, "Speed": 3}},
+        }
+    }
+    result = apply_scores(evaluation, FRAMEWORK)
+
+    assert result["ranking"] == ["Train", "Bike", "Car"]
+    assert result["recommendation"]["primary_choice"] == "Train"
+    assert result["weights"] == {"Cost": 0.5, "Speed": 0.25, "Comfort": 0.25}
+    train = result["option_scores"]["Train"]
+    assert train["criteria_scores"] == {"Cost": 4.0, "Speed": 1.5, "Comfort": 1.75}
+    assert train["total_score"] == 7.25
+    assert train["rank"] == 1
+    assert "scores" not in train
+    # Missing scores count as neutral
+    assert result["option_scores"]["Bike"]["raw_scores"]["Comfort"] == NEUTRAL_SCORE
+
+
+def test_apply_scores_totals_add_up_after_rounding():
+    framework = {
+        "options": [{"name": "A"}],
+        "criteria": [{"name": c, "weight": 1} for c in ("x", "y", "z")],
+    }
+    evaluation = {"option_scores": {"A": {"scores": {"x": 7, "y": 7, "z": 7}}}}
+    entry = apply_scores(evaluation, framework)["option_scores"]["A"]
+    assert entry["total_score"] == pytest.approx(sum(entry["criteria_scores"].values()))
+
+
+def test_apply_scores_rescoring_is_stable():
+    evaluation = {
+        "option_scores": {
+            "Car": {"scores": {"Cost": 4, "Speed": 9, "Comfort": 8}},
+            "Train": {"scores": {"Cost": 8, "Speed": 6, "Comfort": 7}},
+        }
+    }
+    once = apply_scores(evaluation, FRAMEWORK)
+    twice = apply_scores(
+        {"option_scores": {k: dict(v) for k, v in once["option_scores"].items()}},
+        FRAMEWORK,
+    )
+    assert twice["ranking"] == once["ranking"]
+    assert twice["option_scores"]["Car"]["total_score"] == (
+        once["option_scores"]["Car"]["total_score"]
+    )
+
+
+def test_apply_scores_without_criteria_is_a_no_op():
+    evaluation = {"option_scores": {"A": {"scores": {}}}}
+    assert apply_scores(evaluation, {"options": []}) is evaluation
+    assert "ranking" not in evaluation
@@ -0,0 +1,88 @@
+# backend/test/test_semantic_cache.py
+import pytest
+
+from semantic_cache import (
+    HashingEmbedder,
+    SemanticCache,
+    VectorIndex,
+    salient_terms,
+    term_groups,
+)
+
+SCENARIO = "job A in NYC or job B in Austin"
+FRAMEWORK = {"title": "NYC or Austin", "options": [{"name": "Job A"}]}
+
+
+@pytest.fixture
+def cache():
+    cache = SemanticCache(threshold=0.85)
+    cache.set(SCENARIO, "balanced", dict(FRAMEWORK, depth="balanced"))
+    return cache
+
+
+def test_exact_scenario_hits(cache):
+    assert cache.get(SCENARIO, "balanced") == FRAMEWORK
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    [
+        "Should I take job A in NYC or job B in Austin?",
+        "I'm deciding whether to take job A in NYC or job B in Austin",
+        "job B in Austin or job A in NYC",
+        "job a in nyc or job b in austin",
+    ],
+)
+def test_paraphrase_hits(cache, scenario):
+    assert cache.get(scenario, "balanced") == FRAMEWORK
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    [
+        # Same names, but the jobs and cities are paired the other way round
+        "job B in NYC or job A in Austin",
+        "job A in Austin or job B in NYC",
+        # A different city
+        "job A in NYC or job B in Boston",
+    ],
+)
+def test_scenarios_with_other_facts_miss(cache, scenario):
+    assert cache.get(scenario, "balanced") is None
+
+
+def test_depth_and_version_must_match(cache):
+    assert cache.get(SCENARIO, "quick") is None
+    assert cache.get(SCENARIO, "balanced", version="v2") is None
+
+
+def test_term_groups_follow_clauses():
+    vocabulary = salient_terms(SCENARIO)
+    assert vocabulary == {"a", "nyc", "b", "austin"}
+    assert term_groups(SCENARIO, vocabulary) == {
+        frozenset({"a", "nyc"}),
+        frozenset({"b", "austin"}),
+    }
+
+
+def test_eviction_and_persistence(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    cache = SemanticCache(max_size=2, path=path, save_interval=0)
+    for city in ("Lisbon", "Porto", "Faro"):
+        cache.set(f"Move to {city} for work?", "quick", {"title": city})
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("Move to Lisbon for work?", "quick") is None
+
+    reloaded = SemanticCache(max_size=2, path=path)
+    assert reloaded.get("Move to Faro for work?", "quick") == {"title": "Faro"}
+
+
+def test_vector_index_remove_keeps_rows_dense():
+    embed = HashingEmbedder(dim=64)
+    index = VectorIndex(64, capacity=1)
+    for word in ("alpha", "beta", "gamma"):
+        index.add(word, embed(word))
+    index.remove("alpha")
+    assert len(index) == 2
+    assert index.search(embed("gamma"), k=1)[0][0] == "gamma"
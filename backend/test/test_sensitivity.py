@@ -0,0 +1,108 @@
+# backend/test/test_sensitivity.py
+import numpy as np
+import pytest
+
+from sensitivity import (
+    break_even_weights,
+    reweight,
+    sensitivity_report,
+    stability,
+    validate_weights,
+)
+
+FRAMEWORK = {
+    "options": [{"name": "Car"}, {"name": "Train"}],
+    "criteria": [
+        {"name": "Cost", "weight": 3},
+        {"name": "Speed", "weight": 1},
+    ],
+}
+EVALUATION = {
+    "option_scores": {
+        "Car": {"scores": {"Cost": 4, "Speed": 9}},
+        "Train": {"scores": {"Cost": 8, "Speed": 5}},
+    }
+}
+
+
+def test_break_even_weight_is_where_the_totals_tie():
+    matrix = np.array([[4.0, 9.0], [8.0, 5.0]])
+    weights = np.array([0.75, 0.25])
+    # Train leads; Car catches up once Speed weighs half
+    threshold = break_even_weights(matrix, weights, top=1)
+    assert np.isnan(threshold[1]).all()
+    assert threshold[0, 1] == pytest.approx(0.5)
+    assert threshold[0, 0] == pytest.approx(0.5)
+
+
+def test_stability_is_a_distribution_favouring_the_leader():
+    matrix = np.array([[4.0, 9.0], [8.0, 5.0]])
+    probabilities = stability(matrix, np.array([0.75, 0.25]), samples=2000)
+    assert probabilities.sum() == pytest.approx(1.0)
+    assert probabilities[1] > 0.9
+
+
+def test_sensitivity_report_names_the_critical_factor():
+    matrix = np.array([[4.0, 9.0], [8.0, 5.0]])
+    report = sensitivity_report(
+        matrix, np.array([0.75, 0.25]), ["Car", "Train"], ["Cost", "Speed"], 500
+    )
+    assert report["robust_choice"] == "Train"
+    assert report["critical_factors"][0].endswith("shifts to Car")
+    speed = report["break_even"][1]
+    assert speed["increase_to"] == {"weight": 0.5, "new_top_choice": "Car"}
+    assert speed["decrease_to"] is None
+
+
+def test_reweight_reranks_without_touching_the_inputs():
+    result = reweight(EVALUATION, FRAMEWORK, {" speed ": 3}, samples=200)
+    assert result["ranking"] == ["Car", "Train"]
+    assert result["weights"] == {"Cost": 0.5, "Speed": 0.5}
+    assert result["sensitivity_analysis"]["samples"] == 200
+    assert FRAMEWORK["criteria"][1]["weight"] == 1
+    assert "ranking" not in EVALUATION
+
+
+def test_reweight_keeps_framework_weights_by_default():
+    result = reweight(EVALUATION, FRAMEWORK, None, samples=200)
+    assert result["ranking"] == ["Train", "Car"]
+
+
+@pytest.mark.parametrize(
+    "weights, message",
+    [
+        (["Cost"], "must be an object"),
+        ({"Cost": "heavy"}, "must be a number"),
+        ({"Cost": True}, "must be a number"),
+        ({"Cost": None}, "must be a number"),
+        ({"Cost": -1}, "non-negative"),
+        ({"Cost": float("nan")}, "non-negative"),
+    ],
+)
+def test_invalid_weights_raise_value_error(weights, message):
+    with pytest.raises(ValueError, match=message):
+        reweight(EVALUATION, FRAMEWORK, weights)
+
+
+def test_validate_weights_converts_to_float():
+    assert validate_weights({"Cost": 2, "Speed": 0.5}) == {"Cost": 2.0, "Speed": 0.5}
+    assert validate_weights(None) == {}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"evaluation": EVALUATION, "framework": FRAMEWORK, "weights": {"Cost": "x"}},
+        {"evaluation": EVALUATION, "framework": FRAMEWORK, "weights": [1]},
+        {"evaluation": [], "framework": FRAMEWORK},
+        [EVALUATION],
+    ],
+)
+def test_sensitivity_route_rejects_bad_input_with_400(body):
+    import decisions
+    from app import app
+
+    with app.test_request_context("/api/sensitivity", method="POST", json=body):
+        response, status = decisions.sensitivity_decision()
+    assert status == 400
+    assert response.get_json()["error"]
@@ -0,0 +1,114 @@
+# backend/test/test_single_flight.py
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+import single_flight as sf
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    flight = sf.SingleFlight(stats=sf.FlightStats())
+    calls = []
+    started = threading.Event()
+
+    def upstream():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return "answer"
+
+    results = []
+
+    def request():
+        results.append(flight.do("key", upstream))
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    started.wait(1)
+    follower = threading.Thread(target=request)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert calls == [1]
+    assert results == ["answer", "answer"]
+    assert flight.snapshot()["coalesced"] == 1
+    assert flight.in_flight() == 0
+
+
+def test_followers_share_the_leaders_error():
+    flight = sf.SingleFlight(stats=sf.FlightStats())
+    started = threading.Event()
+    errors = []
+
+    def upstream():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    def request():
+        try:
+            flight.do("key", upstream)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=request)
+    leader.start()
+    started.wait(1)
+    follower = threading.Thread(target=request)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_async_concurrent_identical_calls_share_one_upstream_call():
+    flight = sf.AsyncSingleFlight(stats=sf.FlightStats())
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def scenario():
+        return await asyncio.gather(
+            flight.do("key", upstream), flight.do("key", upstream)
+        )
+
+    assert asyncio.run(scenario()) == ["answer", "answer"]
+    assert calls == [1]
+    assert flight.snapshot()["in_flight"] == 0
+
+
+@pytest.mark.skipif(sf.fcntl is None, reason="flock() is not available")
+def test_file_lock_uses_a_fixed_number_of_stripe_files(tmp_path):
+    lock = sf.FileLock(str(tmp_path), timeout=1, stripes=4)
+    for i in range(50):
+        token, waited = lock.acquire(sf._lock_name(f"key-{i}"))
+        assert not waited
+        lock.release(sf._lock_name(f"key-{i}"), token)
+    assert len(os.listdir(tmp_path)) <= 4
+
+
+@pytest.mark.skipif(sf.fcntl is None, reason="flock() is not available")
+def test_file_lock_makes_a_second_worker_wait(tmp_path):
+    first = sf.FileLock(str(tmp_path), timeout=1)
+    second = sf.FileLock(str(tmp_path), timeout=1)
+    token, waited = first.acquire("key")
+    assert not waited
+    outcome = []
+
+    def other_worker():
+        outcome.append(second.acquire("key"))
+
+    thread = threading.Thread(target=other_worker)
+    thread.start()
+    time.sleep(0.1)
+    first.release("key", token)
+    thread.join()
+    other_token, other_waited = outcome[0]
+    assert other_waited
+    second.release("key", other_token)
@@ -0,0 +1,128 @@
+# backend/test/test_streaming.py
+import json
+import os
+from types import SimpleNamespace
+
+from cache import MemoryCache, ResponseCache
+from decision_engine import DecisionEngine
+from streaming import IncrementalJSONParser, format_sse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(HERE, "framework.json"), encoding="utf-8") as f:
+    FRAMEWORK_TEXT = f.read()
+
+
+def _feed(parser, text, size):
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i : i + size]))
+    return events
+
+
+def test_events_do_not_depend_on_chunking():
+    whole = IncrementalJSONParser()
+    expected = whole.feed(FRAMEWORK_TEXT)
+    for size in (1, 7, 64):
+        parser = IncrementalJSONParser()
+        assert _feed(parser, FRAMEWORK_TEXT, size) == expected
+        assert parser.done
+        assert parser.result() == json.loads(FRAMEWORK_TEXT)
+
+
+def test_members_are_reported_as_they_complete():
+    framework = json.loads(FRAMEWORK_TEXT)
+    events = IncrementalJSONParser().feed(FRAMEWORK_TEXT)
+    fields = {e["field"]: e["value"] for kind, e in events if kind == "field"}
+    assert fields["title"] == framework["title"]
+    options = [e["value"] for kind, e in events if e["field"] == "options"]
+    assert options == framework["options"]
+    # Object members are keyed by name
+    scenario = [e for kind, e in events if e["field"] == "scenario_text"]
+    assert [e["key"] for e in scenario] == list(framework["scenario_text"])
+
+
+def test_fences_are_skipped_and_document_is_the_bare_object():
+    parser = IncrementalJSONParser()
+    events = _feed(parser, '```json\n{"a": "x}", "b": [1, 2,],}\n```', 5)
+    assert events == [
+        ("field", {"field": "a", "value": "x}"}),
+        ("item", {"field": "b", "key": 0, "value": 1}),
+        ("item", {"field": "b", "key": 1, "value": 2}),
+    ]
+    assert parser.document == '{"a": "x}", "b": [1, 2,],}'
+    assert parser.result() == {"a": "x}", "b": [1, 2]}
+    # Text after the root object is ignored
+    assert parser.feed("trailing") == []
+
+
+def test_truncated_document_is_repaired():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1, "b": [1, 2')
+    assert not parser.done and parser.document == ""
+    assert parser.result() == {"a": 1, "b": [1, 2]}
+
+
+def test_format_sse():
+    assert format_sse("item", {"a": 1}) == 'event: item\ndata: {"a":1}\n\n'
+
+
+FRAMEWORK = {
+    "scenario_text": "How should I commute?",
+    "depth": "balanced",
+    "options": [{"name": "Car"}, {"name": "Train"}],
+    "criteria": [
+        {"name": "Cost", "weight": 2, "description": "Monthly spend"},
+        {"name": "Speed", "weight": 1, "description": "Door to door"},
+    ],
+    "questions": [],
+}
+
+OUTPUT = json.dumps(
+    {
+        "option_scores": {
+            "Car": {"raw_scores": {"Cost": 3, "Speed": 8}, "rationale": "fast"},
+            "Train": {"raw_scores": {"Cost": 7, "Speed": 6}, "rationale": "cheap"},
+        },
+        "recommendation": "Train",
+    }
+)
+
+
+class _Responses:
+    def __init__(self, text, size):
+        self.text = text
+        self.size = size
+        self.calls = 0
+
+    def create(self, stream=False, **kwargs):
+        self.calls += 1
+        return [
+            SimpleNamespace(
+                type="response.output_text.delta",
+                delta=self.text[i : i + self.size],
+            )
+            for i in range(0, len(self.text), self.size)
+        ]
+
+
+def test_evaluation_stream_sends_each_option_score_then_done():
+    responses = _Responses(OUTPUT, 9)
+    engine = DecisionEngine(
+        client=SimpleNamespace(responses=responses),
+        cache=ResponseCache(MemoryCache()),
+    )
+    events = list(engine.evaluate_options_stream(FRAMEWORK, {}))
+    kinds = [event for event, _ in events]
+    assert kinds[0] == "start" and kinds[-1] == "done"
+    items = [data for event, data in events if event == "item"]
+    assert [(i["field"], i["key"]) for i in items[:2]] == [
+        ("option_scores", "Car"),
+        ("option_scores", "Train"),
+    ]
+    assert events[-1][1]["option_scores"]["Train"]["raw_scores"]["Cost"] == 7
+
+    # The finished document was cached, so a second stream makes no call
+    again = list(engine.evaluate_options_stream(FRAMEWORK, {}))
+    assert responses.calls == 1
+    assert [event for event, _ in again] == kinds
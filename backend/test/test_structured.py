@@ -0,0 +1,76 @@
+# backend/test/test_structured.py
+import json
+
+import pytest
+
+from structured import loads_lenient, repair_json
+
+
+def _repaired(text):
+    return json.loads(repair_json(text))
+
+
+def test_valid_json_is_unchanged():
+    text = '{"a": [1, 2.5, "x"], "b": {"c": null}}'
+    assert repair_json(text) == text
+
+
+def test_strips_fences_and_prose():
+    text = 'Here you go:\n```json\n{"a": 1}\n```\nLet me know!'
+    assert _repaired(text) == {"a": 1}
+
+
+def test_drops_comments_and_trailing_commas():
+    text = '{\n  // the options\n  "a": [1, 2,], /* done */\n  "b": 2,\n}'
+    assert _repaired(text) == {"a": [1, 2], "b": 2}
+
+
+def test_inserts_missing_commas():
+    assert _repaired('{"a": 1\n "b": [1 2 "x"]}') == {"a": 1, "b": [1, 2, "x"]}
+    assert _repaired('[{"a": 1} {"a": 2}]') == [{"a": 1}, {"a": 2}]
+
+
+def test_escapes_raw_control_characters_in_strings():
+    assert _repaired('{"a": "line one\nline two\tend"}') == {
+        "a": "line one\nline two\tend"
+    }
+
+
+def test_maps_python_literals():
+    assert _repaired('{"a": True, "b": False, "c": None, "d": NaN}') == {
+        "a": True,
+        "b": False,
+        "c": None,
+        "d": None,
+    }
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": [1, 2', {"a": [1, 2]}),
+        ('{"a": "unfinished str', {"a": "unfinished str"}),
+        ('{"a": 1, "b":', {"a": 1, "b": None}),
+        ('{"a": 1, "unfinished ke', {"a": 1}),
+        ('{"a": {"b": [{"c": 1},', {"a": {"b": [{"c": 1}]}}),
+        ('{"a": "ends in escape \\', {"a": "ends in escape "}),
+    ],
+)
+def test_closes_truncated_documents(text, expected):
+    assert _repaired(text) == expected
+
+
+def test_ignores_text_after_the_root():
+    assert _repaired('{"a": 1} and then {"b": 2}') == {"a": 1}
+
+
+def test_no_root_raises():
+    with pytest.raises(ValueError):
+        repair_json("I could not produce JSON for this")
+
+
+def test_loads_lenient():
+    assert loads_lenient('{"a": 1}') == {"a": 1}
+    assert loads_lenient('```json\n{"a": 1,}\n```') == {"a": 1}
+    with pytest.raises(json.JSONDecodeError):
+        loads_lenient("no json here")
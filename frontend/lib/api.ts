@@ -33,6 +33,8 @@ interface AnalyzeResponse {
     context_factors: string[];
     depth: string;
     scenario_text: string;
+    decision_id?: number; // Set once the framework is stored
+    framework_hash?: string; // Lets /evaluate take the hash instead of the framework
 
     initialOptions: Array<{
         name: string;
@@ -44,12 +46,16 @@ interface AnalyzeResponse {
 interface EvaluateRequest {
     framework: AnalyzeResponse;
     responses: Record<string, any>;
+    previous_evaluation?: EvaluateResponse; // Re-score only criteria whose answers changed
+    fanout?: boolean; // Score options in parallel calls
 }
 
 interface EvaluateResponse {
     option_scores: Record<string, {
         total_score: number;
         criteria_scores: Record<string, number>;
+        raw_scores?: Record<string, number>;
+        rank?: number;
         strengths: string[];
         weaknesses: string[];
         confidence: 'high' | 'medium' | 'low';
@@ -63,18 +69,79 @@ interface EvaluateResponse {
     sensitivity_analysis?: {
         critical_factors: string[];
         robust_choice: string;
+        stability?: Record<string, number>;
+        break_even?: Array<{
+            criterion: string;
+            weight: number;
+            increase_to: { weight: number; new_top_choice: string } | null;
+            decrease_to: { weight: number; new_top_choice: string } | null;
+        }>;
+        samples?: number;
     };
+    ranking?: string[];
+    weights?: Record<string, number>;
+    score_fingerprints?: {
+        options: string;
+        criteria: Record<string, string>;
+    };
+    incremental?: {
+        rescored_criteria: string[];
+    };
+    fanout?: {
+        calls: number;
+    };
+    decision_id?: number;
     model_used?: string;
     complexity_score?: number;
 }
 
+interface StoredDecision {
+    decision_id: number;
+    status: string;
+    created_at: string | null;
+    framework: AnalyzeResponse;
+    responses: Record<string, any>;
+    evaluation: EvaluateResponse | null;
+}
+
+interface JobStatus<T> {
+    job_id: string;
+    kind: string;
+    status: 'queued' | 'running' | 'done' | 'failed';
+    attempts: number;
+    result: T | null;
+    error: string | null;
+    timing: {
+        queued_ms: number;
+        run_ms: number | null;
+        total_ms: number;
+    };
+}
+
+const SESSION_STORAGE_KEY = 'decision-session-id';
+
+// Stored decisions can only be read back by the session that created them
+function getSessionId(): string | null {
+    if (typeof window === 'undefined') {
+        return null;
+    }
+    let sessionId = window.localStorage.getItem(SESSION_STORAGE_KEY);
+    if (!sessionId) {
+        sessionId = window.crypto.randomUUID();
+        window.localStorage.setItem(SESSION_STORAGE_KEY, sessionId);
+    }
+    return sessionId;
+}
+
 class DecisionAPI {
     private async fetchAPI<T>(endpoint: string, options?: RequestInit): Promise<T> {
         try {
+            const sessionId = getSessionId();
             const response = await fetch(`${API_BASE_URL}${endpoint}`, {
                 ...options,
                 headers: {
                     'Content-Type': 'application/json',
+                    ...(sessionId ? { 'X-Session-Id': sessionId } : {}),
                     ...options?.headers,
                 },
             });
@@ -97,13 +164,47 @@ class DecisionAPI {
         });
     }
 
+    // Runs the analysis as a background job; poll getJob with the returned id
+    async analyzeAsync(request: AnalyzeRequest): Promise<{ job_id: string; status: string; status_url: string }> {
+        return this.fetchAPI<{ job_id: string; status: string; status_url: string }>('/analyze?async=1', {
+            method: 'POST',
+            body: JSON.stringify(request),
+        });
+    }
+
+    async getJob<T = AnalyzeResponse>(id: string): Promise<JobStatus<T>> {
+        return this.fetchAPI<JobStatus<T>>(`/jobs/${id}`, {
+            method: 'GET',
+        });
+    }
+
     async evaluate(request: EvaluateRequest): Promise<EvaluateResponse> {
+        const { framework, ...rest } = request;
+        if (framework.framework_hash) {
+            // Send the hash alone; the server answers 404 once it has forgotten it
+            try {
+                return await this.fetchAPI<EvaluateResponse>('/evaluate', {
+                    method: 'POST',
+                    body: JSON.stringify({ ...rest, framework_hash: framework.framework_hash }),
+                });
+            } catch (error) {
+                if (!(error instanceof Error && error.message.startsWith('API error: 404'))) {
+                    throw error;
+                }
+            }
+        }
         return this.fetchAPI<EvaluateResponse>('/evaluate', {
             method: 'POST',
             body: JSON.stringify(request),
         });
     }
 
+    async getDecision(id: number): Promise<StoredDecision> {
+        return this.fetchAPI<StoredDecision>(`/decisions/${id}`, {
+            method: 'GET',
+        });
+    }
+
     async testConnection(): Promise<{ status: string; message: string }> {
         return this.fetchAPI<{ status: string; message: string }>('/test', {
             method: 'GET',
@@ -112,4 +213,4 @@ class DecisionAPI {
 }
 
 export const decisionAPI = new DecisionAPI();
-export type { AnalyzeResponse, EvaluateResponse };
+export type { AnalyzeResponse, EvaluateResponse, JobStatus, StoredDecision };